@@ -1,5 +1,54 @@
 from django.contrib import admin
-from .models import StudentAttendance, TeacherAttendance
+from django.db import transaction
+from .models import StudentAttendance, TeacherAttendance, CourseAttendanceSummary, MonthlyCourseAttendance, SectionDailyAttendance, AttendanceLedger
 
-admin.site.register(StudentAttendance)
-admin.site.register(TeacherAttendance)
\ No newline at end of file
+@admin.register(StudentAttendance)
+class StudentAttendanceAdmin(admin.ModelAdmin):
+    # Daily rows edited here are mirrored into the attendance ledgers
+    list_display = ('student', 'course', 'date', 'present', 'percentage')
+    list_filter = ('course', 'present')
+    list_select_related = ('student', 'course')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_percentage()
+
+    @admin.display(description='Course %', ordering='course_percentage')
+    def percentage(self, obj):
+        return f"{obj.percentage:.1f}"
+
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            previous = StudentAttendance.objects.filter(pk=obj.pk).select_related('course').first() if change else None
+            super().save_model(request, obj, form, change)
+            if previous is not None:
+                AttendanceLedger.objects.unmark(previous.course, [previous.student_id], previous.date)
+            AttendanceLedger.objects.mark(obj.course, {obj.student_id: obj.present}, obj.date)
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            AttendanceLedger.objects.unmark(obj.course, [obj.student_id], obj.date)
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            for record in queryset.select_related('course'):
+                AttendanceLedger.objects.unmark(record.course, [record.student_id], record.date)
+            super().delete_queryset(request, queryset)
+
+admin.site.register(TeacherAttendance)
+
+@admin.register(CourseAttendanceSummary)
+class CourseAttendanceSummaryAdmin(admin.ModelAdmin):
+    list_display = ('student', 'course', 'present_days', 'total_days')
+    readonly_fields = ('present_days', 'total_days')
+
+@admin.register(MonthlyCourseAttendance)
+class MonthlyCourseAttendanceAdmin(admin.ModelAdmin):
+    list_display = ('student', 'course', 'month', 'present_days', 'total_days')
+    list_filter = ('month', 'course')
+
+@admin.register(SectionDailyAttendance)
+class SectionDailyAttendanceAdmin(admin.ModelAdmin):
+    list_display = ('date', 'semester', 'section', 'present_count', 'total_count')
+    list_filter = ('semester', 'section')
+    date_hierarchy = 'date'
@@ -5,4 +5,6 @@ class AttendanceConfig(AppConfig):
     name = 'attendance'
 
     def ready(self):
-        import attendance.signals  
\ No newline at end of file
+        import attendance.checks
+        import attendance.signals
+ 
\ No newline at end of file
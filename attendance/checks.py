@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+# Everything that still reads the daily StudentAttendance rows; each must read
+# AttendanceLedger before the rows can stop being written
+DAILY_ROW_READERS = [
+    'CourseAttendanceSummary and the low attendance alerts (StudentAttendance.objects.mark)',
+    'refresh_attendance_rollups (MonthlyCourseAttendance, SectionDailyAttendance)',
+    'attendance_feed',
+    'the CSV/XLSX attendance exports',
+]
+
+
+@register()
+def check_daily_attendance_rows(app_configs, **kwargs):
+    if getattr(settings, 'ATTENDANCE_STORE_DAILY_ROWS', True):
+        return []
+    return [Error(
+        'ATTENDANCE_STORE_DAILY_ROWS = False is not supported yet.',
+        hint='These still read the daily StudentAttendance rows and would silently go stale: '
+             + '; '.join(DAILY_ROW_READERS) + '.',
+        id='attendance.E001',
+    )]
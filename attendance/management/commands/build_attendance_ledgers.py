@@ -0,0 +1,42 @@
+from itertools import groupby
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from attendance.models import AttendanceLedger, StudentAttendance
+from campus.models import StudentProfile
+
+
+class Command(BaseCommand):
+    help = "Rebuild attendance ledgers from StudentAttendance rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        semesters = dict(StudentProfile.objects.values_list('user_id', 'semester'))
+        rows = (
+            StudentAttendance.objects.order_by('student', 'course', 'date')
+            .values_list('student', 'course', 'date', 'present')
+            .iterator(chunk_size=2000)
+        )
+        batch, built = [], 0
+        with transaction.atomic():
+            AttendanceLedger.objects.all().delete()
+            for (student_id, course_id), marks in groupby(rows, key=lambda row: row[:2]):
+                marks = {day: present for _, _, day, present in marks}
+                ledger = AttendanceLedger(
+                    student_id=student_id,
+                    course_id=course_id,
+                    semester=semesters.get(student_id, 1),
+                    start_date=min(marks),
+                )
+                ledger.set_days(marks)
+                batch.append(ledger)
+                if len(batch) >= options['batch_size']:
+                    AttendanceLedger.objects.bulk_create(batch)
+                    built += len(batch)
+                    batch = []
+            AttendanceLedger.objects.bulk_create(batch)
+            built += len(batch)
+        self.stdout.write(self.style.SUCCESS(f"Built {built} attendance ledger(s)."))
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_course_summaries(apps, schema_editor):
+    StudentAttendance = apps.get_model('attendance', 'StudentAttendance')
+    CourseAttendanceSummary = apps.get_model('attendance', 'CourseAttendanceSummary')
+    totals = StudentAttendance.objects.values('student', 'course').annotate(
+        total=Count('id'), present_count=Count('id', filter=Q(present=True))
+    )
+    CourseAttendanceSummary.objects.bulk_create([
+        CourseAttendanceSummary(
+            student_id=row['student'],
+            course_id=row['course'],
+            present_days=row['present_count'],
+            total_days=row['total'],
+        )
+        for row in totals
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0002_alter_teacherattendance_teacher'),
+        ('courses', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseAttendanceSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('present_days', models.PositiveIntegerField(default=0)),
+                ('total_days', models.PositiveIntegerField(default=0)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_summaries', to='courses.course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='course_attendance_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('student', 'course')},
+            },
+        ),
+        migrations.RunPython(backfill_course_summaries, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='studentattendance',
+            name='percentage',
+        ),
+    ]
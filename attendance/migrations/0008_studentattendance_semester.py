@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:27
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_semesters(apps, schema_editor):
+    # Earlier rows did not record a semester; the student's current one is the best available
+    StudentAttendance = apps.get_model('attendance', 'StudentAttendance')
+    StudentProfile = apps.get_model('campus', 'StudentProfile')
+    StudentAttendance.objects.update(semester=Subquery(
+        StudentProfile.objects.filter(user_id=OuterRef('student_id')).values('semester')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0007_rollupdeletion'),
+        ('campus', '0029_attendance_semester'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentattendance',
+            name='semester',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(backfill_semesters, migrations.RunPython.noop),
+    ]
@@ -1,17 +1,130 @@
-from django.db import models
+from datetime import date
+from django.db import models, transaction
+from django.db.models import ExpressionWrapper, F, FloatField, OuterRef, Subquery
 from users.models import CustomUser
 from courses.models import Course
 
+def summary_percentage():
+    """Subquery for the course percentage of the student on each StudentAttendance row."""
+    return Subquery(
+        CourseAttendanceSummary.objects.filter(
+            student=OuterRef('student'), course=OuterRef('course'), total_days__gt=0
+        ).annotate(
+            value=ExpressionWrapper(F('present_days') * 100.0 / F('total_days'), output_field=FloatField())
+        ).values('value')[:1],
+        output_field=FloatField(),
+    )
+
+class StudentAttendanceQuerySet(models.QuerySet):
+    def with_percentage(self):
+        # Lists of records should use this; the property alone costs a query per row
+        return self.annotate(course_percentage=summary_percentage())
+
+    def mark(self, course, statuses):
+        """Record today's marks for many students in a constant number of queries.
+
+        ``statuses`` maps student ids to ``True`` (present) or ``False``
+        (absent); ids that are not students are skipped. New rows are inserted
+        and changed ones updated in bulk, and each CourseAttendanceSummary gets
+        the delta the per-row signals would apply, alerting students who drop
+        below LOW_ATTENDANCE_THRESHOLD. Returns ``(created, updated)``.
+        """
+        from django.utils import timezone
+        from campus.attendance_utils import LOW_ATTENDANCE_THRESHOLD
+        from campus.email_utils import build_attendance_alert_email, enqueue_emails
+        from campus.models import StudentProfile
+
+        day = date.today()
+        statuses = {int(student_id): bool(present) for student_id, present in statuses.items()}
+        students = CustomUser.objects.filter(id__in=statuses.keys(), role='student').in_bulk()
+        statuses = {student_id: present for student_id, present in statuses.items() if student_id in students}
+        with transaction.atomic():
+            existing = {
+                row.student_id: row
+                for row in self.select_for_update().filter(course=course, date=day, student_id__in=statuses.keys())
+            }
+            semesters = StudentProfile.semesters(statuses.keys())
+            created = [
+                self.model(student_id=student_id, course=course, present=present, semester=semesters.get(student_id, 1))
+                for student_id, present in statuses.items() if student_id not in existing
+            ]
+            changed = [row for row in existing.values() if row.present != statuses[row.student_id]]
+            now = timezone.now()
+            for row in changed:
+                row.present, row.updated_at = statuses[row.student_id], now
+            self.bulk_create(created)
+            self.bulk_update(changed, ['present', 'updated_at'])
+
+            deltas = {row.student_id: (int(row.present), 1) for row in created}
+            deltas.update({row.student_id: (1 if row.present else -1, 0) for row in changed})
+            CourseAttendanceSummary.objects.bulk_create(
+                [CourseAttendanceSummary(student_id=student_id, course=course) for student_id in deltas],
+                ignore_conflicts=True,
+            )
+            summaries = list(CourseAttendanceSummary.objects.select_for_update().filter(course=course, student_id__in=deltas.keys()))
+            alerts = []
+            for summary in summaries:
+                was_below = summary.total_days and summary.percentage < LOW_ATTENDANCE_THRESHOLD
+                present_delta, total_delta = deltas[summary.student_id]
+                summary.present_days += present_delta
+                summary.total_days += total_delta
+                # Alert only when the student crosses the threshold, as the per-row signal does
+                if summary.percentage < LOW_ATTENDANCE_THRESHOLD and not was_below:
+                    alerts.append(summary)
+            CourseAttendanceSummary.objects.bulk_update(summaries, ['present_days', 'total_days'])
+            enqueue_emails(
+                {'to_email': students[summary.student_id].email,
+                 **build_attendance_alert_email(students[summary.student_id], summary.percentage)}
+                for summary in alerts
+            )
+        return len(created), len(changed)
+
 class StudentAttendance(models.Model):
     student = models.ForeignKey(CustomUser, on_delete=models.CASCADE, limit_choices_to={'role': 'student'})
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     date = models.DateField(auto_now_add=True)
     present = models.BooleanField(default=False)
-    percentage = models.FloatField(default=0.0)  # Calculated field (update via signal)
+    semester = models.IntegerField(null=True, blank=True, db_index=True)  # Student's semester when marked
+    updated_at = models.DateTimeField(auto_now=True, null=True, db_index=True)
+
+    objects = StudentAttendanceQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=['date', 'id'])]
 
     def __str__(self):
         return f"{self.student.email} - {self.course.name} - {self.date}"
 
+    def save(self, *args, **kwargs):
+        if self.semester is None:
+            from campus.models import StudentProfile
+            self.semester = StudentProfile.semesters([self.student_id]).get(self.student_id)
+        super().save(*args, **kwargs)
+
+    @property
+    def percentage(self):
+        if 'course_percentage' in self.__dict__:
+            return self.course_percentage or 0.0
+        summary = CourseAttendanceSummary.objects.filter(student_id=self.student_id, course_id=self.course_id).first()
+        return summary.percentage if summary else 0.0
+
+class CourseAttendanceSummary(models.Model):
+    # Maintained incrementally by attendance.signals; never recomputed per save
+    student = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='course_attendance_summaries')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='attendance_summaries')
+    present_days = models.PositiveIntegerField(default=0)
+    total_days = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('student', 'course')
+
+    def __str__(self):
+        return f"{self.student.email} - {self.course.name} ({self.present_days}/{self.total_days})"
+
+    @property
+    def percentage(self):
+        return (self.present_days / self.total_days * 100) if self.total_days else 0.0
+
 class TeacherAttendance(models.Model):
     teacher = models.ForeignKey(
         CustomUser,
@@ -22,5 +135,203 @@ class TeacherAttendance(models.Model):
     date = models.DateField(auto_now_add=True)
     present = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [models.Index(fields=['date', 'id'])]
+
+    def __str__(self):
+        return f"{self.teacher.email} - {self.date}"
+
+class MonthlyCourseAttendance(models.Model):
+    # Rollup of StudentAttendance per student x course x month (see refresh_attendance_rollups)
+    student = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='monthly_attendance')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    month = models.DateField(help_text="First day of the month")
+    present_days = models.PositiveIntegerField(default=0)
+    total_days = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('student', 'course', 'month')
+        indexes = [models.Index(fields=['month', 'course'])]
+
+    def __str__(self):
+        return f"{self.student.email} - {self.course.name} - {self.month:%B %Y}"
+
+    @property
+    def percentage(self):
+        return (self.present_days / self.total_days * 100) if self.total_days else 0.0
+
+class SectionDailyAttendance(models.Model):
+    # Rollup of campus.Attendance per semester/section x day (see refresh_attendance_rollups)
+    semester = models.IntegerField()
+    section = models.CharField(max_length=10, blank=True)
+    date = models.DateField()
+    present_count = models.PositiveIntegerField(default=0)
+    total_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('semester', 'section', 'date')
+        indexes = [models.Index(fields=['date'])]
+
     def __str__(self):
-        return f"{self.teacher.email} - {self.date}"
\ No newline at end of file
+        return f"Sem {self.semester} {self.section} - {self.date}"
+
+    @property
+    def percentage(self):
+        return (self.present_count / self.total_count * 100) if self.total_count else 0.0
+
+class RollupDeletion(models.Model):
+    # Day of a deleted attendance mark; refresh_attendance_rollups recomputes it and clears the row
+    SOURCE_CHOICES = [('course', 'Course attendance'), ('campus', 'Daily attendance')]
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES)
+    date = models.DateField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.source} - {self.date}"
+
+class AttendanceLedgerManager(models.Manager):
+    def mark(self, course, statuses, day=None):
+        """Record one day for many students in a constant number of queries.
+
+        ``statuses`` maps student ids to ``True`` (present) or ``False`` (absent).
+        Ledgers are keyed by each student's current semester. Missing ledgers
+        are inserted first and every ledger is then locked before its bits are
+        changed, so concurrent marks of the same course don't overwrite each other.
+        """
+        from campus.models import StudentProfile
+
+        day = day or date.today()
+        statuses = {int(student_id): present for student_id, present in statuses.items()}
+        semesters = StudentProfile.semesters(statuses.keys())
+        keys = {student_id: semesters.get(student_id, 1) for student_id in statuses}
+        with transaction.atomic():
+            existing = set(
+                self.filter(course=course, student_id__in=statuses.keys()).values_list('student_id', 'semester')
+            )
+            missing = [
+                self.model(student_id=student_id, course=course, semester=semester, start_date=day)
+                for student_id, semester in keys.items() if (student_id, semester) not in existing
+            ]
+            # Another request may insert the same ledger in the meantime; the lock below picks it up
+            self.bulk_create(missing, ignore_conflicts=True)
+            ledgers = [
+                ledger for ledger in self.select_for_update().filter(course=course, student_id__in=statuses.keys())
+                if keys[ledger.student_id] == ledger.semester
+            ]
+            for ledger in ledgers:
+                ledger.set_day(day, statuses[ledger.student_id])
+            self.bulk_update(ledgers, ['start_date', 'present_bits', 'held_bits'])
+        return len(missing), len(ledgers) - len(missing)
+
+    def unmark(self, course, student_ids, day):
+        """Forget ``day`` for these students, e.g. when their daily record is deleted."""
+        with transaction.atomic():
+            ledgers = list(self.select_for_update().filter(
+                course=course, student_id__in=student_ids, start_date__lte=day,
+            ))
+            for ledger in ledgers:
+                ledger.clear_day(day)
+            self.bulk_update(ledgers, ['present_bits', 'held_bits'])
+        return len(ledgers)
+
+class AttendanceLedger(models.Model):
+    """Packed attendance for one student, course and semester.
+
+    Bit ``n`` of ``held_bits`` is set when class was held ``n`` days after
+    ``start_date``; the same bit of ``present_bits`` is set when the student
+    attended. A full semester fits in a few dozen bytes per student.
+    """
+    student = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='attendance_ledgers')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='attendance_ledgers')
+    semester = models.IntegerField()
+    start_date = models.DateField()
+    present_bits = models.BinaryField(default=b'')
+    held_bits = models.BinaryField(default=b'')
+
+    objects = AttendanceLedgerManager()
+
+    class Meta:
+        unique_together = ('student', 'course', 'semester')
+
+    def __str__(self):
+        return f"{self.student.email} - {self.course.name} (Sem {self.semester})"
+
+    @staticmethod
+    def _to_int(bits):
+        return int.from_bytes(bytes(bits), 'little')
+
+    @staticmethod
+    def _to_bytes(value):
+        return value.to_bytes((value.bit_length() + 7) // 8, 'little')
+
+    @property
+    def present(self):
+        return self._to_int(self.present_bits)
+
+    @property
+    def held(self):
+        return self._to_int(self.held_bits)
+
+    def set_day(self, day, present=True):
+        self.set_days({day: present})
+
+    def set_days(self, marks):
+        """Apply a ``{date: present}`` mapping to the bitsets in memory."""
+        present_bits, held_bits = self.present, self.held
+        earliest = min(marks)
+        if earliest < self.start_date:
+            # Rebase so bit 0 stays the earliest recorded day
+            shift = (self.start_date - earliest).days
+            present_bits, held_bits = present_bits << shift, held_bits << shift
+            self.start_date = earliest
+        for day, is_present in marks.items():
+            bit = 1 << (day - self.start_date).days
+            held_bits |= bit
+            present_bits = (present_bits | bit) if is_present else (present_bits & ~bit)
+        self.present_bits = self._to_bytes(present_bits)
+        self.held_bits = self._to_bytes(held_bits)
+
+    def clear_day(self, day):
+        """Drop ``day`` from the bitsets in memory, as if class was never held."""
+        offset = (day - self.start_date).days
+        if offset < 0:
+            return
+        mask = ~(1 << offset)
+        self.present_bits = self._to_bytes(self.present & mask)
+        self.held_bits = self._to_bytes(self.held & mask)
+
+    @property
+    def present_days(self):
+        return self.present.bit_count()
+
+    @property
+    def total_days(self):
+        return self.held.bit_count()
+
+    @property
+    def percentage(self):
+        total = self.total_days
+        return (self.present_days / total * 100) if total else 0.0
+
+    def _held_marks(self):
+        # Present/absent for each held day, oldest first
+        present, held = self.present, self.held
+        return [bool(present >> n & 1) for n in range(held.bit_length()) if held >> n & 1]
+
+    @property
+    def current_streak(self):
+        """Consecutive classes attended, counting back from the latest one."""
+        streak = 0
+        for attended in reversed(self._held_marks()):
+            if not attended:
+                break
+            streak += 1
+        return streak
+
+    @property
+    def longest_streak(self):
+        longest = streak = 0
+        for attended in self._held_marks():
+            streak = streak + 1 if attended else 0
+            longest = max(longest, streak)
+        return longest
@@ -1,21 +1,55 @@
-from django.db.models.signals import post_save
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from django.core.mail import send_mail
-from .models import StudentAttendance
+from campus.attendance_utils import LOW_ATTENDANCE_THRESHOLD
+from campus.email_utils import queue_attendance_alert_email
+from campus.models import Attendance
+from .models import StudentAttendance, CourseAttendanceSummary, RollupDeletion
+
+
+@receiver(pre_save, sender=StudentAttendance)
+def remember_previous_mark(sender, instance, **kwargs):
+    # Remember the stored value so post_save can apply a delta instead of recounting
+    instance._previous_present = None
+    if instance.pk:
+        instance._previous_present = (
+            StudentAttendance.objects.filter(pk=instance.pk).values_list('present', flat=True).first()
+        )
+
 
 @receiver(post_save, sender=StudentAttendance)
-def update_attendance_percentage(sender, instance, **kwargs):
-    total_days = StudentAttendance.objects.filter(student=instance.student, course=instance.course).count()
-    present_days = StudentAttendance.objects.filter(student=instance.student, course=instance.course, present=True).count()
-    if total_days > 0:
-        instance.percentage = (present_days / total_days) * 100
-        instance.save()
-
-    if instance.percentage < 80:
-        send_mail(
-            'Low Attendance Alert',
-            f'Your attendance for {instance.course.name} is {instance.percentage:.1f}%.',
-            'from@example.com',  # Replace with your email or configure in settings.py
-            [instance.student.email],
-            fail_silently=True,
-        )
\ No newline at end of file
+def update_course_summary(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_present', None)
+    if created or previous is None:
+        present_delta, total_delta = int(instance.present), 1
+    elif previous != instance.present:
+        present_delta, total_delta = (1 if instance.present else -1), 0
+    else:
+        return
+
+    summary, _ = CourseAttendanceSummary.objects.get_or_create(student_id=instance.student_id, course_id=instance.course_id)
+    was_below = summary.total_days and summary.percentage < LOW_ATTENDANCE_THRESHOLD
+    CourseAttendanceSummary.objects.filter(pk=summary.pk).update(
+        present_days=F('present_days') + present_delta,
+        total_days=F('total_days') + total_delta,
+    )
+    summary.present_days += present_delta
+    summary.total_days += total_delta
+
+    # Alert only when the student crosses the threshold, not on every save
+    if summary.percentage < LOW_ATTENDANCE_THRESHOLD and not was_below:
+        queue_attendance_alert_email(instance.student, summary.percentage)
+
+
+@receiver(post_delete, sender=StudentAttendance)
+def remove_from_course_summary(sender, instance, **kwargs):
+    CourseAttendanceSummary.objects.filter(student_id=instance.student_id, course_id=instance.course_id).update(
+        present_days=F('present_days') - int(instance.present),
+        total_days=F('total_days') - 1,
+    )
+    RollupDeletion.objects.create(source='course', date=instance.date)
+
+
+@receiver(post_delete, sender=Attendance)
+def remember_deleted_daily_mark(sender, instance, **kwargs):
+    RollupDeletion.objects.create(source='campus', date=instance.date)
@@ -1,3 +1,279 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.admin.sites import AdminSite
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from campus.models import Attendance
+from courses.models import Course
+from users.models import CustomUser
+
+from .admin import StudentAttendanceAdmin
+from .checks import check_daily_attendance_rows
+from .models import AttendanceLedger, CourseAttendanceSummary, MonthlyCourseAttendance, RollupDeletion, SectionDailyAttendance, StudentAttendance, TeacherAttendance
+from .views import attendance_feed
+
+
+class AttendanceLedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = Course.objects.create(name='BIM', level='bachelor', fee_structure='-')
+        cls.students = [
+            CustomUser.objects.create_user(f'student{i}@example.com', 'pass', role='student') for i in range(3)
+        ]
+        cls.ids = [student.id for student in cls.students]
+
+    def ledger(self, student):
+        return AttendanceLedger.objects.get(student=student, course=self.course)
+
+    def test_mark_creates_then_updates_ledgers(self):
+        today = date.today()
+        self.assertEqual(AttendanceLedger.objects.mark(self.course, {self.ids[0]: True, self.ids[1]: False}, today), (2, 0))
+        self.assertEqual(AttendanceLedger.objects.mark(self.course, {self.ids[0]: False, self.ids[2]: True}, today + timedelta(days=1)), (1, 1))
+        first = self.ledger(self.students[0])
+        self.assertEqual((first.present_days, first.total_days), (1, 2))
+        self.assertEqual((first.current_streak, first.longest_streak), (0, 1))
+        self.assertEqual(self.ledger(self.students[2]).start_date, today + timedelta(days=1))
+
+    def test_remarking_a_day_replaces_it(self):
+        today = date.today()
+        AttendanceLedger.objects.mark(self.course, {self.ids[0]: True}, today)
+        AttendanceLedger.objects.mark(self.course, {self.ids[0]: False}, today)
+        ledger = self.ledger(self.students[0])
+        self.assertEqual((ledger.present_days, ledger.total_days), (0, 1))
+
+    def test_earlier_day_rebases_ledger(self):
+        today = date.today()
+        AttendanceLedger.objects.mark(self.course, {self.ids[0]: True}, today)
+        AttendanceLedger.objects.mark(self.course, {self.ids[0]: True}, today - timedelta(days=3))
+        ledger = self.ledger(self.students[0])
+        self.assertEqual(ledger.start_date, today - timedelta(days=3))
+        self.assertEqual((ledger.present_days, ledger.total_days, ledger.current_streak), (2, 2, 2))
+
+    def test_unmark_forgets_day(self):
+        today = date.today()
+        AttendanceLedger.objects.mark(self.course, {self.ids[0]: True}, today - timedelta(days=1))
+        AttendanceLedger.objects.mark(self.course, {self.ids[0]: False}, today)
+        AttendanceLedger.objects.unmark(self.course, [self.ids[0]], today)
+        ledger = self.ledger(self.students[0])
+        self.assertEqual((ledger.present_days, ledger.total_days), (1, 1))
+
+    def test_mark_attendance_view_writes_ledger_and_daily_rows(self):
+        teacher = CustomUser.objects.create_user('teacher@example.com', 'pass', role='teacher')
+        self.client.force_login(teacher)
+        response = self.client.post(reverse('attendance:mark_attendance'), {
+            'course_id': self.course.id,
+            'students': [str(i) for i in self.ids],
+            'present_students': [str(self.ids[0])],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(StudentAttendance.objects.filter(course=self.course).count(), 3)
+        self.assertEqual(self.ledger(self.students[0]).present_days, 1)
+        self.assertEqual(self.ledger(self.students[1]).total_days, 1)
+
+        response = self.client.post(reverse('attendance:mark_attendance'), {
+            'course_id': 999999, 'students': [str(self.ids[0])],
+        })
+        self.assertEqual(response.status_code, 404)
+
+    def test_admin_edit_and_delete_update_ledger(self):
+        model_admin = StudentAttendanceAdmin(StudentAttendance, AdminSite())
+        request = RequestFactory().post('/')
+        record = StudentAttendance.objects.create(student=self.students[0], course=self.course, present=True)
+        AttendanceLedger.objects.mark(self.course, {self.ids[0]: True}, record.date)
+
+        record.present = False
+        model_admin.save_model(request, record, None, change=True)
+        ledger = self.ledger(self.students[0])
+        self.assertEqual((ledger.present_days, ledger.total_days), (0, 1))
+
+        model_admin.delete_queryset(request, StudentAttendance.objects.filter(pk=record.pk))
+        self.assertEqual(self.ledger(self.students[0]).total_days, 0)
+
+
+class RefreshAttendanceRollupsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = Course.objects.create(name='BIM', level='bachelor', fee_structure='-')
+        cls.student = CustomUser.objects.create_user('rollup@example.com', 'pass', role='student')
+        cls.teacher = CustomUser.objects.create_user('rollup-teacher@example.com', 'pass', role='teacher')
+
+    def refresh(self):
+        call_command('refresh_attendance_rollups', stdout=StringIO())
+
+    def test_late_committed_rows_are_picked_up(self):
+        record = StudentAttendance.objects.create(student=self.student, course=self.course, present=True)
+        self.refresh()
+        # A row stamped just before the last run but committed after it
+        late = StudentAttendance.objects.create(student=self.student, course=self.course, present=False)
+        StudentAttendance.objects.filter(pk=late.pk).update(updated_at=record.updated_at - timedelta(seconds=1))
+        self.refresh()
+        rollup = MonthlyCourseAttendance.objects.get(student=self.student, course=self.course)
+        self.assertEqual((rollup.present_days, rollup.total_days), (1, 2))
+
+    def test_deleted_marks_leave_the_rollups(self):
+        kept = Attendance.objects.create(student=self.student, teacher=self.teacher, present=True)
+        gone = Attendance.objects.create(student=self.student, present=False)
+        record = StudentAttendance.objects.create(student=self.student, course=self.course, present=True)
+        self.refresh()
+        self.assertEqual(SectionDailyAttendance.objects.get(date=kept.date).total_count, 2)
+
+        gone.delete()
+        record.delete()
+        self.refresh()
+        self.assertEqual(SectionDailyAttendance.objects.get(date=kept.date).total_count, 1)
+        self.assertFalse(MonthlyCourseAttendance.objects.exists())
+        self.assertFalse(RollupDeletion.objects.exists())
+
+
+class StudentAttendancePercentageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = Course.objects.create(name='BIM', level='bachelor', fee_structure='-')
+        cls.students = [
+            CustomUser.objects.create_user(f'percent{i}@example.com', 'pass', role='student') for i in range(3)
+        ]
+        for student in cls.students:
+            StudentAttendance.objects.create(student=student, course=cls.course, present=student != cls.students[0])
+
+    def test_listing_reads_percentages_in_one_query(self):
+        with self.assertNumQueries(1):
+            percentages = [record.percentage for record in StudentAttendance.objects.with_percentage().order_by('id')]
+        self.assertEqual(percentages, [0.0, 100.0, 100.0])
+
+    def test_property_without_annotation(self):
+        record = StudentAttendance.objects.filter(student=self.students[1]).first()
+        self.assertEqual(record.percentage, 100.0)
+
+
+class AttendanceFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = Course.objects.create(name='BIM', level='bachelor', fee_structure='-')
+        cls.admin = CustomUser.objects.create_user('feed-admin@example.com', 'pass', role='admin')
+        student = CustomUser.objects.create_user('feed-student@example.com', 'pass', role='student')
+        teacher = CustomUser.objects.create_user('feed-teacher@example.com', 'pass', role='teacher')
+        today = date.today()
+        # Student and teacher rows share days, so pages must break ties on kind and id
+        for days_ago in range(3):
+            for _ in range(2):
+                record = StudentAttendance.objects.create(student=student, course=cls.course, present=True)
+                StudentAttendance.objects.filter(pk=record.pk).update(date=today - timedelta(days=days_ago))
+            record = TeacherAttendance.objects.create(teacher=teacher, present=True)
+            TeacherAttendance.objects.filter(pk=record.pk).update(date=today - timedelta(days=days_ago))
+
+    def keys(self, rows):
+        return [(row['row_date'], row['kind'], row['row_id']) for row in rows]
+
+    def test_pages_cover_the_feed_once_in_order(self):
+        everything, last_cursor = attendance_feed(limit=100)
+        self.assertIsNone(last_cursor)
+        self.assertEqual(len(everything), 9)
+        self.assertEqual(self.keys(everything), sorted(self.keys(everything), reverse=True))
+
+        paged, cursor = [], None
+        while True:
+            rows, next_cursor = attendance_feed(cursor=cursor, limit=2)
+            paged += rows
+            if next_cursor is None:
+                break
+            cursor_date, cursor_kind, cursor_id = next_cursor.split('|')
+            cursor = (date.fromisoformat(cursor_date), cursor_kind, int(cursor_id))
+        self.assertEqual(self.keys(paged), self.keys(everything))
+
+    def test_list_view_follows_the_cursor(self):
+        self.client.force_login(self.admin)
+        first = self.client.get(reverse('attendance:attendance_list'), {'role': 'student'})
+        self.assertEqual(len(first.context['records']), 6)
+        self.assertIsNone(first.context['next_cursor'])
+
+        rows, cursor = attendance_feed(role='student', limit=4)
+        second = self.client.get(reverse('attendance:attendance_list'), {'role': 'student', 'cursor': cursor})
+        self.assertEqual(self.keys(second.context['records']), self.keys(attendance_feed(role='student')[0])[4:])
+
+
+class ViewAttendanceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        course = Course.objects.create(name='BIM', level='bachelor', fee_structure='-')
+        cls.student = CustomUser.objects.create_user('monthly@example.com', 'pass', role='student')
+        MonthlyCourseAttendance.objects.create(
+            student=cls.student, course=course, month=date.today().replace(day=1), present_days=3, total_days=4
+        )
+
+    def test_student_view_reads_monthly_rollups(self):
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('attendance:view_attendance'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '75.0%')
+
+    def test_teacher_view_renders(self):
+        teacher = CustomUser.objects.create_user('monthly-teacher@example.com', 'pass', role='teacher')
+        TeacherAttendance.objects.create(teacher=teacher, present=True)
+        self.client.force_login(teacher)
+        response = self.client.get(reverse('attendance:view_attendance_by_role', args=['teacher']))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['attendance_records']), 1)
+
+
+class MarkAttendanceViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = Course.objects.create(name='BIM', level='bachelor', fee_structure='-')
+        cls.teacher = CustomUser.objects.create_user('mark-teacher@example.com', 'pass', role='teacher')
+        cls.students = [
+            CustomUser.objects.create_user(f'mark{i}@example.com', 'pass', role='student') for i in range(4)
+        ]
+
+    def post(self, students, present):
+        return self.client.post(reverse('attendance:mark_attendance'), {
+            'course_id': self.course.id,
+            'students': [student.id for student in students],
+            'present_students': [student.id for student in present],
+        })
+
+    def summary(self, student):
+        summary = CourseAttendanceSummary.objects.get(student=student, course=self.course)
+        return summary.present_days, summary.total_days
+
+    def test_form_renders(self):
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('attendance:mark_attendance'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'BIM')
+
+    def test_marks_are_upserted_with_summary_deltas(self):
+        self.client.force_login(self.teacher)
+        first, second = self.students[:2]
+        self.post([first, second, self.teacher], present=[first])
+        self.assertEqual(StudentAttendance.objects.count(), 2)
+        self.assertEqual((self.summary(first), self.summary(second)), ((1, 1), (0, 1)))
+
+        self.post([first, second], present=[second])
+        self.assertEqual(StudentAttendance.objects.count(), 2)
+        self.assertEqual((self.summary(first), self.summary(second)), ((0, 1), (1, 1)))
+        self.assertEqual(AttendanceLedger.objects.get(student=second, course=self.course).present_days, 1)
+
+    def test_query_count_does_not_grow_with_the_roster(self):
+        self.client.force_login(self.teacher)
+        with CaptureQueriesContext(connection) as small:
+            self.post(self.students[:1], present=[])
+        StudentAttendance.objects.all().delete()
+        with CaptureQueriesContext(connection) as large:
+            self.post(self.students, present=[])
+        self.assertEqual(len(large), len(small))
+
+
+class DailyRowsSettingTests(SimpleTestCase):
+    def test_default_passes(self):
+        self.assertEqual(check_daily_attendance_rows(None), [])
+
+    @override_settings(ATTENDANCE_STORE_DAILY_ROWS=False)
+    def test_turning_daily_rows_off_is_refused(self):
+        [error] = check_daily_attendance_rows(None)
+        self.assertEqual(error.id, 'attendance.E001')
+        self.assertIn('attendance_feed', error.hint)
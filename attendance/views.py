@@ -1,10 +1,13 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from .models import StudentAttendance, TeacherAttendance  # Updated import
+from .models import StudentAttendance, TeacherAttendance, MonthlyCourseAttendance, AttendanceLedger, summary_percentage
+from courses.models import Course
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import CharField, F, FloatField, Q, Value
 from django.contrib.auth import get_user_model
 from datetime import date
-from django.core.paginator import Paginator
 
 User = get_user_model()
 
@@ -23,19 +26,28 @@ def mark_attendance(request):
         if not course_id:
             messages.error(request, 'Course ID is required.')
             return redirect('attendance:mark_attendance')
-        for student_id in students:
-            student = User.objects.get(id=student_id)
-            present = student_id in request.POST.getlist('present_students', [])
-            StudentAttendance.objects.update_or_create(
-                student=student,
-                course_id=course_id,
-                date=date.today(),
-                defaults={'present': present}
-            )
+        present_students = request.POST.getlist('present_students', [])
+        course = get_object_or_404(Course, id=course_id)
+        statuses = {int(student_id): student_id in present_students for student_id in students}
+        # The ledger and the daily rows must agree, so they are written together
+        with transaction.atomic():
+            AttendanceLedger.objects.mark(course, statuses)
+            if getattr(settings, 'ATTENDANCE_STORE_DAILY_ROWS', True):
+                StudentAttendance.objects.mark(course, statuses)
         messages.success(request, 'Attendance marked successfully.')
         return redirect('attendance:view_attendance', role='student')  # Updated redirect
-    students = User.objects.filter(role='student')
-    return render(request, 'attendance/mark_attendance.html', {'students': students})
+    from campus.roster_utils import resolve_roster
+    subjects, subject, sections, section, students = resolve_roster(
+        request.user, request.GET.get('subject'), request.GET.get('section')
+    )
+    return render(request, 'attendance/mark_attendance.html', {
+        'students': students,
+        'subjects': subjects,
+        'subject': subject,
+        'sections': sections,
+        'section': section,
+        'courses': Course.objects.order_by('name'),
+    })
 
 @login_required
 @teacher_required
@@ -58,32 +70,114 @@ def view_attendance(request, role=None):
             teacher=request.user,
             date__gte=date.today().replace(day=1)
         ).order_by('date')
+        monthly_summaries = []
     else:  # Default to student role or all students
-        attendees = User.objects.filter(role='student') if not role else User.objects.filter(role=role)
-        attendance_records = StudentAttendance.objects.filter(
-            student__in=attendees,
-            date__gte=date.today().replace(day=1)
-        ).order_by('date')
+        # Read the monthly rollups (refresh_attendance_rollups) instead of scanning raw marks
+        attendance_records = []
+        monthly_summaries = MonthlyCourseAttendance.objects.filter(
+            month=date.today().replace(day=1),
+            student__role=role or 'student',
+        ).select_related('student', 'course').order_by('course__name', 'student__email')
     return render(request, 'attendance/view_attendance.html', {
         'attendance_records': attendance_records,
+        'monthly_summaries': monthly_summaries,
         'role': role or 'student'
     })
 
+FEED_PAGE_SIZE = 10
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+def _after_cursor(queryset, kind, cursor):
+    # Keyset condition for ORDER BY date DESC, kind DESC, id DESC; kind is constant per branch
+    if not cursor:
+        return queryset
+    cursor_date, cursor_kind, cursor_id = cursor
+    same_day = Q(date=cursor_date)
+    if kind == cursor_kind:
+        same_day &= Q(id__lt=cursor_id)
+    elif kind > cursor_kind:
+        same_day = Q(pk__in=[])
+    return queryset.filter(Q(date__lt=cursor_date) | same_day)
+
+def attendance_feed(role=None, course_id=None, date_from=None, date_to=None, cursor=None, limit=FEED_PAGE_SIZE):
+    """Student and teacher attendance as one UNION ALL query, newest first.
+
+    ``cursor`` is the (date, kind, id) of the last row already shown, so
+    every page is a bounded index scan regardless of its position.
+    """
+    date_filter = Q()
+    if date_from:
+        date_filter &= Q(date__gte=date_from)
+    if date_to:
+        date_filter &= Q(date__lte=date_to)
+
+    branches = []
+    if role in (None, 'student'):
+        students = StudentAttendance.objects.filter(date_filter)
+        if course_id:
+            students = students.filter(course_id=course_id)
+        students = _after_cursor(students, 'student', cursor)
+        branches.append(students.annotate(
+            kind=Value('student', output_field=CharField()),
+            row_id=F('id'),
+            row_date=F('date'),
+            row_present=F('present'),
+            email=F('student__email'),
+            course_name=F('course__name'),
+            percentage=summary_percentage(),
+        ).values('kind', 'row_id', 'row_date', 'row_present', 'email', 'course_name', 'percentage'))
+    if role in (None, 'teacher') and not course_id:
+        teachers = _after_cursor(TeacherAttendance.objects.filter(date_filter), 'teacher', cursor)
+        branches.append(teachers.annotate(
+            kind=Value('teacher', output_field=CharField()),
+            row_id=F('id'),
+            row_date=F('date'),
+            row_present=F('present'),
+            email=F('teacher__email'),
+            course_name=Value(None, output_field=CharField()),
+            percentage=Value(None, output_field=FloatField()),
+        ).values('kind', 'row_id', 'row_date', 'row_present', 'email', 'course_name', 'percentage'))
+    if not branches:
+        return [], None
+
+    if connection.features.supports_slicing_ordering_in_compound:
+        # Limit each branch first so the (date, id) indexes bound the work per page
+        branches = [branch.order_by('-row_date', '-row_id')[:limit + 1] for branch in branches]
+    feed = branches[0].union(*branches[1:], all=True) if len(branches) > 1 else branches[0]
+    rows = list(feed.order_by('-row_date', '-kind', '-row_id')[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = f"{last['row_date'].isoformat()}|{last['kind']}|{last['row_id']}"
+    return rows, next_cursor
+
 @login_required
 @admin_or_teacher_required
 def attendance_list(request):
-    # Combine student and teacher attendance
-    student_attendance = StudentAttendance.objects.all().order_by('date')
-    teacher_attendance = TeacherAttendance.objects.all().order_by('date')
-    
-    # Paginate the combined records (e.g., 10 per page)
-    all_attendance = list(student_attendance) + list(teacher_attendance)
-    all_attendance.sort(key=lambda x: x.date, reverse=True)  # Sort by date descending
-    paginator = Paginator(all_attendance, 10)  # 10 items per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
+    role = request.GET.get('role') if request.GET.get('role') in ('student', 'teacher') else None
+    course_id = request.GET.get('course') if (request.GET.get('course') or '').isdigit() else None
+    date_from = _parse_date(request.GET.get('date_from'))
+    date_to = _parse_date(request.GET.get('date_to'))
+
+    cursor = None
+    try:
+        cursor_date, cursor_kind, cursor_id = request.GET['cursor'].split('|')
+        cursor = (date.fromisoformat(cursor_date), cursor_kind, int(cursor_id))
+    except (KeyError, ValueError):
+        pass
+
+    records, next_cursor = attendance_feed(role, course_id, date_from, date_to, cursor)
+    filters = request.GET.copy()
+    filters.pop('cursor', None)
     return render(request, 'attendance/attendance_list.html', {
-        'page_obj': page_obj,
-        'role': 'all'  # Indicate all roles
-    })
\ No newline at end of file
+        'records': records,
+        'next_cursor': next_cursor,
+        'filters': filters.urlencode(),
+        'role': role or 'all',
+    })
@@ -0,0 +1,181 @@
+"""
+Attendance analytics for ShankerDev Campus Portal
+Loads attendance into a students x days NumPy matrix and computes
+percentages, rolling two-week rates, weekday absence rates and at-risk
+students
+"""
+
+from datetime import date, timedelta
+
+import numpy as np
+
+from .attendance_utils import LOW_ATTENDANCE_THRESHOLD
+from .models import Attendance
+
+TREND_WINDOW_DAYS = 14
+DEFAULT_WINDOW_DAYS = 16 * 7  # About one semester when no dates are given
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+def load_attendance_matrix(semester=None, section=None, start_date=None, end_date=None):
+    """Fetch attendance with one query and pivot it into arrays.
+
+    Returns ``(students, days, held, present)`` where ``students`` is a list of
+    ``(id, email, semester, section)`` tuples, ``days`` an array of dates and
+    ``held``/``present`` are ``students x days`` count matrices. A student
+    marked by several teachers on one day contributes several classes.
+
+    Like the exports, ``semester`` is the one recorded with each mark, so a
+    promoted student's history stays in the semester it was taken in; a
+    student's tuple carries the semester of their latest mark.
+    """
+    records = Attendance.objects.all()
+    if semester:
+        records = records.filter(semester=semester)
+    if section:
+        records = records.filter(student__studentprofile__section=section)
+    if start_date:
+        records = records.filter(date__gte=start_date)
+    if end_date:
+        records = records.filter(date__lte=end_date)
+    rows = list(records.order_by('date').values_list(
+        'student_id', 'student__email', 'semester',
+        'student__studentprofile__section', 'date', 'present',
+    ))
+
+    latest = {row[0]: row[:4] for row in rows}
+    students = sorted(latest.values())
+    days = np.array(sorted({row[4] for row in rows}), dtype=object)
+    held = np.zeros((len(students), len(days)), dtype=np.int32)
+    present = np.zeros_like(held)
+    if not rows:
+        return students, days, held, present
+
+    student_index = {student[0]: i for i, student in enumerate(students)}
+    day_index = {day: i for i, day in enumerate(days)}
+    r = np.fromiter((student_index[row[0]] for row in rows), dtype=np.intp, count=len(rows))
+    c = np.fromiter((day_index[row[4]] for row in rows), dtype=np.intp, count=len(rows))
+    p = np.fromiter((row[5] for row in rows), dtype=np.int32, count=len(rows))
+    np.add.at(held, (r, c), 1)
+    np.add.at(present, (r, c), p)
+    return students, days, held, present
+
+
+def _rate(present, held):
+    # Percentage per row, 0 where nothing was held
+    totals = held.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(totals > 0, present.sum(axis=1) / totals * 100, 0.0)
+
+
+def rolling_rates(days, held, present, window_days=TREND_WINDOW_DAYS):
+    """Attendance over the ``window_days`` calendar days ending on each recorded day.
+
+    Returns a ``students x days`` float matrix (NaN where no class was held
+    in the window) computed from cumulative sums, so it costs the same for
+    any window length.
+    """
+    ordinals = np.array([day.toordinal() for day in days], dtype=np.int64)
+    starts = np.searchsorted(ordinals, ordinals - window_days + 1)
+    zero = np.zeros((held.shape[0], 1), dtype=np.int64)
+    held_sums = np.hstack([zero, np.cumsum(held, axis=1)])
+    present_sums = np.hstack([zero, np.cumsum(present, axis=1)])
+    ends = np.arange(1, len(days) + 1)
+    window_held = held_sums[:, ends] - held_sums[:, starts]
+    window_present = present_sums[:, ends] - present_sums[:, starts]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(window_held > 0, window_present / window_held * 100, np.nan)
+
+
+def _series(values):
+    return [None if np.isnan(value) else round(float(value), 1) for value in values]
+
+
+def compute_attendance_analytics(semester=None, section=None, start_date=None, end_date=None,
+                                 threshold=LOW_ATTENDANCE_THRESHOLD):
+    """Summarise attendance for a semester and/or section as plain Python data.
+
+    Without dates only the last ``DEFAULT_WINDOW_DAYS`` are analysed, so the
+    report never loads the whole attendance history.
+    """
+    if start_date is None:
+        start_date = (end_date or date.today()) - timedelta(days=DEFAULT_WINDOW_DAYS - 1)
+    window = {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat() if end_date else None}
+    students, days, held, present = load_attendance_matrix(semester, section, start_date, end_date)
+    if not students:
+        return {
+            'days': 0, 'dates': [], 'students': [], 'at_risk': [], 'rolling': [], 'weekday_absence': {},
+            'weekdays': WEEKDAYS, 'section_heatmap': [], **window,
+        }
+
+    percentage = _rate(present, held)
+
+    # Rolling two-week rate on every recorded day; the trend compares the latest
+    # value with the one two weeks earlier
+    rolling = rolling_rates(days, held, present)
+    overall_rolling = rolling_rates(days, held.sum(axis=0, keepdims=True), present.sum(axis=0, keepdims=True))[0]
+    last_day = days[-1]
+    recent_mask = np.array([day > last_day - timedelta(days=TREND_WINDOW_DAYS) for day in days])
+    recent_rate = _rate(present[:, recent_mask], held[:, recent_mask])
+    earlier = np.searchsorted(
+        np.array([day.toordinal() for day in days]), (last_day - timedelta(days=TREND_WINDOW_DAYS)).toordinal(), side='right'
+    ) - 1
+    if earlier >= 0:
+        trend = np.nan_to_num(rolling[:, -1] - rolling[:, earlier])
+    else:
+        trend = np.zeros(len(students))
+
+    # Project another two weeks at the recent rate and class frequency
+    recent_classes = held[:, recent_mask].sum(axis=1)
+    total_classes = held.sum(axis=1)
+    projected = (present.sum(axis=1) + recent_rate / 100 * recent_classes) / np.maximum(total_classes + recent_classes, 1) * 100
+    at_risk = (percentage < threshold) | (projected < threshold)
+
+    weekdays = np.array([day.weekday() for day in days])
+    weekday_absence = {}
+    for weekday in range(7):
+        columns = weekdays == weekday
+        classes = held[:, columns].sum()
+        if classes:
+            weekday_absence[WEEKDAYS[weekday]] = round(float((classes - present[:, columns].sum()) / classes * 100), 1)
+
+    # Section x weekday attendance rates
+    groups = sorted({(student[2], student[3]) for student in students}, key=lambda g: (g[0] or 0, g[1] or ''))
+    group_of = np.array([groups.index((student[2], student[3])) for student in students])
+    section_heatmap = []
+    for g, (group_semester, group_section) in enumerate(groups):
+        rows = group_of == g
+        cells = []
+        for weekday in range(7):
+            columns = weekdays == weekday
+            classes = held[np.ix_(rows, columns)].sum()
+            cells.append(round(float(present[np.ix_(rows, columns)].sum() / classes * 100), 1) if classes else None)
+        section_heatmap.append({'semester': group_semester, 'section': group_section, 'rates': cells})
+
+    summary = [
+        {
+            'id': student[0],
+            'email': student[1],
+            'semester': student[2],
+            'section': student[3],
+            'percentage': round(float(percentage[i]), 1),
+            'recent_rate': round(float(recent_rate[i]), 1),
+            'trend': round(float(trend[i]), 1),
+            'projected': round(float(projected[i]), 1),
+            'at_risk': bool(at_risk[i]),
+            'rolling': _series(rolling[i]),
+        }
+        for i, student in enumerate(students)
+    ]
+    dates = [day.isoformat() for day in days]
+    return {
+        'days': len(days),
+        'dates': dates,
+        'students': summary,
+        'at_risk': sorted((s for s in summary if s['at_risk']), key=lambda s: s['projected']),
+        'rolling': [{'date': day, 'rate': rate} for day, rate in zip(dates, _series(overall_rolling))],
+        'weekday_absence': weekday_absence,
+        'weekdays': WEEKDAYS,
+        'section_heatmap': section_heatmap,
+        **window,
+    }
@@ -0,0 +1,168 @@
+"""
+Attendance export for ShankerDev Campus Portal
+Yields attendance as rows (or a students x days pivot) straight from the
+database cursor, and as CSV or XLSX chunks, so exports use constant memory
+regardless of size
+"""
+
+import re
+import zipfile
+from itertools import groupby
+from xml.sax.saxutils import escape
+
+from attendance.models import StudentAttendance
+from .models import Attendance
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+def attendance_queryset(source='campus', semester=None, section=None, date_from=None, date_to=None):
+    """Filtered attendance for ``source`` ('campus' marks or per-'course' marks)."""
+    if source == 'course':
+        records = StudentAttendance.objects.select_related('student', 'course')
+    else:
+        records = Attendance.objects.select_related('student', 'teacher', 'student__studentprofile')
+    if semester:
+        # The semester recorded with each mark, so past semesters export correctly
+        records = records.filter(semester=semester)
+    if section:
+        records = records.filter(student__studentprofile__section=section)
+    if date_from:
+        records = records.filter(date__gte=date_from)
+    if date_to:
+        records = records.filter(date__lte=date_to)
+    return records
+
+
+def _profile(student):
+    return getattr(student, 'studentprofile', None)
+
+
+def iter_attendance_rows(records, source='campus'):
+    """Yield a header row followed by one row per attendance mark."""
+    if source == 'course':
+        yield ['Date', 'Student Email', 'Student Name', 'Course', 'Status']
+        for record in records.order_by('date', 'student__email').iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            yield [
+                record.date.isoformat(), record.student.email, record.student.get_full_name(),
+                record.course.name, 'Present' if record.present else 'Absent',
+            ]
+        return
+
+    yield ['Date', 'Student Email', 'Student Name', 'Semester', 'Section', 'Marked By', 'Status']
+    for record in records.order_by('date', 'student__email').iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        profile = _profile(record.student)
+        yield [
+            record.date.isoformat(), record.student.email, record.student.get_full_name(),
+            record.semester or '', (profile.section or '') if profile else '',
+            record.teacher.email if record.teacher else '', 'Present' if record.present else 'Absent',
+        ]
+
+
+def iter_attendance_pivot(records):
+    """Yield a students x days grid: P, A or present/held when marked more than once a day."""
+    days = list(records.dates('date', 'day'))
+    yield ['Student Email', 'Student Name'] + [day.isoformat() for day in days] + ['Attendance %']
+
+    column = {day: i for i, day in enumerate(days)}
+    marks = records.order_by('student__email', 'student_id', 'date').iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    for _, student_marks in groupby(marks, key=lambda record: record.student_id):
+        held = [0] * len(days)
+        present = [0] * len(days)
+        student = None
+        for record in student_marks:
+            student = record.student
+            held[column[record.date]] += 1
+            present[column[record.date]] += int(record.present)
+        cells = [
+            '' if not h else ('P' if p == h else 'A' if p == 0 else f"{p}/{h}")
+            for p, h in zip(present, held)
+        ]
+        total = sum(held)
+        yield [student.email, student.get_full_name()] + cells + [f"{sum(present) / total * 100:.1f}" if total else '']
+
+
+# Minimal single-sheet XLSX package; the sheet XML is written row by row
+_XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="{sheet}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'
+    ),
+}
+_INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class _ChunkSink:
+    """Write-only file object that hands back whatever zipfile wrote since the last drain."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _xlsx_cell(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c><v>{value}</v></c>'
+    text = escape(_INVALID_XML_CHARS.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def iter_xlsx(rows, sheet='Attendance'):
+    """Yield an XLSX workbook of ``rows`` in chunks while the rows are still being read.
+
+    The archive is written to a non-seekable sink, so zipfile streams each
+    part and nothing is spooled to disk.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_PARTS.items():
+            archive.writestr(name, content.format(sheet=escape(sheet, {'"': '&quot;'})))
+        with archive.open('xl/worksheets/sheet1.xml', 'w') as part:
+            part.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            for count, row in enumerate(rows, 1):
+                part.write(('<row>' + ''.join(_xlsx_cell(value) for value in row) + '</row>').encode())
+                if count % EXPORT_CHUNK_SIZE == 0:
+                    yield sink.drain()
+            part.write(b'</sheetData></worksheet>')
+    yield sink.drain()
@@ -0,0 +1,147 @@
+"""
+Attendance utilities for ShankerDev Campus Portal
+Set-based helpers for marking attendance and maintaining profile counters
+"""
+
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import Attendance, StudentProfile
+
+User = get_user_model()
+
+# Minimum attendance percentage required to sit for examinations
+LOW_ATTENDANCE_THRESHOLD = 80
+
+
+def mark_attendance_bulk(teacher, statuses, day=None):
+    """Mark attendance for many students at once.
+
+    ``statuses`` maps student ids to ``True`` (present) or ``False`` (absent).
+    The roster is loaded once, all ``Attendance`` rows are upserted in a
+    single statement and the ``StudentProfile`` counters are adjusted with
+    set-based ``F()`` updates. Re-submitting the same day only applies the
+    difference, so counters are never double-counted.
+
+    Returns a dict with ``created``, ``updated`` and ``skipped`` counts and
+    ``outcomes`` mapping each applied student id to ``'created'`` or
+    ``'updated'``.
+    """
+    day = day or date.today()
+    statuses = {int(student_id): bool(present) for student_id, present in statuses.items()}
+
+    with transaction.atomic():
+        roster = set(
+            User.objects.filter(id__in=statuses.keys(), role='student').values_list('id', flat=True)
+        )
+        skipped = len(statuses) - len(roster)
+        statuses = {student_id: present for student_id, present in statuses.items() if student_id in roster}
+        if not statuses:
+            return {'created': 0, 'updated': 0, 'skipped': skipped, 'outcomes': {}}
+
+        previous = dict(
+            Attendance.objects.filter(
+                student_id__in=statuses.keys(), teacher=teacher, date=day
+            ).values_list('student_id', 'present')
+        )
+
+        # Rows keep the semester the student is in now, so exports by semester stay historical
+        semesters = StudentProfile.semesters(statuses.keys())
+        Attendance.objects.bulk_create(
+            [
+                Attendance(student_id=student_id, teacher=teacher, date=day, present=present,
+                           semester=semesters.get(student_id, 1))
+                for student_id, present in statuses.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['student', 'teacher', 'date'],
+            update_fields=['present', 'updated_at'],
+        )
+
+        # Make sure every student has a profile before adjusting counters
+        StudentProfile.objects.bulk_create(
+            [StudentProfile(user_id=student_id) for student_id in statuses],
+            ignore_conflicts=True,
+        )
+
+        new_present = [s for s, p in statuses.items() if s not in previous and p]
+        new_absent = [s for s, p in statuses.items() if s not in previous and not p]
+        now_present = [s for s, p in statuses.items() if s in previous and p and not previous[s]]
+        now_absent = [s for s, p in statuses.items() if s in previous and not p and previous[s]]
+
+        profiles = StudentProfile.objects
+        if new_present:
+            profiles.filter(user_id__in=new_present).update(
+                attended_days=F('attended_days') + 1, total_days=F('total_days') + 1
+            )
+        if new_absent:
+            profiles.filter(user_id__in=new_absent).update(total_days=F('total_days') + 1)
+        if now_present:
+            profiles.filter(user_id__in=now_present).update(attended_days=F('attended_days') + 1)
+        if now_absent:
+            profiles.filter(user_id__in=now_absent).update(attended_days=F('attended_days') - 1)
+
+    return {
+        'created': len(new_present) + len(new_absent),
+        'updated': len(statuses) - len(new_present) - len(new_absent),
+        'skipped': skipped,
+        'outcomes': {s: ('updated' if s in previous else 'created') for s in statuses},
+    }
+
+
+def sync_attendance_batch(teacher, idempotency_key, marks):
+    """Apply an offline batch of attendance marks exactly once.
+
+    ``marks`` is a list of ``{'student': id, 'date': 'YYYY-MM-DD', 'status':
+    'present' | 'absent'}`` dicts, possibly spanning several days. The whole
+    batch is applied in one transaction and its per-row results are stored
+    under ``idempotency_key``, so a replay costs a single lookup and returns
+    the original response.
+
+    Returns ``(result, replayed)``; ``result['results']`` holds one of
+    ``created``, ``updated``, ``skipped`` or ``invalid`` per input mark.
+    """
+    from .models import AttendanceSyncBatch
+
+    batch = AttendanceSyncBatch.objects.filter(teacher=teacher, idempotency_key=idempotency_key).first()
+    if batch:
+        return batch.result, True
+
+    results = ['invalid'] * len(marks)
+    by_day = {}
+    for i, mark in enumerate(marks):
+        try:
+            day = date.fromisoformat(mark['date'])
+            student_id = int(mark['student'])
+            status = mark['status']
+        except (KeyError, TypeError, ValueError):
+            continue
+        if status not in ('present', 'absent') or day > date.today():
+            continue
+        entries = by_day.setdefault(day, {})
+        if student_id in entries:
+            # Only the last mark for a student and day is applied
+            results[entries[student_id][0]] = 'skipped'
+        entries[student_id] = (i, status == 'present')
+
+    try:
+        with transaction.atomic():
+            for day, entries in sorted(by_day.items()):
+                outcome = mark_attendance_bulk(
+                    teacher, {student_id: present for student_id, (_, present) in entries.items()}, day
+                )['outcomes']
+                for student_id, (i, _) in entries.items():
+                    results[i] = outcome.get(student_id, 'skipped')
+            result = {'idempotency_key': idempotency_key, 'results': results}
+            AttendanceSyncBatch.objects.create(teacher=teacher, idempotency_key=idempotency_key, result=result)
+    except IntegrityError:
+        # A concurrent replay of the same batch committed first
+        batch = AttendanceSyncBatch.objects.filter(teacher=teacher, idempotency_key=idempotency_key).first()
+        if batch is None:
+            # Some other write conflicted; nothing was applied, so the batch can be retried
+            raise
+        return batch.result, True
+    return result, False
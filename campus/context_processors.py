@@ -0,0 +1,10 @@
+def unread_notifications(request):
+    """Expose the cached unread notification count; evaluated only when a template uses it."""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated or user.role == 'admin':
+        return {}
+
+    def count():
+        from .notification_utils import unread_count
+        return unread_count(user)
+    return {'unread_notification_count': count}
@@ -0,0 +1,117 @@
+"""
+Concurrent email delivery for ShankerDev Campus Portal
+Sends a batch of messages over a small pool of open SMTP connections with
+asyncio, under a token-bucket rate limit counted in SMTP messages
+"""
+
+import asyncio
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+DispatchResult = namedtuple('DispatchResult', ['message', 'sent', 'error'])
+
+
+class TokenBucket:
+    """Allow ``rate_per_minute`` sends, with bursts of up to one second's worth."""
+
+    def __init__(self, rate_per_minute):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def _reopen(connection):
+    # A failed send may leave the session broken; start a fresh one for the next message
+    connection.close()
+    try:
+        connection.open()
+    except Exception:
+        pass  # The next send on this connection fails and is reported like any other
+
+
+class EmailDispatcher:
+    """A pool of SMTP connections that sends message batches concurrently.
+
+    Connections stay open between ``send`` calls until ``close`` (or the end
+    of a ``with`` block), and the rate limit, counted per SMTP message (a
+    BCC batch is one), spans all batches. The SMTP client is blocking, so each send runs in a worker
+    thread while asyncio keeps one send in flight per connection.
+    """
+
+    def __init__(self, connections=None, rate_per_minute=None):
+        self.size = connections or settings.EMAIL_DISPATCH_CONNECTIONS
+        if rate_per_minute is None:
+            rate_per_minute = settings.EMAIL_RATE_LIMIT_PER_MINUTE
+        self.bucket = TokenBucket(rate_per_minute) if rate_per_minute else None
+        self.connections = []
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def open(self):
+        if not self.connections:
+            self.connections = [get_connection() for _ in range(self.size)]
+            for connection in self.connections:
+                _reopen(connection)
+
+    def close(self):
+        for connection in self.connections:
+            connection.close()
+        self.connections = []
+
+    def send(self, messages):
+        """Send ``messages``; returns a DispatchResult per message, in order.
+
+        Blocks until every message is sent. Called from a running event loop
+        (async code), the batch runs on its own loop in a helper thread, since
+        ``asyncio.run`` cannot nest; prefer ``sync_to_async(dispatcher.send)``
+        there so the caller's loop is not blocked.
+        """
+        self.open()
+        messages = list(messages)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self._send_all(messages))
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, self._send_all(messages)).result()
+
+    async def _send_all(self, messages):
+        idle = asyncio.Queue()
+        for connection in self.connections:
+            idle.put_nowait(connection)
+
+        async def send_one(message):
+            if self.bucket:
+                await self.bucket.acquire()
+            connection = await idle.get()
+            try:
+                message.connection = connection
+                await asyncio.to_thread(connection.send_messages, [message])
+                return DispatchResult(message, True, '')
+            except Exception as e:
+                await asyncio.to_thread(_reopen, connection)
+                return DispatchResult(message, False, str(e))
+            finally:
+                idle.put_nowait(connection)
+
+        return await asyncio.gather(*(send_one(message) for message in messages))
@@ -1,40 +1,177 @@
 """
 Email utilities for ShankerDev Campus Portal
-Functions to send various types of emails with HTML templates
+Functions to build, queue and send various types of emails with HTML templates
 """
 
 from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.conf import settings
-from django.utils.html import strip_tags
+from django.utils.html import conditional_escape, strip_tags
+from functools import lru_cache
 import logging
+import re
+import secrets
 
 logger = logging.getLogger(__name__)
 
 
+def _display_name(user):
+    return f"{user.first_name} {user.last_name}" if user.first_name else user.email
+
+
+def _render(subject, template, context):
+    html_content = render_to_string(template, context)
+    return {'subject': subject, 'body': strip_tags(html_content), 'html_body': html_content}
+
+
+@lru_cache(maxsize=128)
+def _compile_layout(template, subject, context_items, fields):
+    """Render ``template`` once with a placeholder for each per-recipient field.
+
+    Returns the subject, HTML and plain-text versions split around the
+    placeholders, so filling them in is a join rather than a render.
+    Placeholders carry a random token per render, so shared text (an
+    assignment description, say) can never be mistaken for one.
+    """
+    token = secrets.token_hex(16)
+    pattern = re.compile(rf'@@{token}:(\w+)@@')
+    context = dict(context_items)
+    context.update({field: f'@@{token}:{field}@@' for field in fields})
+    html_content = render_to_string(template, context)
+    return (
+        tuple(pattern.split(subject)),
+        tuple(pattern.split(html_content)),
+        tuple(pattern.split(strip_tags(html_content))),
+    )
+
+
+def _fill(parts, values, escape=False):
+    # Odd positions of a re.split() with one group are the field names
+    return ''.join(
+        (conditional_escape(values[part]) if escape else str(values[part])) if i % 2 else part
+        for i, part in enumerate(parts)
+    )
+
+
+class BulkEmailRenderer:
+    """Render an email template once and fill in per-recipient fields by substitution.
+
+    ``context`` is shared by every recipient; ``recipient_fields`` names the
+    template variables that differ (plain ``{{ variable }}`` output only,
+    not filtered or used in tags). Rendered layouts are cached by template
+    and context, so the same mail-out to another batch is not rendered again.
+    """
+
+    def __init__(self, template, subject, context, recipient_fields=()):
+        key = (template, subject, tuple(sorted(context.items())), tuple(recipient_fields))
+        try:
+            layout = _compile_layout(*key)
+        except TypeError:
+            layout = _compile_layout.__wrapped__(*key)  # Unhashable context values; render uncached
+        self._subject, self._html, self._text = layout
+
+    def render(self, **fields):
+        """Subject, text and HTML body for one recipient"""
+        return {
+            'subject': _fill(self._subject, fields),
+            'body': _fill(self._text, fields),
+            'html_body': _fill(self._html, fields, escape=True),
+        }
+
+
+def build_welcome_email(user):
+    """Subject, text and HTML body of the welcome email"""
+    return _render('Welcome to ShankerDev Campus Portal', 'emails/welcome_email.html', {
+        'user_name': _display_name(user),
+        'email': user.email,
+        'role': user.role,
+        'date': user.date_joined.strftime('%B %d, %Y'),
+        'subject': 'Welcome to ShankerDev Campus Portal'
+    })
+
+
+def build_attendance_alert_email(student, attendance_percentage):
+    """Subject, text and HTML body of the low attendance alert"""
+    return _render('Low Attendance Alert - ShankerDev Campus', 'emails/attendance_alert_email.html', {
+        'student_name': _display_name(student),
+        'attendance_percentage': f"{attendance_percentage:.1f}",
+        'subject': 'Low Attendance Alert - Action Required'
+    })
+
+
+def build_assignment_notification_email(student, assignment, teacher):
+    """Subject, text and HTML body of the new assignment notification"""
+    return _render(f'New Assignment: {assignment.title}', 'emails/assignment_notification_email.html', {
+        'student_name': _display_name(student),
+        'assignment_title': assignment.title,
+        'semester': assignment.semester,
+        'due_date': assignment.due_date.strftime('%B %d, %Y'),
+        'description': assignment.description,
+        'teacher_name': _display_name(teacher),
+        'subject': f'New Assignment: {assignment.title}'
+    })
+
+
+def build_assignment_notification_emails(students, assignment, teacher):
+    """``(student, content)`` for each student, rendering the assignment email only once"""
+    subject = f'New Assignment: {assignment.title}'
+    renderer = BulkEmailRenderer('emails/assignment_notification_email.html', subject, {
+        'assignment_title': assignment.title,
+        'semester': assignment.semester,
+        'due_date': assignment.due_date.strftime('%B %d, %Y'),
+        'description': assignment.description,
+        'teacher_name': _display_name(teacher),
+        'subject': subject
+    }, recipient_fields=['student_name'])
+    for student in students:
+        yield student, renderer.render(student_name=_display_name(student))
+
+
+def build_fee_reminder_email(student, amount, due_date):
+    """Subject, text and HTML body of the fee payment reminder"""
+    return _render('Fee Payment Reminder - ShankerDev Campus', 'emails/fee_reminder_email.html', {
+        'student_name': _display_name(student),
+        'amount': f"{amount:,.2f}",
+        'due_date': due_date.strftime('%B %d, %Y'),
+        'subject': 'Fee Payment Reminder'
+    })
+
+
+# Where each role reads its notifications in the portal
+NOTIFICATION_PAGES = {
+    'student': '/campus/student/notifications/',
+    'teacher': '/campus/teacher/',
+    'admin': '/campus/admin/',
+}
+
+
+def build_digest_email(user, notifications):
+    """Subject, text and HTML body of a digest of ``notifications`` (oldest first)"""
+    subject = f"Your ShankerDev Campus digest: {len(notifications)} update{'s' if len(notifications) != 1 else ''}"
+    return _render(subject, 'emails/digest_email.html', {
+        'user_name': _display_name(user),
+        'notifications': notifications,
+        'notifications_path': NOTIFICATION_PAGES.get(user.role, '/login/'),
+        'subject': subject
+    })
+
+
+def _send(content, to_email, connection=None):
+    email = EmailMultiAlternatives(
+        subject=content['subject'],
+        body=content['body'],
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[to_email],
+        connection=connection
+    )
+    email.attach_alternative(content['html_body'], "text/html")
+    email.send(fail_silently=False)
+
+
 def send_welcome_email(user):
     """Send welcome email to newly registered users"""
     try:
-        context = {
-            'user_name': f"{user.first_name} {user.last_name}" if user.first_name else user.email,
-            'email': user.email,
-            'role': user.role,
-            'date': user.date_joined.strftime('%B %d, %Y'),
-            'subject': 'Welcome to ShankerDev Campus Portal'
-        }
-        
-        html_content = render_to_string('emails/welcome_email.html', context)
-        text_content = strip_tags(html_content)
-        
-        email = EmailMultiAlternatives(
-            subject='Welcome to ShankerDev Campus Portal',
-            body=text_content,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[user.email]
-        )
-        email.attach_alternative(html_content, "text/html")
-        email.send(fail_silently=False)
-        
+        _send(build_welcome_email(user), user.email)
         logger.info(f"Welcome email sent to {user.email}")
         return True
     except Exception as e:
@@ -42,27 +179,10 @@ def send_welcome_email(user):
         return False
 
 
-def send_attendance_alert_email(student, attendance_percentage):
-    """Send low attendance alert to students"""
+def send_attendance_alert_email(student, attendance_percentage, connection=None):
+    """Send low attendance alert to students (optionally over an open connection)"""
     try:
-        context = {
-            'student_name': f"{student.first_name} {student.last_name}" if student.first_name else student.email,
-            'attendance_percentage': f"{attendance_percentage:.1f}",
-            'subject': 'Low Attendance Alert - Action Required'
-        }
-        
-        html_content = render_to_string('emails/attendance_alert_email.html', context)
-        text_content = strip_tags(html_content)
-        
-        email = EmailMultiAlternatives(
-            subject='Low Attendance Alert - ShankerDev Campus',
-            body=text_content,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[student.email]
-        )
-        email.attach_alternative(html_content, "text/html")
-        email.send(fail_silently=False)
-        
+        _send(build_attendance_alert_email(student, attendance_percentage), student.email, connection)
         logger.info(f"Attendance alert sent to {student.email}")
         return True
     except Exception as e:
@@ -73,29 +193,7 @@ def send_attendance_alert_email(student, attendance_percentage):
 def send_assignment_notification_email(student, assignment, teacher):
     """Send new assignment notification to students"""
     try:
-        context = {
-            'student_name': f"{student.first_name} {student.last_name}" if student.first_name else student.email,
-            'assignment_title': assignment.title,
-            'subject': assignment.subject.name,
-            'semester': assignment.semester,
-            'due_date': assignment.due_date.strftime('%B %d, %Y'),
-            'description': assignment.description,
-            'teacher_name': f"{teacher.first_name} {teacher.last_name}" if teacher.first_name else teacher.email,
-            'subject': f'New Assignment: {assignment.title}'
-        }
-        
-        html_content = render_to_string('emails/assignment_notification_email.html', context)
-        text_content = strip_tags(html_content)
-        
-        email = EmailMultiAlternatives(
-            subject=f'New Assignment: {assignment.title}',
-            body=text_content,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[student.email]
-        )
-        email.attach_alternative(html_content, "text/html")
-        email.send(fail_silently=False)
-        
+        _send(build_assignment_notification_email(student, assignment, teacher), student.email)
         logger.info(f"Assignment notification sent to {student.email}")
         return True
     except Exception as e:
@@ -106,25 +204,7 @@ def send_assignment_notification_email(student, assignment, teacher):
 def send_fee_reminder_email(student, amount, due_date):
     """Send fee payment reminder to students"""
     try:
-        context = {
-            'student_name': f"{student.first_name} {student.last_name}" if student.first_name else student.email,
-            'amount': f"{amount:,.2f}",
-            'due_date': due_date.strftime('%B %d, %Y'),
-            'subject': 'Fee Payment Reminder'
-        }
-        
-        html_content = render_to_string('emails/fee_reminder_email.html', context)
-        text_content = strip_tags(html_content)
-        
-        email = EmailMultiAlternatives(
-            subject='Fee Payment Reminder - ShankerDev Campus',
-            body=text_content,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[student.email]
-        )
-        email.attach_alternative(html_content, "text/html")
-        email.send(fail_silently=False)
-        
+        _send(build_fee_reminder_email(student, amount, due_date), student.email)
         logger.info(f"Fee reminder sent to {student.email}")
         return True
     except Exception as e:
@@ -132,29 +212,162 @@ def send_fee_reminder_email(student, amount, due_date):
         return False
 
 
+# Outbox: views and signals queue emails inside their transaction and the
+# send_queued_emails command delivers them, keeping SMTP off the request path
+
+def enqueue_email(to_email, subject, body, html_body='', from_email='', sensitive=False):
+    """Queue one email in the outbox"""
+    from .models import EmailOutbox
+    return EmailOutbox.objects.create(
+        to_email=to_email, subject=subject, body=body, html_body=html_body,
+        from_email=from_email, sensitive=sensitive,
+    )
+
+
+def enqueue_emails(messages):
+    """Queue many emails with one insert; ``messages`` are enqueue_email() keyword dicts"""
+    from .models import EmailOutbox
+    return EmailOutbox.objects.bulk_create([EmailOutbox(**message) for message in messages], batch_size=500)
+
+
+def enqueue_bcc_emails(recipients, subject, body, html_body='', from_email='', batch_size=None):
+    """Queue one non-personalised email to many recipients as BCC batches.
+
+    Each batch is one outbox row and one SMTP transaction, retried as a unit
+    if it fails, and counts once against EMAIL_RATE_LIMIT_PER_MINUTE: with
+    the default ``batch_size`` (EMAIL_BCC_BATCH_SIZE, 50) 2,000 recipients
+    take 40 sends instead of 2,000. The message has no To header, so no
+    recipient sees the others' addresses.
+    """
+    recipients = list(recipients)
+    batch_size = batch_size or settings.EMAIL_BCC_BATCH_SIZE
+    return enqueue_emails(
+        {'bcc': recipients[start:start + batch_size], 'subject': subject, 'body': body,
+         'html_body': html_body, 'from_email': from_email}
+        for start in range(0, len(recipients), batch_size)
+    )
+
+
+def queue_welcome_email(user):
+    return enqueue_email(user.email, **build_welcome_email(user))
+
+
+def queue_attendance_alert_email(student, attendance_percentage):
+    return enqueue_email(student.email, **build_attendance_alert_email(student, attendance_percentage))
+
+
+def queue_assignment_notification_email(student, assignment, teacher):
+    return enqueue_email(student.email, **build_assignment_notification_email(student, assignment, teacher))
+
+
+def queue_assignment_notification_emails(students, assignment, teacher):
+    return enqueue_emails(
+        {'to_email': student.email, **content}
+        for student, content in build_assignment_notification_emails(students, assignment, teacher)
+    )
+
+
+def queue_fee_reminder_email(student, amount, due_date):
+    return enqueue_email(student.email, **build_fee_reminder_email(student, amount, due_date))
+
+
+# Delivery log: every email about an event on a source object is recorded
+# once per user, checked for a whole recipient set with one query and
+# recorded with one insert. Call both inside the transaction that queues the
+# emails so the log and the outbox commit (or roll back) together.
+
+def delivery_source(obj):
+    """Source key of a model instance, e.g. ``assignment:12``"""
+    return f"{obj._meta.model_name}:{obj.pk}"
+
+
+def attendance_alert_event(day=None):
+    """Attendance alerts are one event per day: source 'attendance', event 'low:<date>'"""
+    from datetime import date
+    return f"low:{(day or date.today()).isoformat()}"
+
+
+def delivered_user_ids(source, event, channel='email', user_ids=None):
+    """Ids of users already sent ``event`` on ``source``; optionally only among ``user_ids``"""
+    from .models import DeliveryLog
+    delivered = DeliveryLog.objects.filter(source=source, event=event, channel=channel)
+    if user_ids is not None:
+        delivered = delivered.filter(user_id__in=user_ids)
+    return set(delivered.values_list('user_id', flat=True))
+
+
+def filter_undelivered(users, source, event, channel='email'):
+    """The users in ``users`` (a queryset or list) not yet sent ``event`` on ``source``"""
+    from django.db.models import Exists, OuterRef, QuerySet
+    from .models import DeliveryLog
+    if isinstance(users, QuerySet):
+        delivered = DeliveryLog.objects.filter(source=source, event=event, channel=channel, user=OuterRef('pk'))
+        return list(users.exclude(Exists(delivered)))
+    users = list(users)
+    delivered = delivered_user_ids(source, event, channel, [user.pk for user in users])
+    return [user for user in users if user.pk not in delivered]
+
+
+def record_deliveries(users, source, event, channel='email'):
+    """Log ``event`` on ``source`` as delivered to ``users`` (users or user ids)"""
+    from .models import DeliveryLog
+    DeliveryLog.objects.bulk_create(
+        [DeliveryLog(user_id=getattr(user, 'pk', user), channel=channel, source=source, event=event) for user in users],
+        ignore_conflicts=True,
+    )
+
+
+def outbox_message(entry, connection=None):
+    """Build the EmailMultiAlternatives for a queued EmailOutbox row"""
+    email = EmailMultiAlternatives(
+        subject=entry.subject,
+        body=entry.body,
+        from_email=entry.from_email or settings.DEFAULT_FROM_EMAIL,
+        to=[entry.to_email] if entry.to_email else [],
+        bcc=entry.bcc,
+        connection=connection
+    )
+    if entry.html_body:
+        email.attach_alternative(entry.html_body, "text/html")
+    return email
+
+
+def dispatch_emails(messages, connections=None, rate_per_minute=None):
+    """Send ``messages`` concurrently over a pool of SMTP connections, rate limited.
+
+    Returns one ``DispatchResult(message, sent, error)`` per message, in order.
+    Defaults come from EMAIL_DISPATCH_CONNECTIONS and EMAIL_RATE_LIMIT_PER_MINUTE.
+    """
+    from .email_dispatch import EmailDispatcher
+    with EmailDispatcher(connections, rate_per_minute) as dispatcher:
+        return dispatcher.send(messages)
+
+
 def send_bulk_email(recipient_list, subject, html_template, context):
     """Send bulk emails to multiple recipients"""
     success_count = 0
     failed_count = 0
+    # The context is the same for everyone, so render (or reuse) the body once
+    content = BulkEmailRenderer(html_template, subject, context).render()
     
+    emails = []
     for recipient in recipient_list:
-        try:
-            html_content = render_to_string(html_template, context)
-            text_content = strip_tags(html_content)
-            
-            email = EmailMultiAlternatives(
-                subject=subject,
-                body=text_content,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                to=[recipient]
-            )
-            email.attach_alternative(html_content, "text/html")
-            email.send(fail_silently=False)
-            
+        email = EmailMultiAlternatives(
+            subject=content['subject'],
+            body=content['body'],
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[recipient]
+        )
+        email.attach_alternative(content['html_body'], "text/html")
+        emails.append(email)
+
+    for result in dispatch_emails(emails):
+        recipient = result.message.to[0]
+        if result.sent:
             success_count += 1
             logger.info(f"Bulk email sent to {recipient}")
-        except Exception as e:
+        else:
             failed_count += 1
-            logger.error(f"Failed to send bulk email to {recipient}: {str(e)}")
+            logger.error(f"Failed to send bulk email to {recipient}: {result.error}")
     
     return success_count, failed_count
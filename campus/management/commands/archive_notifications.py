@@ -0,0 +1,98 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from campus.models import Notification, NotificationArchive
+from campus.notification_utils import invalidate_unread_counts
+from notifications.models import Notification as DirectNotification
+
+DEFAULT_RETENTION_DAYS = 180
+
+
+class Command(BaseCommand):
+    help = "Move notifications older than their retention period into NotificationArchive in bounded batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--max-batches', type=int, default=None, help="Stop after this many batches per kind")
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many rows would move")
+
+    def handle(self, *args, **options):
+        policies = getattr(settings, 'NOTIFICATION_RETENTION_DAYS', {})
+        now = timezone.now()
+        moved = 0
+
+        # Audience entries (e.g. messages to selected users) take precedence over the kind's policy
+        audiences = {audience: policies[audience] for audience, _ in Notification.AUDIENCE_CHOICES if audience in policies}
+        for kind, _ in Notification.KIND_CHOICES:
+            days = policies.get(kind, policies.get('default', DEFAULT_RETENTION_DAYS))
+            if days is None:
+                continue
+            expired = Notification.objects.filter(kind=kind, created_at__lt=now - timedelta(days=days)).exclude(audience__in=audiences)
+            moved += self.archive(kind, expired, self.archive_campus, options)
+
+        for audience, days in audiences.items():
+            if days is None:
+                continue
+            expired = Notification.objects.filter(audience=audience, created_at__lt=now - timedelta(days=days))
+            moved += self.archive(audience, expired, self.archive_campus, options)
+
+        days = policies.get('direct', policies.get('default', DEFAULT_RETENTION_DAYS))
+        if days is not None:
+            expired = DirectNotification.objects.filter(sent_at__lt=now - timedelta(days=days))
+            moved += self.archive('direct', expired, self.archive_direct, options)
+
+        if moved and not options['dry_run']:
+            invalidate_unread_counts()
+        verb = "Would archive" if options['dry_run'] else "Archived"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {moved} notification(s)."))
+
+    def archive(self, kind, expired, convert, options):
+        if options['dry_run']:
+            count = expired.count()
+            self.stdout.write(f"{kind}: {count}")
+            return count
+
+        moved = batches = 0
+        while options['max_batches'] is None or batches < options['max_batches']:
+            # Each batch is its own short transaction so the live tables are never locked for long
+            with transaction.atomic():
+                batch = list(expired.order_by('id')[:options['batch_size']])
+                if not batch:
+                    break
+                NotificationArchive.objects.bulk_create(
+                    convert(batch), update_conflicts=True,
+                    unique_fields=['source', 'original_id'], update_fields=['message'],
+                )
+                expired.model.objects.filter(id__in=[row.id for row in batch]).delete()
+            moved += len(batch)
+            batches += 1
+        if moved:
+            self.stdout.write(f"{kind}: {moved}")
+        return moved
+
+    def archive_campus(self, batch):
+        through = Notification.users.through.objects.filter(notification_id__in=[n.id for n in batch if n.audience == 'users'])
+        user_ids = {}
+        for notification_id, user_id in through.values_list('notification_id', 'customuser_id'):
+            user_ids.setdefault(notification_id, []).append(user_id)
+        return [
+            NotificationArchive(
+                source='campus', original_id=n.id, message=n.text, kind=n.kind, created_at=n.created_at,
+                created_by_id=n.created_by_id, audience=n.audience, role=n.role, recipient_id=n.recipient_id,
+                semester=n.semester, section=n.section, user_ids=user_ids.get(n.id, []),
+            )
+            for n in batch
+        ]
+
+    def archive_direct(self, batch):
+        return [
+            NotificationArchive(
+                source='notifications', original_id=n.id, message=n.message, created_at=n.sent_at,
+                audience='user', recipient_id=n.user_id,
+            )
+            for n in batch
+        ]
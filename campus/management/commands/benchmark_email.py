@@ -0,0 +1,225 @@
+import math
+import threading
+import time
+from datetime import date
+
+from django.core.mail.backends.smtp import EmailBackend as SMTPBackend
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from campus import email_utils
+from campus.email_dispatch import EmailDispatcher
+from campus.management.commands.send_queued_emails import Command as OutboxWorker
+from campus.models import EmailOutbox, Faculty, StudentProfile, Subject
+from campus.smtp_sink import SMTPSink
+from users.models import CustomUser
+
+SCENARIOS = ['welcome', 'assignment', 'bulk', 'announcement']
+# Registrations timed through the view per welcome run (each one hashes a password)
+REQUEST_SAMPLES = 5
+
+_samples = []
+_samples_lock = threading.Lock()
+
+
+class TimedEmailBackend(SMTPBackend):
+    """SMTP backend that records how long each SMTP transaction took."""
+
+    def send_messages(self, email_messages):
+        for message in email_messages:
+            started = time.perf_counter()
+            try:
+                sent = super().send_messages([message])
+            except Exception:
+                sent = 0
+                if not self.fail_silently:
+                    raise
+            finally:
+                with _samples_lock:
+                    _samples.append(time.perf_counter() - started)
+        return sent
+
+
+def _p95(samples):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, math.ceil(len(ordered) * 0.95) - 1)]
+
+
+class Command(BaseCommand):
+    help = "Measure email throughput against a local SMTP sink (started in-process unless --port is given)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100,1000,10000', help="Comma separated recipient counts")
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f"Any of {', '.join(SCENARIOS)}")
+        parser.add_argument('--latency', type=float, default=0.005, help="Sink latency per message in seconds")
+        parser.add_argument('--failure-rate', type=float, default=0.0, help="Fraction of messages the sink rejects")
+        parser.add_argument('--rate-limit', type=int, default=0,
+                            help="SMTP messages per minute for the outbox paths (default 0, no limit; the local sink has no quota)")
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=None, help="Use an already running sink (e.g. manage.py smtp_sink)")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError("--sizes must be comma separated integers")
+        scenarios = [name.strip() for name in options['scenarios'].split(',')]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+
+        sink = None
+        port = options['port']
+        if port is None:
+            sink = SMTPSink(options['host'], 0, latency=options['latency'], failure_rate=options['failure_rate'], seed=1)
+            port = sink.start_in_thread()
+
+        mail_settings = override_settings(
+            EMAIL_BACKEND=f'{__name__}.TimedEmailBackend',
+            EMAIL_HOST=options['host'], EMAIL_PORT=port,
+            EMAIL_USE_TLS=False, EMAIL_USE_SSL=False, EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='',
+            DEFAULT_FROM_EMAIL='bench@localhost', ALLOWED_HOSTS=['testserver'],
+            EMAIL_RATE_LIMIT_PER_MINUTE=options['rate_limit'], EMAIL_DIGEST_MODE=False,
+        )
+        self.stdout.write(f"{'scenario':<14}{'recipients':>11}{'seconds':>10}{'msg/s':>10}{'p95 ms':>9}"
+                          f"{'failed':>8}{'SMTP tx':>9}{'request s':>11}")
+        try:
+            with mail_settings:
+                for name in scenarios:
+                    for size in sizes:
+                        self.report(name, *getattr(self, f'run_{name}')(size))
+        finally:
+            if sink is not None:
+                sink.stop()
+
+    def report(self, name, size, seconds, failed, request_seconds):
+        # ``size`` counts recipients; a BCC batch is one SMTP transaction for many of them.
+        # ``request_seconds`` is None for paths no view serves.
+        with _samples_lock:
+            samples = _samples[:]
+            _samples.clear()
+        rate = (size - failed) / seconds if seconds else 0
+        request = '-' if request_seconds is None else f'{request_seconds:.3f}'
+        self.stdout.write(
+            f"{name:<14}{size:>11}{seconds:>10.2f}{rate:>10.0f}{_p95(samples) * 1000:>9.1f}"
+            f"{failed:>8}{len(samples):>9}{request:>11}"
+        )
+
+    def students(self, size):
+        joined = timezone.now()
+        return [
+            CustomUser(email=f'bench{i}@example.com', username=f'bench{i}', first_name=f'Student{i}', last_name='Bench', role='student', date_joined=joined)
+            for i in range(size)
+        ]
+
+    def last_outbox_id(self):
+        return EmailOutbox.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+    def drain(self, last_id):
+        """Deliver the outbox rows queued after ``last_id`` like the send_queued_emails worker.
+
+        Returns (recipients, seconds, failed recipients).
+        """
+        batch = list(EmailOutbox.objects.filter(id__gt=last_id))
+        started = time.perf_counter()
+        with EmailDispatcher() as dispatcher:
+            OutboxWorker().deliver(batch, dispatcher)
+        seconds = time.perf_counter() - started
+        recipients = sum(len(entry.bcc) or 1 for entry in batch)
+        failed = sum(len(entry.bcc) or 1 for entry in batch if entry.status != 'sent')
+        return recipients, seconds, failed
+
+    # Each scenario returns (recipients, seconds until every message was handed to SMTP,
+    # failed recipients, seconds the web request took). Scenarios that go through a view
+    # run inside a transaction that is rolled back, so the benchmark users, assignments,
+    # notifications and outbox rows never persist; the request is timed through the real
+    # view with django.test.Client and the outbox drain is timed apart from it.
+
+    def run_welcome(self, size):
+        """Registration queues the welcome email; the outbox worker delivers it.
+
+        Hashing the password dominates a registration, so only the first
+        REQUEST_SAMPLES students register through the view (the reported
+        request time is their mean); the rest are created in bulk and get the
+        same welcome email queued directly.
+        """
+        from campus.email_utils import enqueue_emails
+
+        with transaction.atomic():
+            last_id = self.last_outbox_id()
+            client = Client()
+            sampled = min(size, REQUEST_SAMPLES)
+            started = time.perf_counter()
+            for i in range(sampled):
+                client.post(reverse('register'), {
+                    'email': f'bench-register{i}@example.com', 'role': 'student',
+                    'password1': 'Bench-pass-2024', 'password2': 'Bench-pass-2024',
+                })
+            request_seconds = (time.perf_counter() - started) / sampled if sampled else 0.0
+
+            students = CustomUser.objects.bulk_create(self.students(size - sampled), batch_size=1000)
+            enqueue_emails({'to_email': student.email, **email_utils.build_welcome_email(student)} for student in students)
+            recipients, seconds, failed = self.drain(last_id)
+            transaction.set_rollback(True)
+        return recipients, seconds, failed, request_seconds
+
+    def run_assignment(self, size):
+        """A teacher adds an assignment: the request queues one email per student in the semester."""
+        with transaction.atomic():
+            teacher = CustomUser.objects.create_user('bench-teacher@example.com', 'benchmark', role='teacher')
+            faculty = Faculty.objects.create(name='Benchmark')
+            subject = Subject.objects.create(name='Benchmark', faculty=faculty, semester=1)
+            students = CustomUser.objects.bulk_create(self.students(size), batch_size=1000)
+            StudentProfile.objects.bulk_create(
+                [StudentProfile(user=student, semester=1) for student in students], batch_size=1000,
+            )
+            last_id = self.last_outbox_id()
+
+            client = Client()
+            client.force_login(teacher)
+            started = time.perf_counter()
+            client.post(reverse('add_assignment'), {
+                'title': 'Benchmark', 'description': 'Benchmark assignment', 'subject': subject.id,
+                'due_date': date.today().isoformat(), 'semester': 1,
+            })
+            request_seconds = time.perf_counter() - started
+
+            # Existing semester 1 students are included, like in production
+            recipients, seconds, failed = self.drain(last_id)
+            transaction.set_rollback(True)
+        return recipients, seconds, failed, request_seconds
+
+    def run_bulk(self, size):
+        """send_bulk_email() sends synchronously and has no view, so there is no request time."""
+        started = time.perf_counter()
+        _, failed = email_utils.send_bulk_email(
+            [student.email for student in self.students(size)], 'Benchmark', 'emails/welcome_email.html',
+            {'user_name': 'Student', 'email': '', 'role': 'student', 'date': date.today().strftime('%B %d, %Y')},
+        )
+        seconds = time.perf_counter() - started
+        return size, seconds, failed, None
+
+    def run_announcement(self, size):
+        """The admin "all students" announcement: the request queues it as BCC batches."""
+        with transaction.atomic():
+            admin = CustomUser.objects.create_user('bench-admin@example.com', 'benchmark', role='admin')
+            CustomUser.objects.bulk_create(self.students(size), batch_size=1000)
+            last_id = self.last_outbox_id()
+
+            client = Client()
+            client.force_login(admin)
+            started = time.perf_counter()
+            client.post(reverse('send_notifications'), {
+                'recipient_type': 'all_students', 'subject': 'Benchmark', 'message': 'Benchmark announcement',
+            })
+            request_seconds = time.perf_counter() - started
+
+            # Only the announcement's rows; existing students are included, like in production
+            recipients, seconds, failed = self.drain(last_id)
+            transaction.set_rollback(True)
+        return recipients, seconds, failed, request_seconds
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from campus.models import StudentProfile
+from campus.notification_utils import inbox_page, unindexed_steps
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = "Fail if any notification inbox page plan scans the notification table or sorts outside an index"
+
+    def handle(self, *args, **options):
+        # Unsaved probe users: only the shape of the query matters, not its rows
+        student = CustomUser(pk=0, role='student')
+        profile = StudentProfile(user=student, semester=1, section='A')
+        teacher = CustomUser(pk=0, role='teacher')
+        queries = {
+            'student inbox': inbox_page(student, profile),
+            'student unread page': inbox_page(student, profile, cursor=(timezone.now(), 1), unread_only=True),
+            'teacher inbox': inbox_page(teacher, exclude_own=True),
+            'teacher next page': inbox_page(teacher, cursor=(timezone.now(), 1), exclude_own=True),
+        }
+        failures = []
+        for name, queryset in queries.items():
+            steps = unindexed_steps(queryset)
+            if steps:
+                failures.append(f"{name}: {'; '.join(steps)}")
+            elif options['verbosity'] >= 2:
+                self.stdout.write(queryset.explain())
+        if failures:
+            raise CommandError("Inbox queries scan or sort the notification table:\n" + "\n".join(failures))
+        self.stdout.write(self.style.SUCCESS(f"{len(queries)} inbox query plan(s) use indexes."))
@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Q
+
+from campus.models import Attendance, JobCheckpoint, StudentProfile
+
+CHECKPOINT_NAME = 'attendance_counters'
+
+
+def attendance_counts(student_ids=None):
+    """Map student ids to ``(attended_days, total_days)`` with one grouped aggregate."""
+    rows = Attendance.objects.all()
+    if student_ids is not None:
+        rows = rows.filter(student_id__in=student_ids)
+    return {
+        row['student']: (row['attended'], row['total'])
+        for row in rows.values('student').annotate(total=Count('id'), attended=Count('id', filter=Q(present=True)))
+    }
+
+
+class Command(BaseCommand):
+    help = "Recompute StudentProfile attendance counters from Attendance, report drift and optionally repair it"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true', help="Write the recomputed counters back")
+        parser.add_argument('--incremental', action='store_true',
+                            help="Only check students whose attendance changed since the last run")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        checkpoint, _ = JobCheckpoint.objects.get_or_create(name=CHECKPOINT_NAME)
+        since = checkpoint.high_water_mark if options['incremental'] else None
+
+        profiles = StudentProfile.objects.all()
+        # Rechecking a student twice is harmless
+        changed = JobCheckpoint.changed_since(Attendance.objects.all(), since)
+        student_ids = None
+        # Taken before the scan, so the next run starts no later than what this one saw
+        latest = changed.aggregate(latest=Max('updated_at'))['latest']
+        if since is not None:
+            # Deleted marks and direct counter edits leave no trace here; a full run covers them
+            student_ids = list(changed.values_list('student_id', flat=True).distinct())
+            profiles = profiles.filter(user_id__in=student_ids)
+
+        counts = attendance_counts(student_ids)
+        drifted = []
+        for profile_id, user_id, attended, total in profiles.values_list('id', 'user_id', 'attended_days', 'total_days').iterator():
+            expected = counts.get(user_id, (0, 0))
+            if (attended, total) != expected:
+                drifted.append(profile_id)
+                if options['verbosity'] >= 2:
+                    self.stdout.write(
+                        f"profile {profile_id} (user {user_id}): attended {attended}/{total}, "
+                        f"expected {expected[0]}/{expected[1]}"
+                    )
+
+        repaired = 0
+        if drifted and options['repair']:
+            repaired = self.repair(drifted, options['batch_size'])
+
+        if options['repair'] or not drifted:
+            checkpoint.advance(latest)
+
+        checked = len(student_ids) if student_ids is not None else 'all'
+        message = f"Checked {checked} student(s): {len(drifted)} profile(s) drifted, {repaired} repaired."
+        self.stdout.write(self.style.WARNING(message) if len(drifted) > repaired else self.style.SUCCESS(message))
+
+    def repair(self, profile_ids, batch_size):
+        repaired = 0
+        for start in range(0, len(profile_ids), batch_size):
+            with transaction.atomic():
+                # Lock the profiles and recount so marks made since the scan are not lost
+                profiles = list(StudentProfile.objects.select_for_update().filter(id__in=profile_ids[start:start + batch_size]))
+                counts = attendance_counts([profile.user_id for profile in profiles])
+                for profile in profiles:
+                    profile.attended_days, profile.total_days = counts.get(profile.user_id, (0, 0))
+                repaired += StudentProfile.objects.bulk_update(profiles, ['attended_days', 'total_days'])
+        return repaired
@@ -0,0 +1,38 @@
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.db.models import ExpressionWrapper, F, FloatField
+
+from campus.attendance_utils import LOW_ATTENDANCE_THRESHOLD
+from campus.email_utils import attendance_alert_event, delivered_user_ids, record_deliveries, send_attendance_alert_email
+from campus.models import StudentProfile
+
+
+class Command(BaseCommand):
+    help = "Email every student whose attendance is below the threshold (at most once per day)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="List the students without sending email")
+
+    def handle(self, *args, **options):
+        profiles = list(
+            StudentProfile.objects.filter(total_days__gt=0)
+            .annotate(percentage=ExpressionWrapper(F('attended_days') * 100.0 / F('total_days'), output_field=FloatField()))
+            .filter(percentage__lt=LOW_ATTENDANCE_THRESHOLD)
+            .select_related('user')
+        )
+        event = attendance_alert_event()
+        delivered = delivered_user_ids('attendance', event)
+        profiles = [profile for profile in profiles if profile.user_id not in delivered]
+        if options['dry_run']:
+            for profile in profiles:
+                self.stdout.write(f"{profile.user.email}: {profile.percentage:.1f}%")
+            return
+
+        sent = []
+        with get_connection() as connection:
+            for profile in profiles:
+                if send_attendance_alert_email(profile.user, profile.percentage, connection=connection):
+                    sent.append(profile.user_id)
+
+        record_deliveries(sent, 'attendance', event)
+        self.stdout.write(self.style.SUCCESS(f"Sent {len(sent)} of {len(profiles)} low attendance alert(s)."))
@@ -0,0 +1,128 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from campus.email_utils import build_digest_email, enqueue_emails
+from campus.models import JobCheckpoint, Notification, NotificationReadMarker, NotificationReceipt
+from campus.notification_utils import STAFF_KEY, notification_audience_keys
+from users.models import CustomUser
+
+CHECKPOINT_NAME = 'notification_digest'
+
+
+class Command(BaseCommand):
+    help = "Queue one digest email per user covering the notifications they received since the last run (EMAIL_DIGEST_MODE)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period-hours', type=int, default=24,
+                            help="How far back the first run looks when there is no checkpoint yet")
+        parser.add_argument('--dry-run', action='store_true', help="Report digest sizes without queueing email")
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'EMAIL_DIGEST_MODE', False):
+            self.stdout.write("EMAIL_DIGEST_MODE is off; notifications are emailed as they happen.")
+            return
+
+        now = timezone.now()
+        checkpoint, _ = JobCheckpoint.objects.get_or_create(name=CHECKPOINT_NAME)
+        since = checkpoint.high_water_mark or now - timedelta(hours=options['period_hours'])
+
+        notifications = list(
+            Notification.objects.filter(created_at__gt=since, created_at__lte=now)
+            .exclude(kind__in=Notification.HIDDEN_KINDS)
+            .select_related('created_by').order_by('created_at', 'id')
+        )
+        digests = self.collect(notifications, since)
+
+        if options['dry_run']:
+            for user, notes in digests:
+                self.stdout.write(f"{user.email}: {len(notes)}")
+            return
+
+        with transaction.atomic():
+            enqueue_emails(
+                {'to_email': user.email, 'from_email': settings.EMAIL_HOST_USER or '', **build_digest_email(user, notes)}
+                for user, notes in digests
+            )
+            checkpoint.high_water_mark = now
+            checkpoint.save(update_fields=['high_water_mark', 'updated_at'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Queued {len(digests)} digest(s) covering {len(notifications)} notification(s)."
+        ))
+
+    def collect(self, notifications, since):
+        """``(user, notifications)`` pairs for every user with unread notifications in the period.
+
+        Recipients are loaded with one query per audience the period's
+        notifications went to, so the work follows the notifications and not
+        the number of users.
+        """
+        if not notifications:
+            return []
+        ids = [note.id for note in notifications]
+        targeted = {}
+        for notification_id, user_id in Notification.users.through.objects.filter(
+            notification_id__in=ids
+        ).values_list('notification_id', 'customuser_id'):
+            targeted.setdefault(notification_id, []).append(user_id)
+        notes_by_audience = {}
+        for note in notifications:
+            for key in notification_audience_keys(note, targeted.get(note.id, ())):
+                notes_by_audience.setdefault(key, []).append(note)
+
+        users = {}
+        received = {}
+
+        def deliver(user, notes):
+            users[user.id] = user
+            received.setdefault(user.id, set()).update(note.id for note in notes)
+
+        direct = {}
+        for key, notes in notes_by_audience.items():
+            if key.startswith('user:'):
+                direct[int(key.split(':')[1])] = notes
+            else:
+                for user in self.audience_users(key):
+                    deliver(user, notes)
+        # Every user addressed directly, in one query
+        for user in self.audience_users('all').filter(id__in=direct):
+            deliver(user, direct[user.id])
+
+        # Anything already read or dismissed in the portal is left out of the digest
+        seen = set(NotificationReceipt.objects.filter(notification_id__in=ids).values_list('notification_id', 'user_id'))
+        read_through = dict(
+            NotificationReadMarker.objects.filter(read_through__gt=since).values_list('user_id', 'read_through')
+        )
+
+        by_id = {note.id: note for note in notifications}
+        order = {note.id: position for position, note in enumerate(notifications)}
+        digests = []
+        for user_id in sorted(received):
+            marker = read_through.get(user_id)
+            notes = [
+                by_id[note_id] for note_id in sorted(received[user_id], key=order.__getitem__)
+                if by_id[note_id].created_by_id != user_id
+                and (note_id, user_id) not in seen
+                and (marker is None or by_id[note_id].created_at > marker)
+            ]
+            if notes:
+                digests.append((users[user_id], notes))
+        return digests
+
+    def audience_users(self, key):
+        """Active users with an email address in the audience ``key`` (see notification_audience_keys)"""
+        users = CustomUser.objects.filter(is_active=True).exclude(email='')
+        if key == 'all':
+            return users
+        if key == STAFF_KEY:
+            return users.filter(role='teacher')
+        kind, _, value = key.partition(':')
+        if kind == 'role':
+            return users.filter(role=value)
+        if kind == 'semester':
+            return users.filter(role='student', studentprofile__semester=value)
+        semester, section = value.split(':', 1)
+        return users.filter(role='student', studentprofile__semester=semester, studentprofile__section=section)
@@ -0,0 +1,98 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection as db_connection, transaction
+from django.utils import timezone
+
+from campus.email_dispatch import EmailDispatcher
+from campus.email_utils import outbox_message
+from campus.models import EmailOutbox
+
+MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 60  # seconds; doubles after every failed attempt
+RETRY_MAX_DELAY = 6 * 60 * 60
+CLAIM_LEASE = timedelta(minutes=10)  # Claimed rows become due again if a worker dies mid-batch; renewed after every send
+
+
+class Command(BaseCommand):
+    help = "Deliver queued emails from the outbox over a pool of SMTP connections, retrying failures with backoff"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--loop', action='store_true', help="Keep polling the outbox instead of exiting when it is drained")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds to sleep between polls with --loop")
+        parser.add_argument('--connections', type=int, default=None,
+                            help="SMTP connections to send over concurrently (default EMAIL_DISPATCH_CONNECTIONS)")
+
+    def handle(self, *args, **options):
+        sent = failed = 0
+        while True:
+            batch = self.claim(options['batch_size'])
+            if batch:
+                # The same pooled SMTP sessions serve every batch until the outbox is drained
+                with EmailDispatcher(options['connections']) as dispatcher:
+                    while batch:
+                        batch_sent, batch_failed = self.deliver(batch, dispatcher)
+                        sent += batch_sent
+                        failed += batch_failed
+                        batch = self.claim(options['batch_size'])
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f"Sent {sent} queued email(s); {failed} failed attempt(s)."))
+
+    def claim(self, batch_size):
+        """Lease a batch of due rows so concurrent workers do not send them twice."""
+        now = timezone.now()
+        with transaction.atomic():
+            due = EmailOutbox.objects.filter(status__in=['pending', 'sending'], next_attempt_at__lte=now).order_by('next_attempt_at', 'id')
+            if db_connection.features.has_select_for_update_skip_locked:
+                due = due.select_for_update(skip_locked=True)
+            batch = list(due[:batch_size])
+            if batch:
+                EmailOutbox.objects.filter(id__in=[entry.id for entry in batch]).update(
+                    status='sending', next_attempt_at=now + CLAIM_LEASE
+                )
+        return batch
+
+    def deliver(self, batch, dispatcher):
+        sent = failed = 0
+        # One send per connection at a time, so each status is saved as soon as
+        # its message is out and a crash re-sends at most one round
+        step = dispatcher.size
+        for start in range(0, len(batch), step):
+            chunk = batch[start:start + step]
+            results = dispatcher.send(outbox_message(entry) for entry in chunk)
+            for entry, result in zip(chunk, results):
+                entry.attempts += 1
+                if not result.sent:
+                    failed += 1
+                    entry.last_error = result.error[:1000]
+                    if entry.attempts >= MAX_ATTEMPTS:
+                        entry.status = 'failed'
+                        if entry.sensitive:
+                            # Never retried again, so the credentials must not stay behind
+                            entry.body = entry.html_body = ''
+                    else:
+                        entry.status = 'pending'
+                        delay = min(RETRY_BASE_DELAY * 2 ** (entry.attempts - 1), RETRY_MAX_DELAY)
+                        entry.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+                    continue
+                sent += 1
+                entry.status = 'sent'
+                entry.sent_at = timezone.now()
+                entry.last_error = ''
+                if entry.sensitive:
+                    entry.body = entry.html_body = ''
+            with transaction.atomic():
+                EmailOutbox.objects.bulk_update(
+                    chunk, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at', 'body', 'html_body']
+                )
+                # The rate limit can make a batch outlast its lease; renew it for the rows still waiting
+                waiting = [entry.id for entry in batch[start + step:]]
+                if waiting:
+                    EmailOutbox.objects.filter(id__in=waiting, status='sending').update(
+                        next_attempt_at=timezone.now() + CLAIM_LEASE
+                    )
+        return sent, failed
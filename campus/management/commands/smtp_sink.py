@@ -0,0 +1,40 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from campus.smtp_sink import SMTPSink
+
+
+class Command(BaseCommand):
+    help = "Run a local SMTP server that discards mail, with optional latency and failure injection"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=1025)
+        parser.add_argument('--latency', type=float, default=0.0, help="Seconds to hold each message before accepting it")
+        parser.add_argument('--jitter', type=float, default=0.0, help="Extra random latency of up to this many seconds")
+        parser.add_argument('--failure-rate', type=float, default=0.0, help="Fraction of messages rejected with a 451 error")
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        sink = SMTPSink(
+            options['host'], options['port'], options['latency'], options['jitter'], options['failure_rate'],
+            options['seed'], log=self.stdout.write if options['verbosity'] >= 2 else None,
+        )
+        self.stdout.write(
+            f"SMTP sink on {options['host']}:{options['port']} "
+            f"(latency {options['latency']}s, failure rate {options['failure_rate']:.0%}); Ctrl+C to stop"
+        )
+        self.stdout.write(
+            f"Point the portal at it with EMAIL_HOST={options['host']} EMAIL_PORT={options['port']} "
+            "EMAIL_USE_TLS=False and no EMAIL_HOST_USER"
+        )
+        try:
+            asyncio.run(sink.serve())
+        except KeyboardInterrupt:
+            pass
+        stats = sink.stats
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['messages']} message(s) to {stats['recipients']} recipient(s) over {stats['connections']} "
+            f"connection(s); {stats['failures']} injected failure(s)."
+        ))
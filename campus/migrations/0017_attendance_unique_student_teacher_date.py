@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:30
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, Max
+
+
+def remove_duplicate_attendance(apps, schema_editor):
+    # Keep the most recent row for each (student, teacher, date)
+    Attendance = apps.get_model('campus', 'Attendance')
+    duplicates = (
+        Attendance.objects.values('student', 'teacher', 'date')
+        .annotate(count=Count('id'), keep=Max('id'))
+        .filter(count__gt=1)
+    )
+    for row in duplicates:
+        Attendance.objects.filter(
+            student=row['student'], teacher=row['teacher'], date=row['date']
+        ).exclude(id=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campus', '0016_alter_usernotificationtracker_notification_type'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_attendance, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='attendance',
+            unique_together={('student', 'teacher', 'date')},
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def set_existing_audiences(apps, schema_editor):
+    # Targeted rows become single-user notifications and semester rows semester-wide ones
+    Notification = apps.get_model('campus', 'Notification')
+    Notification.objects.filter(recipient__isnull=False).update(audience='user')
+    Notification.objects.filter(recipient__isnull=True, semester__isnull=False).update(audience='semester')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campus', '0020_emailoutbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='audience',
+            field=models.CharField(choices=[('all', 'Everyone'), ('role', 'Role'), ('semester', 'Semester'), ('section', 'Section'), ('user', 'Single User'), ('users', 'Selected Users')], default='all', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='role',
+            field=models.CharField(blank=True, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='section',
+            field=models.CharField(blank=True, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='users',
+            field=models.ManyToManyField(blank=True, related_name='targeted_notifications', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.CreateModel(
+            name='NotificationReceipt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('read_at', models.DateTimeField(blank=True, null=True)),
+                ('dismissed_at', models.DateTimeField(blank=True, null=True)),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='receipts', to='campus.notification')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notification_receipts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('notification', 'user')},
+            },
+        ),
+        migrations.RunPython(set_existing_audiences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campus', '0023_notificationreadmarker'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('campus', 'Campus'), ('notifications', 'Direct')], default='campus', max_length=15)),
+                ('original_id', models.BigIntegerField()),
+                ('message', models.TextField()),
+                ('created_at', models.DateTimeField()),
+                ('audience', models.CharField(blank=True, max_length=10)),
+                ('role', models.CharField(blank=True, max_length=10)),
+                ('semester', models.IntegerField(blank=True, null=True)),
+                ('section', models.CharField(blank=True, max_length=10)),
+                ('user_ids', models.JSONField(blank=True, default=list)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('recipient', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at', 'id'], name='campus_noti_created_cdedd0_idx')],
+                'unique_together': {('source', 'original_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_attendance_alerts(apps, schema_editor):
+    # Daily attendance alerts keep their throttle; the assignment and fee trackers
+    # never recorded which object they were about, so they have nothing to carry over
+    UserNotificationTracker = apps.get_model('campus', 'UserNotificationTracker')
+    DeliveryLog = apps.get_model('campus', 'DeliveryLog')
+    DeliveryLog.objects.bulk_create([
+        DeliveryLog(user_id=tracker.user_id, channel='email', source='attendance', event=f'low:{tracker.last_sent_date.isoformat()}')
+        for tracker in UserNotificationTracker.objects.filter(notification_type='attendance')
+    ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campus', '0024_notificationarchive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(choices=[('email', 'Email')], default='email', max_length=10)),
+                ('source', models.CharField(max_length=50)),
+                ('event', models.CharField(max_length=50)),
+                ('delivered_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('source', 'event', 'channel', 'user')},
+            },
+        ),
+        migrations.RunPython(copy_attendance_alerts, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='UserNotificationTracker',
+        ),
+    ]
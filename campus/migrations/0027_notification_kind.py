@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Message prefixes the views used before notifications had a kind
+KIND_PREFIXES = [
+    ('New Assignment:', 'assignment_created'),
+    ('Assignment Updated:', 'assignment_updated'),
+    ('Assignment Deleted:', 'assignment_deleted'),
+    ('New Submission:', 'submission'),
+    ('Fee Alert:', 'fee_alert'),
+    ('Exam Routine Uploaded:', 'exam_routine'),
+    ('New course added:', 'course_added'),
+    ('New Event:', 'event'),
+    ('Seats updated', 'seats_updated'),
+]
+
+
+def backfill_kinds(apps, schema_editor):
+    # Existing rows keep their stored message (and an empty payload) as display text
+    Notification = apps.get_model('campus', 'Notification')
+    NotificationArchive = apps.get_model('campus', 'NotificationArchive')
+    for prefix, kind in KIND_PREFIXES:
+        Notification.objects.filter(message__startswith=prefix).update(kind=kind)
+        NotificationArchive.objects.filter(source='campus', message__startswith=prefix).update(kind=kind)
+    NotificationArchive.objects.filter(source='campus', kind='').update(kind='announcement')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campus', '0026_emailoutbox_bcc'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='kind',
+            field=models.CharField(choices=[('announcement', 'Announcement'), ('assignment_created', 'New Assignment'), ('assignment_updated', 'Assignment Updated'), ('assignment_deleted', 'Assignment Deleted'), ('submission', 'New Submission'), ('fee_alert', 'Fee Alert'), ('exam_routine', 'Exam Routine'), ('course_added', 'New Course'), ('event', 'New Event'), ('seats_updated', 'Seats Updated')], default='announcement', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='payload',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='notificationarchive',
+            name='kind',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='message',
+            field=models.TextField(blank=True),
+        ),
+        migrations.RunPython(backfill_kinds, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['kind', 'created_at'], name='campus_noti_kind_8b4158_idx'),
+        ),
+    ]
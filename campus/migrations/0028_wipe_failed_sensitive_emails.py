@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:25
+
+from django.db import migrations
+
+
+def wipe_failed_sensitive_emails(apps, schema_editor):
+    # Rows that gave up before failed sensitive bodies were wiped still hold credentials
+    EmailOutbox = apps.get_model('campus', 'EmailOutbox')
+    EmailOutbox.objects.filter(sensitive=True, status='failed').update(body='', html_body='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campus', '0027_notification_kind'),
+    ]
+
+    operations = [
+        migrations.RunPython(wipe_failed_sensitive_emails, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:27
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_semesters(apps, schema_editor):
+    # Earlier rows did not record a semester; the student's current one is the best available
+    Attendance = apps.get_model('campus', 'Attendance')
+    StudentProfile = apps.get_model('campus', 'StudentProfile')
+    Attendance.objects.update(semester=Subquery(
+        StudentProfile.objects.filter(user_id=OuterRef('student_id')).values('semester')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campus', '0028_wipe_failed_sensitive_emails'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendance',
+            name='semester',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(backfill_semesters, migrations.RunPython.noop),
+    ]
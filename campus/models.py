@@ -1,6 +1,11 @@
 
+import operator
+from datetime import date, timedelta
+from functools import reduce
+from string import Formatter
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from users.models import CustomUser
 
 
@@ -26,6 +31,11 @@ class StudentProfile(models.Model):
     attended_days = models.IntegerField(default=0)
     total_days = models.IntegerField(default=0)  # For attendance percentage
 
+    @classmethod
+    def semesters(cls, user_ids):
+        """Map ``user_ids`` to the semester each student is in now; students without a profile are left out"""
+        return dict(cls.objects.filter(user_id__in=user_ids).values_list('user_id', 'semester'))
+
 class TeacherProfile(models.Model):
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE)
     subjects = models.ManyToManyField(Subject)
@@ -38,11 +48,22 @@ class TeacherProfile(models.Model):
 class Attendance(models.Model):
     student = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='student_attendance', limit_choices_to={'role': 'student'}, on_delete=models.CASCADE)
     teacher = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='teacher_attendance', limit_choices_to={'role': 'teacher'}, on_delete=models.CASCADE, null=True, blank=True)
-    date = models.DateField(auto_now_add=True)
+    date = models.DateField(default=date.today)  # Set explicitly by offline sync for earlier days
     present = models.BooleanField(default=True)
+    semester = models.IntegerField(null=True, blank=True, db_index=True)  # Student's semester when marked
+    updated_at = models.DateTimeField(auto_now=True, null=True, db_index=True)
+
+    class Meta:
+        unique_together = ('student', 'teacher', 'date')
+        indexes = [models.Index(fields=['date', 'id'])]  # Keyset pages of view_attendance
 
     def __str__(self):
         return f"{self.student.email} - {self.date} ({'Present' if self.present else 'Absent'})"
+
+    def save(self, *args, **kwargs):
+        if self.semester is None:
+            self.semester = StudentProfile.semesters([self.student_id]).get(self.student_id)
+        super().save(*args, **kwargs)
     
 class TeacherAttendance(models.Model):
     teacher = models.ForeignKey(
@@ -114,15 +135,172 @@ class CollegeInfo(models.Model):
     about_bim = models.TextField(default="ShankerDev Campus offers a Bachelor in Information Management (BIM) program.")
     location = models.CharField(max_length=100, default="Kathmandu, Nepal")
 
+class NotificationQuerySet(models.QuerySet):
+    def audience_filters(self, user, profile=None):
+        """One filter per audience branch that includes ``user``.
+
+        Each branch is served by one index in ``created_at`` order, so an
+        inbox page can read every branch newest first and stop early.
+        ``profile`` is the student's StudentProfile (semester and section
+        audiences only match students). Teachers see every notification that
+        is not addressed to specific users, as they did before audiences
+        existed.
+        """
+        if user.role == 'teacher':
+            filters = [models.Q(audience=audience) for audience in ('all', 'role', 'semester', 'section')]
+        else:
+            filters = [models.Q(audience='all'), models.Q(audience='role', role=user.role)]
+        filters += [
+            models.Q(audience='user', recipient=user),
+            models.Q(models.Exists(Notification.users.through.objects.filter(
+                notification=models.OuterRef('pk'), customuser=user
+            )), audience='users'),
+        ]
+        if profile is not None:
+            filters.append(models.Q(audience='semester', semester=profile.semester))
+            if profile.section:
+                filters.append(models.Q(audience='section', semester=profile.semester, section=profile.section))
+        return filters
+
+    def for_user(self, user, profile=None, audience=None):
+        """Notifications whose audience includes ``user``, minus the ones they dismissed.
+
+        ``audience`` limits the rows to one of ``audience_filters``; by
+        default any of them matches. Each row is annotated with ``is_read``.
+        """
+        if audience is None:
+            audience = reduce(operator.or_, self.audience_filters(user, profile))
+        receipts = NotificationReceipt.objects.filter(notification=models.OuterRef('pk'), user=user)
+        read_through = NotificationReadMarker.objects.filter(user=user, read_through__gte=models.OuterRef('created_at'))
+        return self.filter(audience).exclude(
+            models.Exists(receipts.filter(dismissed_at__isnull=False))
+        ).annotate(is_read=models.Exists(receipts.filter(read_at__isnull=False)) | models.Exists(read_through))
+
+
 class Notification(models.Model):
-    message = models.TextField()
+    # One row per announcement; the audience fields decide who sees it
+    AUDIENCE_CHOICES = [
+        ('all', 'Everyone'),
+        ('role', 'Role'),
+        ('semester', 'Semester'),
+        ('section', 'Section'),
+        ('user', 'Single User'),
+        ('users', 'Selected Users'),
+    ]
+    KIND_CHOICES = [
+        ('announcement', 'Announcement'),
+        ('assignment_created', 'New Assignment'),
+        ('assignment_updated', 'Assignment Updated'),
+        ('assignment_deleted', 'Assignment Deleted'),
+        ('submission', 'New Submission'),
+        ('fee_alert', 'Fee Alert'),
+        ('exam_routine', 'Exam Routine'),
+        ('course_added', 'New Course'),
+        ('event', 'New Event'),
+        ('seats_updated', 'Seats Updated'),
+    ]
+    HIDDEN_KINDS = ['seats_updated']  # Logged as notifications but kept out of inboxes
+    # Display text of structured kinds, filled from the payload when shown
+    TEMPLATES = {
+        'assignment_created': "New Assignment: {title} (Sem {semester})\nSubject: {subject}\nDue Date: {due_date}\n\nDescription: {description}",
+        'assignment_updated': "Assignment Updated: {title} (Sem {semester})\nSubject: {subject}\nNew Due Date: {due_date}\n\nDescription: {description}",
+        'assignment_deleted': "Assignment Deleted: {title} (Sem {semester})\nThis assignment has been removed by the teacher.",
+        'submission': "New Submission: {student} submitted {title}",
+        'fee_alert': "Fee Alert: You have a fee due of {amount} by {due_date}",
+        'exam_routine': "Exam Routine Uploaded: {title}",
+        'course_added': "New course added: {name}\n\n{description}\nDuration: {duration}",
+        'event': "New Event: {title} on {date}\n\n{description}",
+    }
+
+    message = models.TextField(blank=True)  # Free text (announcements and rows older than payloads)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='announcement')
+    payload = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     created_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='created_notifications')
-    recipient = models.ForeignKey(CustomUser, on_delete=models.CASCADE, null=True, blank=True, related_name='notifications')
+    audience = models.CharField(max_length=10, choices=AUDIENCE_CHOICES, default='all')
+    role = models.CharField(max_length=10, blank=True)  # audience='role'
+    recipient = models.ForeignKey(CustomUser, on_delete=models.CASCADE, null=True, blank=True, related_name='notifications')  # audience='user'
+    semester = models.IntegerField(null=True, blank=True)  # audience='semester' or 'section'
+    section = models.CharField(max_length=10, blank=True)  # audience='section'
+    users = models.ManyToManyField(CustomUser, blank=True, related_name='targeted_notifications')  # audience='users'
+
+    objects = NotificationQuerySet.as_manager()
+
+    class Meta:
+        # One index per audience branch of the inbox query (see notification_utils.get_inbox)
+        indexes = [
+            models.Index(fields=['recipient', 'created_at']),
+            models.Index(fields=['semester', 'created_at']),
+            models.Index(fields=['audience', 'created_at']),
+            models.Index(fields=['kind', 'created_at']),  # Per-kind listings and retention
+        ]
+
+    def __str__(self):
+        return f"{self.text[:50]}... ({self.created_at.date()})"
+
+    @classmethod
+    def missing_payload_keys(cls, kind, payload):
+        """Template fields of ``kind`` that ``payload`` does not provide."""
+        template = cls.TEMPLATES.get(kind, '')
+        fields = {field for _, field, _, _ in Formatter().parse(template) if field}
+        return sorted(fields - set(payload or {}))
+
+    @property
+    def text(self):
+        """Display text: the kind's template filled from ``payload``, else the stored message.
+
+        Falls back to the kind's label, so an entry is never blank in the inbox.
+        """
+        template = self.TEMPLATES.get(self.kind)
+        if template and self.payload:
+            try:
+                return template.format(**self.payload)
+            except (KeyError, IndexError):
+                pass
+        return self.message or self.get_kind_display()
+
+
+class NotificationReceipt(models.Model):
+    # Sparse per-user state, written only when a user reads or dismisses a notification
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='receipts')
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='notification_receipts')
+    read_at = models.DateTimeField(null=True, blank=True)
+    dismissed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('notification', 'user')
+
+
+class NotificationArchive(models.Model):
+    # Notifications moved out of the hot tables by the archive_notifications command
+    SOURCE_CHOICES = [('campus', 'Campus'), ('notifications', 'Direct')]
+
+    source = models.CharField(max_length=15, choices=SOURCE_CHOICES, default='campus')
+    original_id = models.BigIntegerField()
+    message = models.TextField()
+    kind = models.CharField(max_length=20, blank=True)
+    created_at = models.DateTimeField()
+    created_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    audience = models.CharField(max_length=10, blank=True)
+    role = models.CharField(max_length=10, blank=True)
+    recipient = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_notifications')
     semester = models.IntegerField(null=True, blank=True)
+    section = models.CharField(max_length=10, blank=True)
+    user_ids = models.JSONField(default=list, blank=True)  # audience='users'
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('source', 'original_id')
+        indexes = [models.Index(fields=['created_at', 'id'])]
 
     def __str__(self):
-        return f"{self.message[:50]}... ({self.created_at.date()})"
+        return f"[archived] {self.message[:50]}... ({self.created_at.date()})"
+
+
+class NotificationReadMarker(models.Model):
+    # "Mark all as read": everything created up to read_through counts as read without a receipt per row
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='notification_read_marker')
+    read_through = models.DateTimeField()
 
 
 
@@ -137,12 +315,86 @@ class Course(models.Model):
         return self.name
     
 
-class UserNotificationTracker(models.Model):
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    notification_type = models.CharField(max_length=20, choices=[('attendance', 'Attendance'), ('assignment', 'Assignment'), ('fee_reminder', 'Fee Reminder')])
-    last_sent_date = models.DateField()
+class DeliveryLog(models.Model):
+    # One row per message delivered to a user about an event on a source object
+    # (e.g. 'assignment:12' / 'created'); the unique key makes each delivery happen once
+    CHANNEL_CHOICES = [('email', 'Email')]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='deliveries')
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES, default='email')
+    source = models.CharField(max_length=50)
+    event = models.CharField(max_length=50)
+    delivered_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = ('user', 'notification_type')
-    
+        # Source and event lead so "who already got this?" reads one contiguous index range
+        unique_together = ('source', 'event', 'channel', 'user')
+
+    def __str__(self):
+        return f"{self.user_id} {self.channel} {self.source} {self.event}"
+
+
+class JobCheckpoint(models.Model):
+    # High-water marks for incremental background jobs (rollups, reconciliation)
+    # Rows are stamped before their transaction commits, so incremental runs rescan
+    # this much before the high-water mark; processing a row twice must be harmless
+    OVERLAP = timedelta(minutes=5)
+
+    name = models.CharField(max_length=100, unique=True)
+    high_water_mark = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.high_water_mark}"
+
+    @classmethod
+    def changed_since(cls, queryset, since):
+        """Rows of ``queryset`` updated after ``since`` less OVERLAP; every row when ``since`` is None"""
+        if since is None:
+            return queryset
+        return queryset.filter(updated_at__gt=since - cls.OVERLAP)
+
+    def advance(self, *marks):
+        """Move the high-water mark to the latest of ``marks`` (never backwards) and save it"""
+        self.high_water_mark = max(filter(None, [*marks, self.high_water_mark]), default=None)
+        self.save(update_fields=['high_water_mark', 'updated_at'])
 
+
+class AttendanceSyncBatch(models.Model):
+    # One applied offline sync batch; replays with the same key return the stored result
+    teacher = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='attendance_sync_batches')
+    idempotency_key = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+    result = models.JSONField(default=dict)
+
+    class Meta:
+        unique_together = ('teacher', 'idempotency_key')
+
+    def __str__(self):
+        return f"{self.teacher.email} - {self.idempotency_key}"
+
+
+class EmailOutbox(models.Model):
+    # Emails queued by views and signals; the send_queued_emails worker delivers them
+    STATUS_CHOICES = [('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')]
+
+    to_email = models.EmailField(blank=True)
+    bcc = models.JSONField(default=list, blank=True)  # Identical announcements go out as one row per BCC batch
+    from_email = models.CharField(max_length=254, blank=True)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    sensitive = models.BooleanField(default=False)  # Bodies (e.g. credentials) are wiped once sent or failed for good
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+    def __str__(self):
+        recipients = self.to_email or f"{len(self.bcc)} bcc recipient(s)"
+        return f"{recipients} - {self.subject} ({self.status})"
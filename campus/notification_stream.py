@@ -0,0 +1,105 @@
+"""
+Live notification delivery for ShankerDev Campus Portal
+An in-process broadcaster that wakes waiting Server-Sent Events and
+long-poll connections when a notification is committed
+"""
+
+import asyncio
+import json
+import threading
+from collections import deque
+
+STREAM_HEARTBEAT_SECONDS = 15
+STREAM_MAX_SECONDS = 5 * 60  # Browsers reconnect (with Last-Event-ID) when a stream ends
+POLL_TIMEOUT_SECONDS = 25
+HISTORY_SIZE = 512
+
+
+class NotificationBroadcaster:
+    """Fan new notifications out to every waiting connection in this process.
+
+    Published items go into one shared, bounded history. A connection keeps
+    only the sequence number it has seen and a future while it waits, so
+    thousands of idle connections cost a few hundred bytes each.
+    ``publish`` may be called from any thread (sync views run in worker
+    threads); waiters are woken on their own event loops.
+    """
+
+    def __init__(self, history_size=HISTORY_SIZE):
+        self._lock = threading.Lock()
+        self._history = deque(maxlen=history_size)
+        self._seq = 0
+        self._waiters = set()
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def publish(self, item):
+        with self._lock:
+            self._seq += 1
+            self._history.append((self._seq, item))
+            waiters, self._waiters = self._waiters, set()
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                pass  # That connection's event loop has already closed
+
+    def since(self, seq):
+        """Items published after ``seq`` that are still in the history, oldest first."""
+        with self._lock:
+            return [(item_seq, item) for item_seq, item in self._history if item_seq > seq]
+
+    async def wait(self, seq, timeout):
+        """Wait until an item newer than ``seq`` is published; False on timeout."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = (loop, future)
+        with self._lock:
+            if self._seq > seq:
+                return True
+            self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+broadcaster = NotificationBroadcaster()
+
+
+def notification_data(notification):
+    """JSON-ready fields sent to browsers for one notification."""
+    return {
+        'id': notification.id,
+        'kind': notification.kind,
+        'message': notification.text,
+        'created_at': notification.created_at.isoformat(),
+    }
+
+
+def stream_item(notification, audience_keys):
+    """The broadcast form of a committed notification."""
+    return {
+        'audiences': frozenset(audience_keys),
+        'created_by': notification.created_by_id,
+        'data': notification_data(notification),
+    }
+
+
+def is_addressed_to(item, user_id, audience_keys):
+    return item['created_by'] != user_id and not item['audiences'].isdisjoint(audience_keys)
+
+
+def sse_event(data):
+    return f"id: {data['id']}\nevent: notification\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,285 @@
+"""
+Notification utilities for ShankerDev Campus Portal
+Single inbox query used by the dashboards and the notifications page,
+read receipts and cached per-user unread counters
+"""
+
+import operator
+import re
+import time
+from datetime import datetime
+from functools import reduce
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Q, prefetch_related_objects
+from django.utils import timezone
+
+from .models import Notification, NotificationReadMarker, NotificationReceipt, StudentProfile
+
+INBOX_PAGE_SIZE = 20
+UNREAD_CACHE_TIMEOUT = 60 * 60
+# Without SHARED_CACHE each process caches its own counts, which miss other
+# processes' deliveries, so they expire quickly instead
+LOCAL_UNREAD_CACHE_TIMEOUT = 30
+
+
+def encode_cursor(notification):
+    return f"{notification.created_at.isoformat()}|{notification.id}"
+
+
+def decode_cursor(cursor):
+    """Parse a ``created_at|id`` cursor; returns None when it is malformed."""
+    try:
+        created_at, pk = cursor.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def inbox_queryset(user, profile=None, cursor=None, unread_only=False, since=None, exclude_own=False, audience=None):
+    """Notifications addressed to ``user``, newest first.
+
+    ``cursor`` is a decoded ``(created_at, id)`` keyset position and
+    ``audience`` one of ``Notification.objects.audience_filters``, which
+    limits the query to a single index-ordered branch (see inbox_page).
+    """
+    notifications = Notification.objects.for_user(user, profile, audience).exclude(kind__in=Notification.HIDDEN_KINDS)
+    if since is not None:
+        notifications = notifications.filter(created_at__gte=since)
+    if cursor:
+        created_at, pk = cursor
+        # A range on created_at plus a residual check keeps the index order usable
+        notifications = notifications.filter(created_at__lte=created_at).exclude(created_at=created_at, id__gte=pk)
+    if unread_only:
+        notifications = notifications.filter(is_read=False)
+    if exclude_own:
+        notifications = notifications.exclude(created_by=user)
+    return notifications.order_by('-created_at', '-id')
+
+
+def inbox_page(user, profile=None, cursor=None, limit=INBOX_PAGE_SIZE, **filters):
+    """Up to ``limit`` newest rows of each audience branch of ``user``'s inbox, unordered.
+
+    Every branch is a subquery that reads its own index newest first and
+    stops after ``limit`` rows, so a page never reads or sorts more than
+    ``limit`` rows per branch; the caller merges them (see get_inbox).
+    """
+    branches = [
+        Q(pk__in=inbox_queryset(user, profile, cursor, audience=audience, **filters).values('pk')[:limit])
+        for audience in Notification.objects.audience_filters(user, profile)
+    ]
+    return Notification.objects.for_user(user, profile, audience=reduce(operator.or_, branches))
+
+
+def inbox_after(user, profile=None, after_id=0, limit=INBOX_PAGE_SIZE):
+    """Notifications for ``user`` (not created by them) with an id above ``after_id``, oldest first."""
+    return list(
+        inbox_queryset(user, profile, exclude_own=True).filter(id__gt=after_id).select_related('created_by').order_by('id')[:limit]
+    )
+
+
+def get_inbox(user, profile=None, cursor=None, limit=INBOX_PAGE_SIZE, unread_only=False, since=None, exclude_own=False):
+    """One page of ``user``'s inbox.
+
+    ``cursor`` is the string returned as ``next_cursor`` by the previous
+    page. Returns ``(notifications, next_cursor)``; ``next_cursor`` is None
+    on the last page.
+    """
+    page = inbox_page(
+        user, profile, decode_cursor(cursor) if cursor else None, limit + 1,
+        unread_only=unread_only, since=since, exclude_own=exclude_own,
+    )
+    # At most limit + 1 rows per branch; merging them here keeps the sort out of the database
+    rows = sorted(page, key=lambda notification: (notification.created_at, notification.id), reverse=True)[:limit + 1]
+    prefetch_related_objects(rows, 'created_by')
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1])
+    return rows, next_cursor
+
+
+def unindexed_steps(queryset, table=Notification._meta.db_table):
+    """Lines of the query plan of ``queryset`` that read all of ``table`` or sort outside an index."""
+    plan = queryset.explain()
+    if connection.vendor == 'sqlite':
+        pattern = rf'\bSCAN {table}\b(?!_)|USE TEMP B-TREE'
+    elif connection.vendor == 'postgresql':
+        pattern = rf'Seq Scan on {table}\b(?!_)|\bSort\b(?! Key)'
+    else:
+        return []
+    return [line.strip() for line in plan.splitlines() if re.search(pattern, line)]
+
+
+def mark_notifications_read(user, notification_ids, dismiss=False):
+    """Write (or update) receipts for ``user``; only read/dismissed notifications get a row."""
+    now = timezone.now()
+    fields = {'read_at': now, 'dismissed_at': now if dismiss else None}
+    NotificationReceipt.objects.bulk_create(
+        [NotificationReceipt(notification_id=pk, user=user, **fields) for pk in notification_ids],
+        update_conflicts=True,
+        unique_fields=['notification', 'user'],
+        update_fields=['read_at', 'dismissed_at'] if dismiss else ['read_at'],
+    )
+    if dismiss:
+        forget_unread_count(user.pk)
+    else:
+        adjust_unread_count(user.pk, -len(notification_ids))
+
+
+def mark_all_read(user):
+    """Mark the whole inbox read with a single upsert of the user's read marker."""
+    NotificationReadMarker.objects.bulk_create(
+        [NotificationReadMarker(user=user, read_through=timezone.now())],
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=['read_through'],
+    )
+    if cache.get(_meta_key(user.pk)) is not None:
+        cache.set(_count_key(user.pk), 0, UNREAD_CACHE_TIMEOUT)
+
+
+# Unread counters. Each user's count is cached together with the generation
+# of every broad audience (everyone, role, semester, section) it was computed
+# under; delivering to an audience bumps its generation, which invalidates the
+# counts of all its members at once. Targeted deliveries increment the count.
+# Without SHARED_CACHE a per-process cache would keep other workers' stale
+# counts, so they are only kept for LOCAL_UNREAD_CACHE_TIMEOUT. Every broad
+# delivery also goes to STAFF_KEY, the audience of teachers, who see all of them.
+
+STAFF_KEY = 'staff'
+
+def _count_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def _meta_key(user_id):
+    return f'notifications:unread-meta:{user_id}'
+
+
+def _generation_key(audience_key):
+    return f'notifications:generation:{audience_key}'
+
+
+def _audience_keys(user, profile=None):
+    keys = ['all', f'role:{user.role}']
+    if user.role == 'teacher':
+        keys.append(STAFF_KEY)
+    if profile is not None:
+        keys.append(f'semester:{profile.semester}')
+        if profile.section:
+            keys.append(f'section:{profile.semester}:{profile.section}')
+    return keys
+
+
+def _notification_audience_key(notification):
+    return {
+        'all': 'all',
+        'role': f'role:{notification.role}',
+        'semester': f'semester:{notification.semester}',
+        'section': f'section:{notification.semester}:{notification.section}',
+    }[notification.audience]
+
+
+def notification_audience_keys(notification, user_ids=()):
+    """Audience keys ``notification`` was delivered to; ``user_ids`` are its targeted users (audience='users')."""
+    if notification.audience == 'user':
+        return [f'user:{notification.recipient_id}']
+    if notification.audience == 'users':
+        return [f'user:{user_id}' for user_id in user_ids]
+    return [_notification_audience_key(notification), STAFF_KEY]
+
+
+def adjust_unread_count(user_id, delta):
+    if not delta:
+        return
+    try:
+        if delta > 0:
+            cache.incr(_count_key(user_id), delta)
+        else:
+            cache.decr(_count_key(user_id), -delta)
+    except ValueError:
+        pass  # Not cached; the next read recomputes it
+
+
+def forget_unread_count(user_id):
+    cache.delete_many([_count_key(user_id), _meta_key(user_id)])
+
+
+def user_audience_keys(user, profile=None):
+    """Every audience ``user`` belongs to, including their own ``user:<id>`` key."""
+    return _audience_keys(user, profile) + [f'user:{user.pk}']
+
+
+def record_delivery(notification):
+    """Update unread counters and wake live connections once ``notification`` is committed."""
+    def apply():
+        from .notification_stream import broadcaster, stream_item
+
+        if notification.kind in Notification.HIDDEN_KINDS:
+            return
+        if notification.audience in ('user', 'users'):
+            if notification.audience == 'user':
+                recipients = [notification.recipient_id]
+            else:
+                recipients = list(notification.users.values_list('id', flat=True))
+            for user_id in recipients:
+                if user_id != notification.created_by_id:
+                    adjust_unread_count(user_id, 1)
+            broadcaster.publish(stream_item(notification, [f'user:{user_id}' for user_id in recipients]))
+            return
+        audience_keys = notification_audience_keys(notification)
+        for audience_key in audience_keys:
+            _bump_generation(audience_key)
+        broadcaster.publish(stream_item(notification, audience_keys))
+    transaction.on_commit(apply)
+
+
+def _bump_generation(audience_key):
+    key = _generation_key(audience_key)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Start from a time-based value so an evicted generation never repeats an old one
+        cache.set(key, time.time_ns(), None)
+
+
+def record_removal(notification):
+    """Drop cached unread counts that may include ``notification``; call before deleting it."""
+    if notification.audience == 'user':
+        user_ids = [notification.recipient_id]
+    elif notification.audience == 'users':
+        user_ids = list(notification.users.values_list('id', flat=True))
+    else:
+        audience_keys = notification_audience_keys(notification)
+        transaction.on_commit(lambda: [_bump_generation(key) for key in audience_keys])
+        return
+    transaction.on_commit(lambda: [forget_unread_count(user_id) for user_id in user_ids])
+
+
+def invalidate_unread_counts():
+    """Make every cached unread count stale, e.g. after notifications were deleted in bulk."""
+    _bump_generation('all')
+
+
+def unread_count(user, profile=None):
+    """Number of unread inbox notifications; no queries when the cached count is current."""
+    cached = cache.get_many([_count_key(user.pk), _meta_key(user.pk)])
+    meta = cached.get(_meta_key(user.pk))
+    if meta is not None and _count_key(user.pk) in cached:
+        if cache.get_many(list(meta)) == {key: value for key, value in meta.items() if value is not None}:
+            return max(cached[_count_key(user.pk)], 0)
+
+    if profile is None and user.role == 'student':
+        profile = StudentProfile.objects.filter(user=user).first()
+    generation_keys = [_generation_key(key) for key in _audience_keys(user, profile)]
+    # Read generations before counting so a delivery made meanwhile invalidates this count
+    generations = cache.get_many(generation_keys)
+    count = inbox_queryset(user, profile, unread_only=True, exclude_own=True).count()
+    cache.set_many({
+        _count_key(user.pk): count,
+        _meta_key(user.pk): {key: generations.get(key) for key in generation_keys},
+    }, UNREAD_CACHE_TIMEOUT if settings.SHARED_CACHE else LOCAL_UNREAD_CACHE_TIMEOUT)
+    return count
@@ -0,0 +1,112 @@
+"""
+Roster utilities for ShankerDev Campus Portal
+Resolves and caches the students a teacher marks attendance for, scoped
+by subject (semester and faculty) and section
+"""
+
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Q
+
+from .models import StudentProfile, Subject
+
+User = get_user_model()
+
+ROSTER_CACHE_TIMEOUT = 60 * 60
+# Without SHARED_CACHE other processes' version bumps are not seen, so rosters expire quickly instead
+LOCAL_ROSTER_CACHE_TIMEOUT = 60
+
+
+def _version_key(semester):
+    return f'roster:version:{semester}'
+
+
+def roster_version(semester):
+    # Time-based start so an evicted version never repeats an old one
+    return cache.get_or_set(_version_key(semester), time.time_ns, None)
+
+
+def invalidate_rosters(*semesters):
+    """Retire the cached rosters of ``semesters`` by bumping their version numbers."""
+    for semester in set(semesters):
+        try:
+            cache.incr(_version_key(semester))
+        except ValueError:
+            cache.set(_version_key(semester), time.time_ns(), None)
+
+
+def _cached(subject, name, compute):
+    key = f'roster:{roster_version(subject.semester)}:{subject.id}:{name}'
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        # A per-process cache would keep serving a roster another process changed
+        cache.set(key, value, ROSTER_CACHE_TIMEOUT if settings.SHARED_CACHE else LOCAL_ROSTER_CACHE_TIMEOUT)
+    return value
+
+
+def teacher_subjects(teacher):
+    """Subjects assigned to ``teacher`` through ``TeacherProfile.subjects``."""
+    return Subject.objects.filter(teacherprofile__user=teacher).select_related('faculty').order_by('semester', 'name')
+
+
+def _subject_profiles(subject):
+    # Students without a faculty are still listed for the subject's semester
+    return StudentProfile.objects.filter(
+        Q(faculty_id=subject.faculty_id) | Q(faculty__isnull=True),
+        semester=subject.semester,
+    )
+
+
+def subject_sections(subject):
+    """Distinct sections of the students taking ``subject``."""
+    return _cached(
+        subject, 'sections',
+        lambda: sorted(
+            _subject_profiles(subject).exclude(section__isnull=True).exclude(section='')
+            .values_list('section', flat=True).distinct()
+        ),
+    )
+
+
+def get_roster(subject, section=None):
+    """Students taking ``subject``, optionally limited to one ``section``.
+
+    Returns a list of ``{'id', 'email', 'first_name', 'last_name', 'full_name'}``
+    dicts cached per (subject, section); profile and student changes bump
+    the roster version of the semesters involved so stale entries are never
+    read again.
+    """
+    def compute():
+        profiles = _subject_profiles(subject)
+        if section:
+            profiles = profiles.filter(section=section)
+        roster = list(
+            User.objects.filter(role='student', is_active=True, studentprofile__in=profiles)
+            .order_by('email')
+            .values('id', 'email', 'first_name', 'last_name')
+        )
+        for student in roster:
+            student['full_name'] = f"{student['first_name']} {student['last_name']}".strip()
+        return roster
+    return _cached(subject, f'section:{section or ""}', compute)
+
+
+def resolve_roster(teacher, subject_id=None, section=None):
+    """Pick the teacher's subject (the first one by default) and return its roster.
+
+    Returns ``(subjects, subject, sections, section, roster)``; ``subject`` is
+    None and the roster empty when the teacher has no subjects assigned.
+    """
+    subjects = list(teacher_subjects(teacher))
+    subject = next((s for s in subjects if str(s.id) == str(subject_id)), None) if subject_id else None
+    subject = subject or (subjects[0] if subjects else None)
+    if subject is None:
+        return subjects, None, [], None, []
+    sections = subject_sections(subject)
+    if section not in sections:
+        section = None
+    return subjects, subject, sections, section, get_roster(subject, section)
@@ -1,34 +1,31 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_init, post_save
+from django.db.models import F
 from django.dispatch import receiver
-from .models import Attendance, StudentProfile, UserNotificationTracker
-from .email_utils import send_attendance_alert_email, send_welcome_email
+from .models import Attendance, StudentProfile
+from .email_utils import attendance_alert_event, filter_undelivered, queue_attendance_alert_email, queue_welcome_email, record_deliveries
+from .notification_utils import forget_unread_count
+from .roster_utils import invalidate_rosters
 from django.conf import settings
-from datetime import date
 
 
 @receiver(post_save, sender=Attendance)
 def update_attendance(sender, instance, created, **kwargs):
     if created:
         student = instance.student
-        profile, _ = StudentProfile.objects.get_or_create(user=student)
-        profile.attended_days += 1 if instance.present else 0
-        profile.save()
+        StudentProfile.objects.get_or_create(user=student)
+        # Atomic increments: concurrent marks must not overwrite each other's counts
+        StudentProfile.objects.filter(user=student).update(
+            total_days=F('total_days') + 1,
+            attended_days=F('attended_days') + (1 if instance.present else 0),
+        )
+        profile = StudentProfile.objects.get(user=student)
         if profile.total_days > 0:
             attendance_percentage = (profile.attended_days / profile.total_days * 100)
             if attendance_percentage < 80:
-                today = date.today()
-                # Check if a notification has been sent today
-                if not UserNotificationTracker.objects.filter(user=student, notification_type='attendance', last_sent_date=today).exists():
-                    try:
-                        send_attendance_alert_email(student, attendance_percentage)
-                        # Update the tracker
-                        UserNotificationTracker.objects.update_or_create(
-                            user=student,
-                            notification_type='attendance',
-                            defaults={'last_sent_date': today}
-                        )
-                    except Exception:
-                        pass
+                # At most one alert per student per day
+                if filter_undelivered([student], 'attendance', attendance_alert_event()):
+                    queue_attendance_alert_email(student, attendance_percentage)
+                    record_deliveries([student], 'attendance', attendance_alert_event())
 
 
 from django.contrib.auth import get_user_model
@@ -37,11 +34,8 @@ User = get_user_model()
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
-        # Send welcome email
-        try:
-            send_welcome_email(instance)
-        except Exception:
-            pass
+        # Queue welcome email (delivered by send_queued_emails)
+        queue_welcome_email(instance)
             
         if instance.role == 'student':
             StudentProfile.objects.get_or_create(user=instance)
@@ -56,4 +50,51 @@ def save_user_profile(sender, instance, **kwargs):
              instance.studentprofile.save()
     elif instance.role == 'teacher':
         if hasattr(instance, 'teacherprofile'):
-             instance.teacherprofile.save()
\ No newline at end of file
+             instance.teacherprofile.save()
+
+
+# Roster cache invalidation: only changes that move a student between
+# rosters (or alter what a roster shows) bump the roster version
+ROSTER_PROFILE_FIELDS = ('user_id', 'faculty_id', 'semester', 'section')
+ROSTER_USER_FIELDS = ('role', 'is_active', 'email', 'first_name', 'last_name')
+
+
+def _roster_state(instance, fields):
+    # Read __dict__ directly so deferred fields are not fetched
+    return tuple(instance.__dict__.get(field) for field in fields)
+
+
+@receiver(post_init, sender=StudentProfile)
+def remember_profile_roster_state(sender, instance, **kwargs):
+    instance._roster_state = _roster_state(instance, ROSTER_PROFILE_FIELDS)
+
+
+@receiver(post_save, sender=StudentProfile)
+def invalidate_profile_rosters(sender, instance, created, **kwargs):
+    state = _roster_state(instance, ROSTER_PROFILE_FIELDS)
+    previous = getattr(instance, '_roster_state', None)
+    if created or state != previous:
+        # Both the semester the student left and the one they joined change
+        invalidate_rosters(instance.semester, *([previous[2]] if previous and previous[2] is not None else []))
+        # A new semester or section changes which notifications the student sees
+        forget_unread_count(instance.user_id)
+    instance._roster_state = state
+
+
+@receiver(post_delete, sender=StudentProfile)
+def invalidate_deleted_profile_rosters(sender, instance, **kwargs):
+    invalidate_rosters(instance.semester)
+
+
+@receiver(post_init, sender=User)
+def remember_user_roster_state(sender, instance, **kwargs):
+    instance._roster_state = _roster_state(instance, ROSTER_USER_FIELDS)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_rosters(sender, instance, created, **kwargs):
+    state = _roster_state(instance, ROSTER_USER_FIELDS)
+    previous = getattr(instance, '_roster_state', None)
+    if not created and state != previous and 'student' in (instance.role, previous and previous[0]):
+        invalidate_rosters(*StudentProfile.objects.filter(user=instance).values_list('semester', flat=True))
+    instance._roster_state = state
@@ -0,0 +1,120 @@
+"""
+Local SMTP stand-in for ShankerDev Campus Portal
+A minimal asyncio SMTP server that accepts and discards mail, with optional
+per-message latency and failure injection, for measuring email throughput
+without a real mail provider
+"""
+
+import asyncio
+import random
+import threading
+
+
+class SMTPSink:
+    """Accept SMTP sessions and throw the messages away.
+
+    Each message waits ``latency`` seconds (plus up to ``jitter``) before it
+    is acknowledged and is rejected with a temporary 451 error with
+    probability ``failure_rate``. Only the commands Django's SMTP backend
+    uses are implemented; there is no TLS or authentication.
+    """
+
+    def __init__(self, host='127.0.0.1', port=1025, latency=0.0, jitter=0.0, failure_rate=0.0, seed=None, log=None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.log = log
+        self.stats = {'connections': 0, 'messages': 0, 'recipients': 0, 'failures': 0}
+        self._loop = None
+        self._server = None
+
+    async def serve(self, ready=None):
+        self._server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]  # Resolves port 0 to the one picked
+        if ready is not None:
+            ready.set()
+        async with self._server:
+            try:
+                await self._server.serve_forever()
+            except asyncio.CancelledError:
+                pass
+
+    def start_in_thread(self):
+        """Serve from a daemon thread; returns once the port is bound."""
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.serve(ready))
+
+        threading.Thread(target=run, name='smtp-sink', daemon=True).start()
+        ready.wait()
+        return self.port
+
+    def stop(self):
+        if self._loop is not None and self._server is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+
+    async def handle(self, reader, writer):
+        self.stats['connections'] += 1
+        sender, recipients = None, []
+
+        async def reply(line):
+            writer.write(line.encode() + b'\r\n')
+            await writer.drain()
+
+        await reply('220 smtp-sink ready')
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode('utf-8', 'replace').strip()
+                verb = command[:4].upper()
+                if verb == 'EHLO':
+                    await reply('250-smtp-sink\r\n250-8BITMIME\r\n250 SMTPUTF8')
+                elif verb == 'HELO':
+                    await reply('250 smtp-sink')
+                elif verb == 'MAIL':
+                    sender, recipients = command[10:].strip(), []
+                    await reply('250 OK')
+                elif verb == 'RCPT':
+                    recipients.append(command[8:].strip())
+                    await reply('250 OK')
+                elif verb == 'DATA':
+                    await reply('354 End data with <CR><LF>.<CR><LF>')
+                    while (await reader.readline()) not in (b'.\r\n', b''):
+                        pass
+                    await self.accept(sender, recipients, reply)
+                    sender, recipients = None, []
+                elif verb == 'RSET':
+                    sender, recipients = None, []
+                    await reply('250 OK')
+                elif verb == 'NOOP':
+                    await reply('250 OK')
+                elif verb == 'QUIT':
+                    await reply('221 Bye')
+                    break
+                else:
+                    await reply('502 Command not implemented')
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def accept(self, sender, recipients, reply):
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.failure_rate and self.random.random() < self.failure_rate:
+            self.stats['failures'] += 1
+            await reply('451 4.3.0 Injected failure, try again later')
+            return
+        self.stats['messages'] += 1
+        self.stats['recipients'] += len(recipients)
+        if self.log:
+            self.log(f"{sender} -> {len(recipients)} recipient(s)")
+        await reply('250 OK: queued')
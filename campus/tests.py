@@ -1,3 +1,829 @@
-from django.test import TestCase
+import asyncio
+import zipfile
+from datetime import date, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.mail import EmailMessage
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import CustomUser
+
+from .attendance_analytics import compute_attendance_analytics
+from .attendance_export import attendance_queryset
+from .attendance_utils import mark_attendance_bulk
+from .email_dispatch import DispatchResult, EmailDispatcher
+from .email_utils import (
+    BulkEmailRenderer, attendance_alert_event, build_assignment_notification_email, build_assignment_notification_emails,
+    delivery_source, enqueue_bcc_emails, filter_undelivered, outbox_message, record_deliveries,
+)
+from .management.commands.send_queued_emails import CLAIM_LEASE, MAX_ATTEMPTS, Command as OutboxWorker
+from .models import (
+    Assignment, Attendance, DeliveryLog, EmailOutbox, Faculty, JobCheckpoint, Notification, NotificationArchive,
+    NotificationReceipt, StudentProfile, Subject,
+)
+from .notification_utils import get_inbox, inbox_queryset, record_delivery, unindexed_steps, unread_count
+from .roster_utils import get_roster
+from .views import create_notification
+
+
+class BulkEmailRendererTests(TestCase):
+    def setUp(self):
+        self.teacher = CustomUser(email='teacher@example.com', first_name='Tara', last_name='Teacher', role='teacher')
+        self.students = [
+            CustomUser(email='ann@example.com', first_name="Ann <O'Neil>", last_name='&', role='student'),
+            CustomUser(email='bo@example.com', first_name='Bo', last_name='B', role='student'),
+        ]
+
+    def assignment(self, description):
+        return Assignment(title='HW 1', description=description, semester=3, due_date=date(2026, 11, 1))
+
+    def test_matches_per_student_render(self):
+        assignment = self.assignment('Read chapter 4')
+        for student, content in build_assignment_notification_emails(self.students, assignment, self.teacher):
+            single = build_assignment_notification_email(student, assignment, self.teacher)
+            self.assertEqual(content['subject'], single['subject'])
+            self.assertEqual(content['html_body'], single['html_body'])
+
+    def test_placeholder_syntax_in_shared_text_is_left_alone(self):
+        description = 'Use [[recipient:email]] and [[recipient:student_name]] literally'
+        emails = list(build_assignment_notification_emails(self.students, self.assignment(description), self.teacher))
+        self.assertEqual(len(emails), 2)
+        for student, content in emails:
+            self.assertIn(description, content['html_body'])
+            self.assertIn(description, content['body'])
+            self.assertIn(student.first_name, content['body'])
+
+    def test_recipient_values_are_escaped_in_html_only(self):
+        renderer = BulkEmailRenderer('emails/assignment_notification_email.html', 'Hi', {'assignment_title': 'T'},
+                                     recipient_fields=['student_name'])
+        content = renderer.render(student_name='<b>Ann</b>')
+        self.assertIn('&lt;b&gt;Ann&lt;/b&gt;', content['html_body'])
+        self.assertIn('<b>Ann</b>', content['body'])
+
+
+class ViewAttendanceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user('admin@example.com', 'pass', role='admin')
+        cls.student = CustomUser.objects.create_user('marked@example.com', 'pass', role='student')
+        Attendance.objects.create(student=cls.student, present=True)
+
+    def test_student_view_lists_records_and_section_summary(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('view_attendance'))
+        self.assertEqual([record.student for record in response.context['attendance_records']], [self.student])
+        self.assertIsNotNone(response.context['section_rollups'])
+        self.assertContains(response, 'marked@example.com')
+
+    def test_section_summary_totals_the_month(self):
+        from attendance.models import SectionDailyAttendance
+        month_start = date.today().replace(day=1)
+        SectionDailyAttendance.objects.create(semester=1, section='A', date=month_start, present_count=3, total_count=4)
+        SectionDailyAttendance.objects.create(semester=1, section='A', date=month_start + timedelta(days=1), present_count=1, total_count=4)
+        # Last month's rollup is left out
+        SectionDailyAttendance.objects.create(semester=1, section='A', date=month_start - timedelta(days=1), present_count=0, total_count=9)
+        self.client.force_login(self.admin)
+        [summary] = self.client.get(reverse('view_attendance')).context['section_rollups']
+        self.assertEqual((summary['present_count'], summary['total_count'], summary['percentage']), (4, 8, 50.0))
+
+    def test_log_is_paged_by_cursor(self):
+        other = CustomUser.objects.create_user('marked-later@example.com', 'pass', role='student')
+        Attendance.objects.create(student=other, present=False)
+        self.client.force_login(self.admin)
+        with mock.patch('campus.views.ATTENDANCE_PAGE_SIZE', 1):
+            first = self.client.get(reverse('view_attendance'))
+            self.assertEqual([record.student for record in first.context['attendance_records']], [other])
+            second = self.client.get(reverse('view_attendance'), {'cursor': first.context['next_cursor']})
+        self.assertEqual([record.student for record in second.context['attendance_records']], [self.student])
+        self.assertIsNone(second.context['next_cursor'])
+
+    def test_teacher_view_has_no_section_summary(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('view_attendance_by_role', args=['teacher']))
+        self.assertEqual(list(response.context['attendance_records']), [])
+        self.assertIsNone(response.context['section_rollups'])
+
+
+class MarkAttendanceBulkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = CustomUser.objects.create_user('bulk-teacher@example.com', 'pass', role='teacher')
+        cls.present = CustomUser.objects.create_user('bulk-present@example.com', 'pass', role='student')
+        cls.absent = CustomUser.objects.create_user('bulk-absent@example.com', 'pass', role='student')
+
+    def counters(self, student):
+        profile = StudentProfile.objects.get(user=student)
+        return profile.attended_days, profile.total_days
+
+    def test_first_mark_creates_rows_and_counts_once(self):
+        result = mark_attendance_bulk(self.teacher, {self.present.id: True, self.absent.id: False, self.teacher.id: True})
+        self.assertEqual((result['created'], result['updated'], result['skipped']), (2, 0, 1))
+        self.assertEqual((self.counters(self.present), self.counters(self.absent)), ((1, 1), (0, 1)))
+        self.assertEqual(Attendance.objects.filter(date=date.today()).count(), 2)
+
+    def test_remarking_applies_only_the_difference(self):
+        mark_attendance_bulk(self.teacher, {self.present.id: True, self.absent.id: False})
+        result = mark_attendance_bulk(self.teacher, {self.present.id: False, self.absent.id: False})
+        self.assertEqual((result['created'], result['updated']), (0, 2))
+        self.assertEqual(result['outcomes'], {self.present.id: 'updated', self.absent.id: 'updated'})
+        self.assertEqual((self.counters(self.present), self.counters(self.absent)), ((0, 1), (0, 1)))
+        self.assertFalse(Attendance.objects.get(student=self.present).present)
+
+
+class AttendanceSyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = CustomUser.objects.create_user('sync-teacher@example.com', 'pass', role='teacher')
+        cls.student = CustomUser.objects.create_user('sync-student@example.com', 'pass', role='student')
+
+    def sync(self, key, marks):
+        self.client.force_login(self.teacher)
+        return self.client.post(
+            reverse('sync_attendance'), {'idempotency_key': key, 'marks': marks}, content_type='application/json'
+        )
+
+    def test_replayed_batch_is_applied_once(self):
+        today = date.today().isoformat()
+        marks = [
+            {'student': self.student.id, 'date': today, 'status': 'absent'},
+            {'student': self.student.id, 'date': today, 'status': 'present'},
+            {'student': self.student.id, 'date': '2999-01-01', 'status': 'present'},
+        ]
+        first = self.sync('batch-2', marks).json()
+        self.assertEqual((first['results'], first['replayed']), (['skipped', 'created', 'invalid'], False))
+        replay = self.sync('batch-2', marks).json()
+        self.assertEqual((replay['results'], replay['replayed']), (first['results'], True))
+        profile = StudentProfile.objects.get(user=self.student)
+        self.assertEqual((profile.attended_days, profile.total_days), (1, 1))
+
+    def test_unrelated_integrity_error_is_a_conflict(self):
+        marks = [{'student': self.student.id, 'date': date.today().isoformat(), 'status': 'present'}]
+        with mock.patch('campus.attendance_utils.mark_attendance_bulk', side_effect=IntegrityError):
+            response = self.sync('batch-1', marks)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.sync('batch-1', marks).json()['results'], ['created'])
+
+
+class TeacherNotificationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user('notify-admin@example.com', 'pass', role='admin')
+        cls.teacher = CustomUser.objects.create_user('notify-teacher@example.com', 'pass', role='teacher')
+
+    def setUp(self):
+        # Counts are cached even without SHARED_CACHE; earlier tests may have left some behind
+        cache.clear()
+
+    def notify(self, **fields):
+        return Notification.objects.create(message='Staff meeting', created_by=self.admin, **fields)
+
+    def test_dashboard_marks_shown_notifications_read(self):
+        self.notify(audience='role', role='teacher')
+        self.assertEqual(unread_count(self.teacher), 1)
+        self.client.force_login(self.teacher)
+        self.client.get(reverse('teacher_dashboard'))
+        self.assertEqual(unread_count(self.teacher), 0)
+
+    def test_mark_all_read(self):
+        self.notify(audience='all')
+        self.client.force_login(self.teacher)
+        response = self.client.post(reverse('mark_all_notifications_read'))
+        self.assertRedirects(response, reverse('teacher_dashboard'), fetch_redirect_response=False)
+        self.assertEqual(unread_count(self.teacher), 0)
+
+    def test_teachers_see_semester_and_section_notifications(self):
+        semester = self.notify(audience='semester', semester=3)
+        section = self.notify(audience='section', semester=3, section='A')
+        student_only = self.notify(audience='role', role='student')
+        self.notify(audience='user', recipient=self.admin)
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('teacher_dashboard'))
+        self.assertEqual(
+            {note.id for note in response.context['notifications']}, {semester.id, section.id, student_only.id}
+        )
+
+    @override_settings(SHARED_CACHE=True)
+    def test_semester_delivery_refreshes_cached_teacher_count(self):
+        cache.clear()
+        self.assertEqual(unread_count(self.teacher), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            record_delivery(self.notify(audience='semester', semester=2))
+        self.assertEqual(unread_count(self.teacher), 1)
+
+    @override_settings(SHARED_CACHE=True)
+    def test_badge_count_is_cached_without_a_shared_cache(self):
+        self.notify(audience='all')
+        self.assertEqual(unread_count(self.teacher), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_count(self.teacher), 1)
+
+    def test_cached_count_drops_when_notification_is_deleted(self):
+        cache.clear()
+        notification = self.notify(audience='user', recipient=self.teacher)
+        self.assertEqual(unread_count(self.teacher), 1)
+        self.client.force_login(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('delete_notification', args=[notification.pk]))
+        self.assertEqual(unread_count(self.teacher), 0)
+
+
+class InboxPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user('inbox-admin@example.com', 'pass', role='admin')
+        cls.student = CustomUser.objects.create_user('inbox-student@example.com', 'pass', role='student')
+        cls.notifications = [
+            Notification.objects.create(message=f'Notice {i}', created_by=cls.admin) for i in range(5)
+        ]
+        # Two notifications share a timestamp, so the cursor must break ties on id
+        Notification.objects.filter(pk=cls.notifications[3].pk).update(created_at=cls.notifications[2].created_at)
+
+    def test_pages_cover_the_inbox_once_newest_first(self):
+        everything, cursor = get_inbox(self.student, limit=100)
+        self.assertIsNone(cursor)
+        self.assertEqual(len(everything), 5)
+
+        paged, cursor = [], None
+        while True:
+            rows, cursor = get_inbox(self.student, cursor=cursor, limit=2)
+            paged += rows
+            if cursor is None:
+                break
+        self.assertEqual([n.pk for n in paged], [n.pk for n in everything])
+        self.assertEqual(everything[0].pk, self.notifications[-1].pk)
+
+    def test_page_plans_read_branches_in_index_order(self):
+        call_command('check_inbox_plan', stdout=StringIO())
+        # The single OR query reads every matching row and sorts them
+        teacher = CustomUser(pk=0, role='teacher')
+        self.assertTrue(any('TEMP B-TREE' in step for step in unindexed_steps(inbox_queryset(teacher)[:20])))
+
+
+
+class NotificationKindTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user('kind-admin@example.com', 'pass', role='admin')
+
+    def test_payload_missing_a_template_field_is_rejected(self):
+        with self.assertRaisesMessage(ValueError, 'fee_alert notification payload is missing due_date'):
+            create_notification(user=self.admin, kind='fee_alert', payload={'amount': '500'})
+
+    def test_text_falls_back_to_the_kind_label(self):
+        notification = Notification.objects.create(kind='event', payload={'title': 'Fest'})
+        self.assertEqual(notification.text, 'New Event')
+
+    def test_messages_to_users_keep_their_audience_retention(self):
+        direct = create_notification('Exam tips', user=self.admin, recipient=self.admin)
+        broadcast = create_notification('Holiday', user=self.admin)
+        Notification.objects.update(created_at=timezone.now() - timedelta(days=200))
+        call_command('archive_notifications', stdout=StringIO())
+        self.assertTrue(Notification.objects.filter(pk=direct.pk).exists())
+        self.assertTrue(NotificationArchive.objects.filter(source='campus', original_id=broadcast.pk).exists())
+
+
+@override_settings(SHARED_CACHE=True)
+class RosterCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        faculty = Faculty.objects.create(name='BIM')
+        cls.first = Subject.objects.create(name='Maths', faculty=faculty, semester=1)
+        cls.third = Subject.objects.create(name='Java', faculty=faculty, semester=3)
+        cls.student = CustomUser.objects.create_user('roster@example.com', 'pass', role='student')
+        StudentProfile.objects.filter(user=cls.student).update(faculty=faculty, semester=1, section='A')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_moving_a_student_refreshes_both_semesters(self):
+        self.assertEqual([s['id'] for s in get_roster(self.first)], [self.student.id])
+        self.assertEqual(get_roster(self.third), [])
+        profile = StudentProfile.objects.get(user=self.student)
+        profile.semester = 3
+        profile.save()
+        self.assertEqual(get_roster(self.first), [])
+        self.assertEqual([s['id'] for s in get_roster(self.third)], [self.student.id])
+
+    @override_settings(SHARED_CACHE=False)
+    def test_rosters_are_cached_without_a_shared_cache(self):
+        get_roster(self.first)
+        with self.assertNumQueries(0):
+            get_roster(self.first)
+
+    def test_other_semesters_stay_cached(self):
+        other = CustomUser.objects.create_user('other@example.com', 'pass', role='student')
+        profile = StudentProfile.objects.get(user=other)
+        profile.semester = 3
+        profile.save()
+        get_roster(self.first)
+        profile.section = 'B'
+        profile.save()
+        with self.assertNumQueries(0):
+            get_roster(self.first)
+
+
+class NotificationStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user('stream-admin@example.com', 'pass', role='admin')
+        cls.student = CustomUser.objects.create_user('stream@example.com', 'pass', role='student')
+
+    async def test_stream_replays_notifications_after_the_page_cursor(self):
+        seen = await Notification.objects.acreate(message='Already on the page', created_by=self.admin, audience='all')
+        missed = await Notification.objects.acreate(message='Sent before connecting', created_by=self.admin, audience='all')
+        await self.async_client.aforce_login(self.student)
+        response = await self.async_client.get(reverse('notification_stream'), {'cursor': seen.id})
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b'retry: 5000\n\n')
+        self.assertIn(f'id: {missed.id}\n'.encode(), await anext(chunks))
+        await chunks.aclose()
+
+    async def test_poll_fallback_resumes_after_the_last_streamed_event(self):
+        streamed = await Notification.objects.acreate(message='Streamed', created_by=self.admin, audience='all')
+        later = await Notification.objects.acreate(message='After the stream closed', created_by=self.admin, audience='all')
+        await self.async_client.aforce_login(self.student)
+        # The dashboard polls from the id of the last event it received, not the page's cursor
+        response = await self.async_client.get(reverse('poll_notifications'), {'cursor': streamed.id})
+        data = response.json()
+        self.assertEqual([note['id'] for note in data['notifications']], [later.id])
+        self.assertEqual(data['cursor'], later.id)
+
+
+class FailingDispatcher:
+    size = 4
+
+    def send(self, messages):
+        return [DispatchResult(message, False, 'connection refused') for message in messages]
+
+
+class SlowDispatcher:
+    """Sends one message at a time, each taking more than half the claim lease."""
+    size = 1
+
+    def __init__(self, fail_after=None):
+        self.clock = timezone.now()
+        self.sends = 0
+        self.fail_after = fail_after
+        self.reclaimed = []
+
+    def now(self):
+        return self.clock
+
+    def send(self, messages):
+        if self.sends == self.fail_after:
+            raise ConnectionError('worker died')
+        self.sends += 1
+        self.clock += CLAIM_LEASE * 0.6
+        # Another worker polling mid-run must find nothing to take over
+        self.reclaimed += OutboxWorker().claim(10)
+        return [DispatchResult(message, True, '') for message in messages]
+
+
+class SendQueuedEmailsTests(TestCase):
+    def test_sensitive_body_is_wiped_when_delivery_gives_up(self):
+        entry = EmailOutbox.objects.create(
+            to_email='new@example.com', subject='Welcome', body='password: hunter2', html_body='<p>hunter2</p>',
+            sensitive=True, attempts=MAX_ATTEMPTS - 1,
+        )
+        OutboxWorker().deliver([entry], FailingDispatcher())
+        entry.refresh_from_db()
+        self.assertEqual((entry.status, entry.body, entry.html_body), ('failed', '', ''))
+
+    def test_retried_sensitive_body_is_kept(self):
+        entry = EmailOutbox.objects.create(to_email='new@example.com', subject='Welcome', body='password', sensitive=True)
+        OutboxWorker().deliver([entry], FailingDispatcher())
+        entry.refresh_from_db()
+        self.assertEqual((entry.status, entry.body), ('pending', 'password'))
+
+    def queue(self, count):
+        for i in range(count):
+            EmailOutbox.objects.create(to_email=f'slow{i}@example.com', subject='Notice', body='Body')
+
+    def test_run_slower_than_the_lease_sends_each_row_once(self):
+        self.queue(3)
+        dispatcher = SlowDispatcher()
+        with mock.patch('django.utils.timezone.now', dispatcher.now):
+            batch = OutboxWorker().claim(10)
+            self.assertEqual(OutboxWorker().deliver(batch, dispatcher), (3, 0))
+        self.assertEqual(dispatcher.reclaimed, [])
+        self.assertEqual(set(EmailOutbox.objects.values_list('status', flat=True)), {'sent'})
+
+    def test_rows_sent_before_a_crash_stay_sent(self):
+        self.queue(3)
+        dispatcher = SlowDispatcher(fail_after=1)
+        with mock.patch('django.utils.timezone.now', dispatcher.now):
+            batch = OutboxWorker().claim(10)
+            with self.assertRaises(ConnectionError):
+                OutboxWorker().deliver(batch, dispatcher)
+        self.assertEqual(
+            list(EmailOutbox.objects.order_by('id').values_list('status', flat=True)), ['sent', 'sending', 'sending']
+        )
+
+
+class BatchFailingDispatcher:
+    """Rejects every message that BCCs ``failing``."""
+    size = 4
+
+    def __init__(self, failing):
+        self.failing = failing
+
+    def send(self, messages):
+        return [
+            DispatchResult(message, self.failing not in message.bcc, 'recipient refused') for message in messages
+        ]
+
+
+class BccBatchTests(TestCase):
+    recipients = [f'student{i}@example.com' for i in range(7)]
+
+    def test_recipients_are_split_into_batches(self):
+        enqueue_bcc_emails(self.recipients, 'Holiday', 'Campus is closed', batch_size=3)
+        rows = EmailOutbox.objects.order_by('id')
+        self.assertEqual([row.bcc for row in rows], [self.recipients[:3], self.recipients[3:6], self.recipients[6:]])
+        self.assertEqual({row.to_email for row in rows}, {''})
+
+    def test_failed_batch_is_retried_alone(self):
+        enqueue_bcc_emails(self.recipients, 'Holiday', 'Campus is closed', batch_size=3)
+        batch = list(EmailOutbox.objects.order_by('id'))
+        self.assertEqual(OutboxWorker().deliver(batch, BatchFailingDispatcher('student4@example.com')), (2, 1))
+        failed = EmailOutbox.objects.get(status='pending')
+        self.assertEqual((failed.bcc, failed.attempts), (self.recipients[3:6], 1))
+
+        failed.next_attempt_at = timezone.now()
+        failed.save()
+        self.assertEqual(OutboxWorker().deliver(OutboxWorker().claim(10), BatchFailingDispatcher(None)), (1, 0))
+        self.assertEqual(EmailOutbox.objects.filter(status='sent').count(), 3)
+
+    def test_recipients_do_not_see_each_other(self):
+        enqueue_bcc_emails(self.recipients[:2], 'Holiday', 'Campus is closed')
+        with EmailDispatcher(connections=1, rate_per_minute=0) as dispatcher:
+            dispatcher.send([outbox_message(EmailOutbox.objects.get())])
+        [sent] = mail.outbox
+        self.assertEqual(sent.recipients(), self.recipients[:2])
+        headers = sent.message().as_string()
+        self.assertNotIn('student0@example.com', headers)
+        self.assertNotIn('student1@example.com', headers)
+
+
+class EmailDispatcherTests(TestCase):
+    def test_bcc_batch_costs_one_send(self):
+        messages = [
+            EmailMessage('Hi', 'Body', 'from@example.com', bcc=[f'{i}@example.com' for i in range(50)]) for _ in range(2)
+        ]
+        with EmailDispatcher(connections=2, rate_per_minute=120) as dispatcher:
+            results = dispatcher.send(messages)
+            # Two sends fit the two-per-second burst, whatever the recipient count
+            self.assertLess(dispatcher.bucket.tokens, 1)
+            self.assertGreater(dispatcher.bucket.tokens, -0.5)
+        self.assertTrue(all(result.sent for result in results))
+
+    def test_send_from_a_running_event_loop(self):
+        message = EmailMessage('Hi', 'Body', 'from@example.com', ['a@example.com'], bcc=['b@example.com'])
+
+        async def send():
+            with EmailDispatcher(connections=1, rate_per_minute=0) as dispatcher:
+                return dispatcher.send([message])
+
+        [result] = asyncio.run(send())
+        self.assertTrue(result.sent)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class BenchmarkEmailTests(TestCase):
+    def test_scenarios_time_the_views_and_leave_nothing_behind(self):
+        out = StringIO()
+        call_command('benchmark_email', sizes='3', latency=0, stdout=out)
+        rows = {line.split()[0]: line.split() for line in out.getvalue().splitlines()[1:]}
+        self.assertEqual(set(rows), {'welcome', 'assignment', 'bulk', 'announcement'})
+        for name in ('welcome', 'assignment', 'bulk'):
+            self.assertEqual(rows[name][1], '3')
+            self.assertEqual(rows[name][5], '0')  # failed
+        # The announcement is one BCC batch, i.e. one SMTP transaction
+        self.assertEqual(rows['announcement'][6], '1')
+        # bulk has no view; the others report the request on its own
+        self.assertEqual(rows['bulk'][-1], '-')
+        for name in ('welcome', 'assignment', 'announcement'):
+            self.assertGreater(float(rows[name][-1]), 0)
+        self.assertFalse(CustomUser.objects.filter(email__startswith='bench').exists())
+        self.assertFalse(Assignment.objects.exists())
+        self.assertFalse(EmailOutbox.objects.exists())
+
+
+class AttendanceAnalyticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = CustomUser.objects.create_user('analytics@example.com', 'pass', role='student')
+        today = date.today()
+        # Present for the last two weeks, absent for the two before, plus a year-old mark
+        Attendance.objects.bulk_create(
+            [Attendance(student=cls.student, date=today - timedelta(days=d), present=d < 14) for d in range(28)]
+            + [Attendance(student=cls.student, date=today - timedelta(days=365), present=False)]
+        )
+
+    def test_default_window_skips_old_history(self):
+        analytics = compute_attendance_analytics()
+        self.assertEqual(analytics['days'], 28)
+        self.assertEqual(analytics['students'][0]['percentage'], 50.0)
+
+    def test_rolling_series_and_trend(self):
+        analytics = compute_attendance_analytics()
+        student = analytics['students'][0]
+        self.assertEqual(len(student['rolling']), 28)
+        self.assertEqual(student['rolling'][0], 0.0)
+        self.assertEqual(student['rolling'][-1], 100.0)
+        self.assertEqual(student['trend'], 100.0)
+        self.assertEqual([point['rate'] for point in analytics['rolling']], student['rolling'])
+
+    def test_empty_result_has_the_same_keys(self):
+        empty = compute_attendance_analytics(semester=8)
+        self.assertEqual(set(empty), set(compute_attendance_analytics()))
+        self.assertEqual(empty['weekdays'][0], 'Monday')
+
+    def test_promoted_student_stays_in_the_recorded_semester(self):
+        promoted = CustomUser.objects.create_user('promoted@example.com', 'pass', role='student')
+        StudentProfile.objects.filter(user=promoted).update(semester=1)
+        Attendance.objects.create(student=promoted, date=date.today() - timedelta(days=1), present=True)
+        StudentProfile.objects.filter(user=promoted).update(semester=2)
+        Attendance.objects.create(student=promoted, date=date.today(), present=False)
+
+        first = compute_attendance_analytics(semester=1)
+        [student] = first['students']
+        self.assertEqual((student['email'], student['semester'], student['percentage']), ('promoted@example.com', 1, 100.0))
+        self.assertEqual(first['days'], attendance_queryset(semester=1).count())
+        [student] = compute_attendance_analytics(semester=2)['students']
+        self.assertEqual((student['semester'], student['percentage']), (2, 0.0))
+        # Across semesters the student is one row, under their latest semester
+        [student] = [s for s in compute_attendance_analytics()['students'] if s['email'] == 'promoted@example.com']
+        self.assertEqual((student['semester'], student['percentage']), (2, 50.0))
+
+    def test_view_accepts_a_date_range(self):
+        self.client.force_login(CustomUser.objects.create_user('analytics-admin@example.com', 'pass', role='admin'))
+        start = date.today() - timedelta(days=6)
+        response = self.client.get(reverse('attendance_analytics'), {'date_from': start.isoformat()})
+        self.assertEqual(response.context['analytics']['days'], 7)
+        self.assertContains(response, 'Rolling Two-week Attendance')
+
+
+class ExportAttendanceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user('export-admin@example.com', 'pass', role='admin')
+        cls.student = CustomUser.objects.create_user('export@example.com', 'pass', role='student')
+        Attendance.objects.create(student=cls.student, date=date.today() - timedelta(days=1), present=True)
+        # The student moves on; the earlier mark stays in semester 1
+        StudentProfile.objects.filter(user=cls.student).update(semester=2)
+        Attendance.objects.create(student=cls.student, present=False)
+
+    def export(self, **params):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('export_attendance'), params)
+        return b''.join(response.streaming_content)
+
+    def test_semester_filter_uses_the_semester_of_the_mark(self):
+        rows = self.export(semester=1).decode().splitlines()
+        self.assertEqual(len(rows), 2)
+        self.assertIn(',1,', rows[1])
+        self.assertIn('Present', rows[1])
+
+    def test_xlsx_is_streamed_as_a_valid_workbook(self):
+        content = self.export(format='xlsx', semester=2)
+        with zipfile.ZipFile(BytesIO(content)) as archive:
+            self.assertIn('xl/workbook.xml', archive.namelist())
+            sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+        namespace = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+        rows = [
+            [cell.findtext(f'{namespace}v') or cell.findtext(f'.//{namespace}t') for cell in row]
+            for row in sheet.iter(f'{namespace}row')
+        ]
+        self.assertEqual(rows[0][0], 'Date')
+        self.assertEqual(rows[1][1:], ['export@example.com', '', '2', '', '', 'Absent'])
+
+
+class SendAttendanceAlertsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.low = CustomUser.objects.create_user('alert-low@example.com', 'pass', role='student')
+        cls.fine = CustomUser.objects.create_user('alert-fine@example.com', 'pass', role='student')
+        StudentProfile.objects.filter(user=cls.low).update(attended_days=5, total_days=10)
+        StudentProfile.objects.filter(user=cls.fine).update(attended_days=9, total_days=10)
+
+    def test_alerts_low_students_once_per_day(self):
+        call_command('send_attendance_alerts', stdout=StringIO())
+        call_command('send_attendance_alerts', stdout=StringIO())
+        self.assertEqual([message.to for message in mail.outbox], [['alert-low@example.com']])
+
+    def test_alerts_again_the_next_day(self):
+        call_command('send_attendance_alerts', stdout=StringIO())
+        tomorrow = date.today() + timedelta(days=1)
+        with mock.patch('campus.management.commands.send_attendance_alerts.attendance_alert_event',
+                        return_value=attendance_alert_event(tomorrow)):
+            call_command('send_attendance_alerts', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_dry_run_lists_without_sending(self):
+        out = StringIO()
+        call_command('send_attendance_alerts', dry_run=True, stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'alert-low@example.com: 50.0%')
+        self.assertEqual(mail.outbox, [])
+        call_command('send_attendance_alerts', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class ReconcileAttendanceCountersTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.first = CustomUser.objects.create_user('reconcile1@example.com', 'pass', role='student')
+        cls.second = CustomUser.objects.create_user('reconcile2@example.com', 'pass', role='student')
+        today = date.today()
+        for student in (cls.first, cls.second):
+            Attendance.objects.create(student=student, date=today - timedelta(days=2), present=True)
+            Attendance.objects.create(student=student, date=today - timedelta(days=1), present=False)
+        Attendance.objects.filter(student=cls.first).update(updated_at=timezone.now() - timedelta(hours=1))
+        Attendance.objects.filter(student=cls.second).update(updated_at=timezone.now() - timedelta(hours=2))
+
+    def counters(self, student):
+        return StudentProfile.objects.values_list('attended_days', 'total_days').get(user=student)
+
+    def reconcile(self, **options):
+        out = StringIO()
+        call_command('reconcile_attendance_counters', stdout=out, **options)
+        return out.getvalue()
+
+    def checkpoint(self):
+        return JobCheckpoint.objects.get(name='attendance_counters').high_water_mark
+
+    def test_reports_drift_and_repairs_it(self):
+        StudentProfile.objects.filter(user=self.first).update(attended_days=7)
+        self.assertIn('1 profile(s) drifted, 0 repaired', self.reconcile())
+        self.assertEqual(self.counters(self.first), (7, 2))
+        # A report-only run with drift leaves the high-water mark alone
+        self.assertIsNone(self.checkpoint())
+
+        self.assertIn('1 profile(s) drifted, 1 repaired', self.reconcile(repair=True))
+        self.assertEqual(self.counters(self.first), (1, 2))
+        self.assertEqual(self.counters(self.second), (1, 2))
+        self.assertEqual(self.checkpoint(), Attendance.objects.latest('updated_at').updated_at)
+
+    def test_incremental_run_only_checks_marks_after_the_high_water_mark(self):
+        self.reconcile(repair=True)
+        # The second student's marks are older than the high-water mark and its overlap,
+        # so the direct counter edit goes unnoticed; the new mark's student is rechecked
+        StudentProfile.objects.filter(user=self.second).update(attended_days=7)
+        mark = Attendance.objects.create(student=self.first, date=date.today(), present=True)
+        StudentProfile.objects.filter(user=self.first).update(total_days=9)
+
+        self.assertIn('Checked 1 student(s): 1 profile(s) drifted, 1 repaired', self.reconcile(repair=True, incremental=True))
+        self.assertEqual(self.counters(self.first), (2, 3))
+        self.assertEqual(self.counters(self.second), (7, 2))
+        mark.refresh_from_db()
+        self.assertEqual(self.checkpoint(), mark.updated_at)
+
+        # The nightly full run still catches the direct counter edit
+        self.assertIn('1 profile(s) drifted, 1 repaired', self.reconcile(repair=True))
+        self.assertEqual(self.counters(self.second), (1, 2))
+
+
+class NotificationDigestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user('digest-admin@example.com', 'pass', role='admin')
+        cls.teacher = CustomUser.objects.create_user('digest-teacher@example.com', 'pass', role='teacher')
+        cls.student = CustomUser.objects.create_user('digest-student@example.com', 'pass', role='student')
+        cls.other = CustomUser.objects.create_user('digest-other@example.com', 'pass', role='student')
+        StudentProfile.objects.filter(user=cls.student).update(semester=3)
+        faculty = Faculty.objects.create(name='Management')
+        cls.subject = Subject.objects.create(name='Accounting', faculty=faculty, semester=3)
+
+    def digest(self, **options):
+        out = StringIO()
+        call_command('send_notification_digests', stdout=out, **options)
+        return out.getvalue()
+
+    def digests(self):
+        return EmailOutbox.objects.filter(subject__startswith='Your ShankerDev Campus digest')
+
+    def test_does_nothing_unless_digest_mode_is_on(self):
+        create_notification('Holiday', user=self.admin)
+        self.assertIn('EMAIL_DIGEST_MODE is off', self.digest())
+        self.assertFalse(self.digests().exists())
+
+    @override_settings(EMAIL_DIGEST_MODE=True)
+    def test_one_digest_per_user_with_their_unread_notifications(self):
+        create_notification('Exam week', user=self.admin, semester=3)
+        create_notification('Holiday', user=self.admin)
+        read = create_notification('Sports day', user=self.admin, role='student')
+        NotificationReceipt.objects.create(notification=read, user=self.student, read_at=timezone.now())
+
+        self.assertEqual(set(self.digest(dry_run=True).split()), {
+            # The creator is left out; staff see every broadcast
+            'digest-teacher@example.com:', '3',
+            'digest-student@example.com:', '2',
+            'digest-other@example.com:', '2',
+        })
+        self.assertIn('Queued 3 digest(s) covering 3 notification(s).', self.digest())
+        digest = self.digests().get(to_email='digest-student@example.com')
+        self.assertEqual(digest.subject, 'Your ShankerDev Campus digest: 2 updates')
+        self.assertIn('Exam week', digest.body)
+        self.assertNotIn('Sports day', digest.body)
+        # The next run starts where this one stopped
+        self.assertIn('Queued 0 digest(s)', self.digest())
+
+    @override_settings(EMAIL_DIGEST_MODE=True)
+    def test_query_count_does_not_grow_with_users(self):
+        create_notification('Exam week', user=self.admin, semester=3)
+        create_notification('Holiday', user=self.admin)
+        create_notification('Your fees', user=self.admin, recipient=self.other)
+        self.digest(dry_run=True)  # Creates the checkpoint
+        with CaptureQueriesContext(connection) as few:
+            self.digest(dry_run=True)
+        for i in range(5):
+            student = CustomUser.objects.create_user(f'digest-more{i}@example.com', 'pass', role='student')
+            StudentProfile.objects.filter(user=student).update(semester=3)
+        with CaptureQueriesContext(connection) as many:
+            output = self.digest(dry_run=True)
+        self.assertIn('digest-more4@example.com: 2', output)
+        self.assertIn('digest-other@example.com: 2', output)
+        self.assertEqual(len(many), len(few))
+
+    @override_settings(EMAIL_DIGEST_MODE=True)
+    def test_digest_links_each_role_to_its_notifications(self):
+        create_notification('Holiday', user=self.admin)
+        self.digest()
+        student = self.digests().get(to_email='digest-student@example.com')
+        teacher = self.digests().get(to_email='digest-teacher@example.com')
+        self.assertIn('/campus/student/notifications/', student.html_body)
+        self.assertIn('/campus/teacher/', teacher.html_body)
+        self.assertNotIn('/campus/student/', teacher.html_body)
+
+    def test_assignment_emails_wait_for_the_digest_in_digest_mode(self):
+        self.client.force_login(self.teacher)
+
+        def add_assignment(title):
+            self.client.post(reverse('add_assignment'), {
+                'title': title, 'description': 'Chapter 1', 'subject': self.subject.id,
+                'due_date': date.today().isoformat(), 'semester': 3,
+            })
+            return EmailOutbox.objects.filter(to_email='digest-student@example.com', subject=f'New Assignment: {title}')
+
+        self.assertTrue(add_assignment('Ledger').exists())
+        with self.settings(EMAIL_DIGEST_MODE=True):
+            self.assertFalse(add_assignment('Balance sheet').exists())
+            self.assertIn('digest-student@example.com: 2', self.digest(dry_run=True))
+
+
+class DeliveryLogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.students = [CustomUser.objects.create_user(f'delivery{i}@example.com', 'pass', role='student') for i in range(3)]
+
+    def test_filter_undelivered_drops_recorded_users_in_one_query(self):
+        record_deliveries(self.students[:1], 'assignment:1', 'created')
+        queryset = CustomUser.objects.filter(email__startswith='delivery').order_by('id')
+        with self.assertNumQueries(1):
+            self.assertEqual(filter_undelivered(queryset, 'assignment:1', 'created'), self.students[1:])
+        with self.assertNumQueries(1):
+            self.assertEqual(filter_undelivered(self.students, 'assignment:1', 'created'), self.students[1:])
+
+    def test_record_deliveries_is_one_insert_and_safe_to_repeat(self):
+        with self.assertNumQueries(1):
+            record_deliveries(self.students, 'assignment:1', 'created')
+        record_deliveries([student.id for student in self.students], 'assignment:1', 'created')
+        self.assertEqual(DeliveryLog.objects.count(), 3)
+        self.assertEqual(filter_undelivered(self.students, 'assignment:1', 'created'), [])
+
+    def test_low_attendance_alert_is_queued_once_per_day(self):
+        student = self.students[0]
+        for days_ago in (3, 2, 1):
+            Attendance.objects.create(student=student, date=date.today() - timedelta(days=days_ago), present=False)
+        alerts = EmailOutbox.objects.filter(to_email=student.email, subject__startswith='Low Attendance Alert')
+        self.assertEqual(alerts.count(), 1)
+
+    def test_deliveries_are_keyed_by_source_and_event(self):
+        record_deliveries(self.students, 'assignment:1', 'created')
+        self.assertEqual(filter_undelivered(self.students, 'assignment:1', 'updated'), self.students)
+        self.assertEqual(filter_undelivered(self.students, 'assignment:2', 'created'), self.students)
+
+    def test_each_assignment_is_emailed_once(self):
+        teacher = CustomUser.objects.create_user('delivery-teacher@example.com', 'pass', role='teacher')
+        subject = Subject.objects.create(name='Economics', faculty=Faculty.objects.create(name='Management'), semester=1)
+        self.client.force_login(teacher)
+        for title in ('Essay', 'Quiz'):
+            self.client.post(reverse('add_assignment'), {
+                'title': title, 'description': '-', 'subject': subject.id,
+                'due_date': date.today().isoformat(), 'semester': 1,
+            })
+        student = self.students[0]
+        emails = EmailOutbox.objects.filter(to_email=student.email, subject__startswith='New Assignment')
+        # A second assignment the same day is its own event and still arrives
+        self.assertEqual(sorted(emails.values_list('subject', flat=True)), ['New Assignment: Essay', 'New Assignment: Quiz'])
+        for assignment in Assignment.objects.all():
+            self.assertEqual(filter_undelivered(self.students, delivery_source(assignment), 'created'), [])
@@ -47,7 +47,7 @@
 
 
 from django.urls import path
-from .views import student_dashboard, teacher_dashboard, mark_attendance, mark_teacher_attendance, add_assignment, admin_dashboard, manage_courses, set_exam_dates, send_notifications, update_seats, post_event, alert_fee_dues, view_attendance, bim_course_details, submit_assignment, assignment_detail, view_exam_dates, view_events, view_notifications, check_fee_status, view_my_attendance, select_semester, view_submissions, delete_notification, approve_user, edit_assignment, delete_assignment, list_assignments
+from .views import student_dashboard, teacher_dashboard, mark_attendance, mark_teacher_attendance, add_assignment, admin_dashboard, manage_courses, set_exam_dates, send_notifications, update_seats, post_event, alert_fee_dues, view_attendance, bim_course_details, submit_assignment, assignment_detail, view_exam_dates, view_events, view_notifications, check_fee_status, view_my_attendance, select_semester, view_submissions, delete_notification, approve_user, edit_assignment, delete_assignment, list_assignments, attendance_analytics, attendance_analytics_json, sync_attendance, export_attendance, mark_all_notifications_read, notification_stream, poll_notifications, notification_archive
 
 urlpatterns = [
     path('select_semester/', select_semester, name='select_semester'),
@@ -57,9 +57,13 @@ urlpatterns = [
     
     # Attendance-related paths
     path('teacher/attendance/', mark_attendance, name='mark_attendance'),
+    path('teacher/attendance/sync/', sync_attendance, name='sync_attendance'),
     path('teacher/teacher_attendance/', mark_teacher_attendance, name='mark_teacher_attendance'),
     path('view/', view_attendance, name='view_attendance', kwargs={'role': 'student'}),
     path('view/<str:role>/', view_attendance, name='view_attendance_by_role'),
+    path('admin/attendance_export/', export_attendance, name='export_attendance'),
+    path('admin/attendance_analytics/', attendance_analytics, name='attendance_analytics'),
+    path('admin/attendance_analytics/json/', attendance_analytics_json, name='attendance_analytics_json'),
     
     # Teacher-specific
     path('teacher/add_assignment/', add_assignment, name='add_assignment'),
@@ -75,6 +79,9 @@ urlpatterns = [
     path('student/exams/', view_exam_dates, name='view_exam_dates'),
     path('student/events/', view_events, name='view_events'),
     path('student/notifications/', view_notifications, name='view_notifications'),
+    path('notifications/read_all/', mark_all_notifications_read, name='mark_all_notifications_read'),
+    path('notifications/stream/', notification_stream, name='notification_stream'),
+    path('notifications/poll/', poll_notifications, name='poll_notifications'),
     path('student/fees/', check_fee_status, name='check_fee_status'),
 
 
@@ -84,6 +91,7 @@ urlpatterns = [
     path('admin/manage_courses/', manage_courses, name='manage_courses'),
     path('admin/set_exam_dates/', set_exam_dates, name='set_exam_dates'),
     path('admin/send_notifications/', send_notifications, name='send_notifications'),
+    path('admin/notifications/archive/', notification_archive, name='notification_archive'),
     path('admin/delete_notification/<int:pk>/', delete_notification, name='delete_notification'),
     path('admin/update_seats/', update_seats, name='update_seats'),
     path('admin/post_event/', post_event, name='post_event'),
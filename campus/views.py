@@ -3,12 +3,13 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth import authenticate, login
 from django.contrib import messages
 from .forms import AssignmentForm, CourseForm, EventForm, ExamRoutineForm, FeeDueForm, NotificationForm, UpdateSeatsForm, SubmissionForm, SemesterSelectionForm
-from .models import Attendance, Course, StudentProfile, TeacherProfile, ExamRoutine, FeeDue, Event, Assignment, TeacherAttendance, Subject, Faculty, Submission, UserNotificationTracker
+from .models import Attendance, Course, StudentProfile, TeacherProfile, ExamRoutine, FeeDue, Event, Assignment, TeacherAttendance, Subject, Faculty, Submission
 from django.contrib.auth import get_user_model
 from datetime import date, timedelta
 from django.utils import timezone
-from django.core.mail import send_mail
 from django.conf import settings
+from django.db import transaction
+from django.core.exceptions import ValidationError
 
 User = get_user_model()
 
@@ -50,18 +51,10 @@ def student_dashboard(request):
         return redirect('select_semester')
 
     attendance_percent = (profile.attended_days / profile.total_days * 100) if profile.total_days else 0
-    if attendance_percent < 80:
+    # Alert emails are sent by the send_attendance_alerts job, not on page load
+    from .attendance_utils import LOW_ATTENDANCE_THRESHOLD
+    if attendance_percent < LOW_ATTENDANCE_THRESHOLD:
         messages.warning(request, f"Low attendance: {attendance_percent:.1f}%. Contact your faculty.")
-        try:
-             send_mail(
-                'Low Attendance Alert',
-                f'Your attendance is {attendance_percent:.1f}%, below 80%. Contact your faculty.',
-                settings.EMAIL_HOST_USER,
-                [request.user.email],
-                fail_silently=True,
-            )
-        except Exception:
-             pass
 
     if profile:
         # Filter exams by subjects in the student's semester
@@ -80,22 +73,21 @@ def student_dashboard(request):
         subjects = []
     
     teachers_attendance = TeacherAttendance.objects.filter(date=date.today()).select_related('teacher').order_by('teacher__email')
+
+    # Per-course attendance straight from the packed ledgers (one row per course)
+    from attendance.models import AttendanceLedger
+    course_attendance = AttendanceLedger.objects.filter(
+        student=request.user, semester=profile.semester
+    ).select_related('course').order_by('course__name')
     
-    # Fetch recent notifications
+    # First page of the last week's notifications addressed to this student; the live
+    # stream resumes after the newest id seen here, so nothing committed meanwhile is lost
     from .models import Notification
-    from django.db.models import Q
-    
-    # Filter: 
-    # 1. Targeted to user (recipient=user)
-    # 2. Global (recipient=None AND semester=None)
-    # 3. Semester specific (recipient=None AND semester=user_semester)
-    
-    semester_filter = Q(recipient=None, semester=profile.semester) if profile.semester else Q(recipient=None, semester__isnull=True)
-    
-    recent_notifications = Notification.objects.filter(
-        Q(recipient=request.user) | (Q(recipient__isnull=True) & Q(semester__isnull=True)) | semester_filter,
-        created_at__gte=timezone.now() - timedelta(days=7)
-    ).exclude(message__startswith='Seats updated').order_by('-created_at')
+    from .notification_utils import get_inbox
+    notification_cursor = Notification.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    recent_notifications, more_notifications = get_inbox(
+        request.user, profile, limit=8, since=timezone.now() - timedelta(days=7)
+    )
 
     return render(request, 'campus/student_dashboard.html', {
         'attendance_percent': attendance_percent,
@@ -107,6 +99,9 @@ def student_dashboard(request):
         'teachers_attendance': teachers_attendance,
         'profile': profile,
         'notifications': recent_notifications,
+        'more_notifications': more_notifications is not None,
+        'notification_cursor': notification_cursor,
+        'course_attendance': course_attendance,
     })
 
 @login_required
@@ -121,12 +116,13 @@ def teacher_dashboard(request):
         subjects = []
         assignments = []
     
-    # Filter notifications for this user or global
-    from django.db.models import Q
-    from .models import Notification
-    recent_notifications = Notification.objects.filter(
-        Q(recipient=None) | Q(recipient=request.user)
-    ).exclude(created_by=request.user).exclude(message__startswith='Seats updated').order_by('-created_at')[:5]
+    # Every notification except those addressed to other users (see Notification.objects.for_user)
+    from .notification_utils import get_inbox, mark_notifications_read
+    recent_notifications, _ = get_inbox(request.user, limit=5, exclude_own=True)
+    # The dashboard is the teacher's inbox, so showing a notification marks it read
+    unread = [note.id for note in recent_notifications if not note.is_read]
+    if unread:
+        mark_notifications_read(request.user, unread)
 
     context = {
         'subjects': subjects,
@@ -144,34 +140,61 @@ def mark_attendance(request):
             messages.error(request, "No students selected.")
             return redirect('mark_attendance')
         try:
-            for student_id in students:
-                student = User.objects.get(id=student_id)
-                # Ensure profile exists to prevent crash in signal and below
-                profile, created_profile = StudentProfile.objects.get_or_create(user=student)
-                
-                status = request.POST.get(f'status_{student_id}')
-                present = (status == 'present')
-                
-                attendance, created_attendance = Attendance.objects.update_or_create(
-                    student=student,
-                    teacher=request.user,
-                    date=date.today(),
-                    defaults={'present': present}
-                )
-                
-                # Only update stats if this is a NEW attendance record for the day
-                # Or if logic permits recalculation (existing logic is naive increment)
-                if present:
-                    profile.attended_days += 1
-                profile.total_days += 1
-                profile.save()
+            from .attendance_utils import mark_attendance_bulk
+            statuses = {
+                student_id: request.POST.get(f'status_{student_id}') == 'present'
+                for student_id in students
+            }
+            result = mark_attendance_bulk(request.user, statuses)
+            if result['skipped']:
+                messages.warning(request, f"{result['skipped']} selected user(s) are not students and were skipped.")
             messages.success(request, 'Attendance marked successfully.')
-        except (User.DoesNotExist, StudentProfile.DoesNotExist) as e:
+        except ValueError as e:
             messages.error(request, f"Error marking attendance: {str(e)}")
         return redirect('teacher_dashboard')
-    students = User.objects.filter(role='student').order_by('email')
- 
-    return render(request, 'campus/mark_attendance.html', {'students': students})
+    from .roster_utils import resolve_roster
+    subjects, subject, sections, section, students = resolve_roster(
+        request.user, request.GET.get('subject'), request.GET.get('section')
+    )
+    return render(request, 'campus/mark_attendance.html', {
+        'students': students,
+        'subjects': subjects,
+        'subject': subject,
+        'sections': sections,
+        'section': section,
+        'today': date.today(),
+    })
+
+SYNC_MAX_MARKS = 5000
+ATTENDANCE_PAGE_SIZE = 50  # Rows per page of view_attendance
+
+@login_required
+@teacher_required
+def sync_attendance(request):
+    """JSON endpoint for offline clients: apply a batch of marks once per idempotency key."""
+    import json
+    from django.db import IntegrityError
+    from django.http import JsonResponse
+    from .attendance_utils import sync_attendance_batch
+
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required.'}, status=405)
+    try:
+        payload = json.loads(request.body)
+        key = str(payload['idempotency_key']).strip()
+        marks = payload['marks']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected JSON with idempotency_key and marks.'}, status=400)
+    if not key or len(key) > 64 or not isinstance(marks, list):
+        return JsonResponse({'error': 'Invalid idempotency_key or marks.'}, status=400)
+    if len(marks) > SYNC_MAX_MARKS:
+        return JsonResponse({'error': f'At most {SYNC_MAX_MARKS} marks per batch.'}, status=400)
+
+    try:
+        result, replayed = sync_attendance_batch(request.user, key, marks)
+    except IntegrityError:
+        return JsonResponse({'error': 'The batch conflicted with another change; retry it.'}, status=409)
+    return JsonResponse({**result, 'replayed': replayed})
 
 # @login_required
 # @teacher_required
@@ -225,43 +248,47 @@ def mark_teacher_attendance(request):
     return render(request, 'campus/mark_teacher_attendance.html')
 
 
+def _assignment_payload(assignment):
+    # Notification payload of the assignment_* kinds
+    return {
+        'assignment_id': assignment.pk,
+        'title': assignment.title,
+        'semester': assignment.semester,
+        'subject': str(assignment.subject),
+        'due_date': str(assignment.due_date),
+        'description': assignment.description,
+    }
+
 @login_required
 @teacher_required
 def add_assignment(request):
     if request.method == 'POST':
         form = AssignmentForm(request.POST, request.FILES)
         if form.is_valid():
-            assignment = form.save(commit=False)
-            assignment.teacher = request.user
-            assignment.save()
-            # Send targeted notification to semester
-            create_notification(
-                f"New Assignment: {assignment.title} (Sem {assignment.semester})\n"
-                f"Subject: {assignment.subject}\n"
-                f"Due Date: {assignment.due_date}\n\n"
-                f"Description: {assignment.description}",
-                request.user,
-                semester=assignment.semester
-            )
-            
-            # Send email notifications to students
-            from .email_utils import send_assignment_notification_email
-            students = User.objects.filter(
-                role='student',
-                studentprofile__semester=assignment.semester
-            )
-            today = date.today()
-            for student in students:
-                if not UserNotificationTracker.objects.filter(user=student, notification_type='assignment', last_sent_date=today).exists():
-                    try:
-                        send_assignment_notification_email(student, assignment, request.user)
-                        UserNotificationTracker.objects.update_or_create(
-                            user=student,
-                            notification_type='assignment',
-                            defaults={'last_sent_date': today}
-                        )
-                    except Exception:
-                        pass
+            from .email_utils import delivery_source, filter_undelivered, queue_assignment_notification_emails, record_deliveries
+            with transaction.atomic():
+                assignment = form.save(commit=False)
+                assignment.teacher = request.user
+                assignment.save()
+                # Send targeted notification to semester
+                create_notification(
+                    user=request.user,
+                    semester=assignment.semester,
+                    kind='assignment_created',
+                    payload=_assignment_payload(assignment)
+                )
+
+                # Queue email notifications to students (delivered by send_queued_emails);
+                # in digest mode the notification above reaches them in the next digest instead
+                students = User.objects.none() if settings.EMAIL_DIGEST_MODE else User.objects.filter(
+                    role='student',
+                    studentprofile__semester=assignment.semester
+                )
+                source = delivery_source(assignment)
+                recipients = filter_undelivered(students, source, 'created')
+                # The email is rendered once and personalised per student
+                queue_assignment_notification_emails(recipients, assignment, request.user)
+                record_deliveries(recipients, source, 'created')
             messages.success(request, 'Assignment added successfully.')
             return redirect('teacher_dashboard')
         else:
@@ -301,12 +328,10 @@ def edit_assignment(request, pk):
             
             # Send notification about updated assignment
             create_notification(
-                f"Assignment Updated: {updated_assignment.title} (Sem {updated_assignment.semester})\n"
-                f"Subject: {updated_assignment.subject}\n"
-                f"New Due Date: {updated_assignment.due_date}\n\n"
-                f"Description: {updated_assignment.description}",
-                request.user,
-                semester=updated_assignment.semester
+                user=request.user,
+                semester=updated_assignment.semester,
+                kind='assignment_updated',
+                payload=_assignment_payload(updated_assignment)
             )
             messages.success(request, 'Assignment updated successfully.')
             return redirect('teacher_dashboard')
@@ -334,10 +359,10 @@ def delete_assignment(request, pk):
         
         # Send notification about deleted assignment
         create_notification(
-            f"Assignment Deleted: {assignment_title} (Sem {assignment_semester})\n"
-            f"This assignment has been removed by the teacher.",
-            request.user,
-            semester=assignment_semester
+            user=request.user,
+            semester=assignment_semester,
+            kind='assignment_deleted',
+            payload={'title': assignment_title, 'semester': assignment_semester}
         )
         messages.success(request, f'Assignment "{assignment_title}" deleted successfully.')
         return redirect('teacher_dashboard')
@@ -388,9 +413,40 @@ def admin_dashboard(request):
 
 
 # Helper to create notifications
-def create_notification(message, user=None, recipient=None, semester=None):
+def create_notification(message='', user=None, recipient=None, semester=None, section='', role='', users=None, kind='announcement', payload=None):
+    """Create one notification row for its whole audience.
+
+    The audience is the most specific target given: ``users`` (an explicit
+    set), ``recipient``, ``section`` (within ``semester``), ``semester``,
+    ``role``, or everyone. Structured kinds pass a ``payload`` instead of a
+    message; their text is rendered from the kind's template when shown, so
+    a payload missing one of the template's fields raises ValueError.
+    """
     from .models import Notification
-    Notification.objects.create(message=message, created_by=user, recipient=recipient, semester=semester)
+    missing = Notification.missing_payload_keys(kind, payload)
+    if missing and not message:
+        raise ValueError(f"{kind} notification payload is missing {', '.join(missing)}")
+    if users is not None:
+        audience = 'users'
+    elif recipient is not None:
+        audience = 'user'
+    elif section and semester:
+        audience = 'section'
+    elif semester:
+        audience = 'semester'
+    elif role:
+        audience = 'role'
+    else:
+        audience = 'all'
+    notification = Notification.objects.create(
+        message=message, kind=kind, payload=payload or {}, created_by=user, audience=audience, recipient=recipient,
+        semester=semester, section=section if audience == 'section' else '', role=role if audience == 'role' else '',
+    )
+    if users is not None:
+        notification.users.set(users)
+    from .notification_utils import record_delivery
+    record_delivery(notification)
+    return notification
 
 # ... (Admin views remain similar, using default recipient=None)
 
@@ -400,27 +456,22 @@ def alert_fee_dues(request):
     if request.method == 'POST':
         form = FeeDueForm(request.POST)
         if form.is_valid():
-            fee_due = form.save()
-            create_notification(
-                f"Fee Alert: You have a fee due of {fee_due.amount} by {fee_due.due_date}", 
-                request.user, 
-                recipient=fee_due.student
-            )
-            
-            # Send email notification
-            from .email_utils import send_fee_reminder_email
-            today = date.today()
-            student = fee_due.student
-            if not UserNotificationTracker.objects.filter(user=student, notification_type='fee_reminder', last_sent_date=today).exists():
-                try:
-                    send_fee_reminder_email(student, fee_due.amount, fee_due.due_date)
-                    UserNotificationTracker.objects.update_or_create(
-                        user=student,
-                        notification_type='fee_reminder',
-                        defaults={'last_sent_date': today}
-                    )
-                except Exception:
-                    pass
+            from .email_utils import delivery_source, filter_undelivered, queue_fee_reminder_email, record_deliveries
+            with transaction.atomic():
+                fee_due = form.save()
+                create_notification(
+                    user=request.user,
+                    recipient=fee_due.student,
+                    kind='fee_alert',
+                    payload={'amount': str(fee_due.amount), 'due_date': str(fee_due.due_date), 'fee_due_id': fee_due.pk}
+                )
+
+                # Queue email notification (digest mode leaves it to the next digest)
+                if not settings.EMAIL_DIGEST_MODE:
+                    source = delivery_source(fee_due)
+                    for student in filter_undelivered([fee_due.student], source, 'reminder'):
+                        queue_fee_reminder_email(student, fee_due.amount, fee_due.due_date)
+                        record_deliveries([student], source, 'reminder')
                 
             messages.success(request, 'Fee due alert sent successfully.')
             return redirect('admin_dashboard')
@@ -438,7 +489,9 @@ def manage_courses(request):
         form = CourseForm(request.POST)
         if form.is_valid():
             course = form.save()
-            create_notification(f"New course added: {course.name}\n\n{course.description}\nDuration: {course.duration}", request.user)
+            create_notification(user=request.user, kind='course_added', payload={
+                'name': course.name, 'description': course.description, 'duration': course.duration, 'course_id': course.pk,
+            })
             messages.success(request, 'Course managed successfully.')
             return redirect('admin_dashboard')
         else:
@@ -456,7 +509,7 @@ def set_exam_dates(request):
         if form.is_valid():
             exam = form.save()
             title = exam.title if exam.title else f"Routine for Semester {exam.semester}"
-            create_notification(f"Exam Routine Uploaded: {title}", request.user, semester=exam.semester)
+            create_notification(user=request.user, semester=exam.semester, kind='exam_routine', payload={'title': title, 'exam_id': exam.pk})
             
             messages.success(request, 'Exam routine updated successfully.')
             return redirect('admin_dashboard')
@@ -470,9 +523,12 @@ def set_exam_dates(request):
 @login_required
 @admin_required
 def delete_notification(request, pk):
+    from django.shortcuts import get_object_or_404
     from .models import Notification
-    notification = Notification.objects.get(id=pk)
+    from .notification_utils import record_removal
+    notification = get_object_or_404(Notification, id=pk)
     if notification.created_by == request.user:
+        record_removal(notification)
         notification.delete()
         messages.success(request, "Notification deleted.")
     else:
@@ -509,23 +565,21 @@ def send_notifications(request):
                      messages.error(request, "Please select at least one recipient.")
                      return render(request, 'campus/send_notifications.html', {'form': form})
 
-            for user in recipients:
-                # Send Mail
-                send_mail(
-                    subject,
-                    message,
-                    settings.EMAIL_HOST_USER,
-                    [user.email],
-                    fail_silently=True,
+            from .email_utils import enqueue_bcc_emails
+            with transaction.atomic():
+                # Everyone gets the same text, so queue it as BCC batches (delivered by send_queued_emails)
+                enqueue_bcc_emails(
+                    recipients.exclude(email='').values_list('email', flat=True),
+                    subject, message, from_email=settings.EMAIL_HOST_USER or ''
                 )
-             
-            if recipient_type == 'all_students_teachers':
-                 create_notification(f"Admin Announcement: {subject}\n\n{message}", request.user, recipient=None) # Global
-            else:
-                 # Loop for specific or all_students
-                 filtered_msg = f"Admin Message: {subject}\n\n{message}"
-                 for user in recipients:
-                     create_notification(filtered_msg, request.user, recipient=user)
+
+                # One notification row per audience, however many recipients it has
+                if recipient_type == 'all_students_teachers':
+                     create_notification(f"Admin Announcement: {subject}\n\n{message}", request.user) # Global
+                elif recipient_type == 'all_students':
+                     create_notification(f"Admin Message: {subject}\n\n{message}", request.user, role='student')
+                else:
+                     create_notification(f"Admin Message: {subject}\n\n{message}", request.user, users=recipients)
 
             messages.success(request, 'Notifications sent successfully.')
             return redirect('send_notifications')
@@ -541,6 +595,34 @@ def send_notifications(request):
     
     return render(request, 'campus/send_notifications.html', {'form': form, 'sent_notifications': sent_notifications})
 
+@login_required
+@admin_required
+def notification_archive(request):
+    from django.db.models import Q
+    from .models import NotificationArchive
+    from .notification_utils import INBOX_PAGE_SIZE, decode_cursor, encode_cursor
+    # Read-only browser over notifications moved out by archive_notifications
+    archived = NotificationArchive.objects.select_related('created_by', 'recipient').order_by('-created_at', '-id')
+    query = request.GET.get('q', '').strip()
+    if query:
+        archived = archived.filter(message__icontains=query)
+    cursor = decode_cursor(request.GET.get('cursor'))
+    if cursor:
+        created_at, pk = cursor
+        archived = archived.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+    rows = list(archived[:INBOX_PAGE_SIZE + 1])
+    next_cursor = None
+    if len(rows) > INBOX_PAGE_SIZE:
+        rows = rows[:INBOX_PAGE_SIZE]
+        next_cursor = encode_cursor(rows[-1])
+    return render(request, 'campus/notification_archive.html', {
+        'archived': rows,
+        'next_cursor': next_cursor,
+        'query': query,
+        'paged': bool(cursor),
+    })
+
 @login_required
 @admin_required
 def update_seats(request):
@@ -566,7 +648,9 @@ def post_event(request):
         form = EventForm(request.POST)
         if form.is_valid():
             event = form.save()
-            create_notification(f"New Event: {event.title} on {event.date}\n\n{event.description}", request.user)
+            create_notification(user=request.user, kind='event', payload={
+                'title': event.title, 'date': str(event.date), 'description': event.description, 'event_id': event.pk,
+            })
             messages.success(request, 'Event posted successfully.')
             return redirect('admin_dashboard')
         else:
@@ -642,17 +726,116 @@ def bim_course_details(request):
 @login_required
 @admin_required
 def view_attendance(request, role=None):
+    # Per-person marks for the role this month, newest first and paged by a
+    # (date, id) cursor; the student view adds monthly section totals read
+    # from the daily rollups (refresh_attendance_rollups)
+    from django.db.models import Q, Sum
+    from attendance.models import SectionDailyAttendance
+    month_start = date.today().replace(day=1)
+    section_rollups = None
+    cursor = None
     try:
-        if role:
-            attendees = User.objects.filter(role=role)
-        else:
-            attendees = User.objects.filter(role='student')
-        attendance_records = Attendance.objects.filter(
-            student__in=attendees, date__gte=date.today().replace(day=1)
-        ).order_by('date')
+        cursor_date, cursor_id = request.GET['cursor'].split('|')
+        cursor = (date.fromisoformat(cursor_date), int(cursor_id))
+    except (KeyError, ValueError):
+        pass
+    next_cursor = None
+    try:
+        records = Attendance.objects.filter(
+            student__role=role or 'student', date__gte=month_start
+        ).select_related('student').order_by('-date', '-id')
+        if cursor:
+            records = records.filter(Q(date__lt=cursor[0]) | Q(date=cursor[0], id__lt=cursor[1]))
+        attendance_records = list(records[:ATTENDANCE_PAGE_SIZE + 1])
+        if len(attendance_records) > ATTENDANCE_PAGE_SIZE:
+            attendance_records = attendance_records[:ATTENDANCE_PAGE_SIZE]
+            last = attendance_records[-1]
+            next_cursor = f"{last.date.isoformat()}|{last.id}"
+        if (role or 'student') == 'student':
+            section_rollups = list(
+                SectionDailyAttendance.objects.filter(date__gte=month_start)
+                .values('semester', 'section')
+                .annotate(present_count=Sum('present_count'), total_count=Sum('total_count'))
+                .order_by('semester', 'section')
+            )
+            for rollup in section_rollups:
+                rollup['percentage'] = rollup['present_count'] / rollup['total_count'] * 100 if rollup['total_count'] else 0.0
     except Exception as e:
         messages.error(request, f"Error loading attendance: {str(e)}")
         attendance_records = []
+    return render(request, 'campus/view_attendance.html', {
+        'attendance_records': attendance_records,
+        'section_rollups': section_rollups,
+        'report_month': month_start,
+        'role': role or 'student',
+        'next_cursor': next_cursor,
+        'paged': bool(cursor),
+    })
+
+def _analytics_filters(request):
+    semester = request.GET.get('semester')
+    dates = {}
+    for field, param in (('start_date', 'date_from'), ('end_date', 'date_to')):
+        try:
+            dates[field] = date.fromisoformat(request.GET.get(param) or '')
+        except ValueError:
+            dates[field] = None
+    return {
+        'semester': int(semester) if semester and semester.isdigit() else None,
+        'section': request.GET.get('section') or None,
+        **dates,
+    }
+
+@login_required
+@admin_required
+def attendance_analytics(request):
+    from .attendance_analytics import compute_attendance_analytics
+    filters = _analytics_filters(request)
+    analytics = compute_attendance_analytics(**filters)
+    return render(request, 'campus/attendance_analytics.html', {'analytics': analytics, 'filters': filters})
+
+@login_required
+@admin_required
+def attendance_analytics_json(request):
+    from django.http import JsonResponse
+    from .attendance_analytics import compute_attendance_analytics
+    return JsonResponse(compute_attendance_analytics(**_analytics_filters(request)))
+
+class _Echo:
+    """File-like object whose write() returns the value, for streaming csv.writer output."""
+    def write(self, value):
+        return value
+
+@login_required
+@admin_required
+def export_attendance(request):
+    import csv
+    from django.http import StreamingHttpResponse
+    from .attendance_export import attendance_queryset, iter_attendance_pivot, iter_attendance_rows, iter_xlsx
+
+    source = 'course' if request.GET.get('source') == 'course' else 'campus'
+    filters = _analytics_filters(request)
+    date_from = request.GET.get('date_from') or None
+    date_to = request.GET.get('date_to') or None
+    try:
+        records = attendance_queryset(source, filters['semester'], filters['section'], date_from, date_to)
+        rows = iter_attendance_pivot(records) if request.GET.get('layout') == 'pivot' else iter_attendance_rows(records, source)
+        filename = f"attendance-{source}-{date.today().isoformat()}"
+
+        if request.GET.get('format') == 'xlsx':
+            response = StreamingHttpResponse(
+                iter_xlsx(rows), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            )
+            response['Content-Disposition'] = f'attachment; filename="{filename}.xlsx"'
+            return response
+
+        writer = csv.writer(_Echo())
+        response = StreamingHttpResponse((writer.writerow(row) for row in rows), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+        return response
+    except ValidationError as e:
+        messages.error(request, f"Error exporting attendance: {str(e)}")
+        return redirect('view_attendance')
 
 @login_required
 @student_required
@@ -686,9 +869,10 @@ def assignment_detail(request, pk):
                 
                 # Notify Teacher
                 create_notification(
-                    f"New Submission: {request.user.get_full_name()} submitted {assignment.title}",
-                    request.user, 
-                    recipient=assignment.teacher
+                    user=request.user,
+                    recipient=assignment.teacher,
+                    kind='submission',
+                    payload={'student': request.user.get_full_name(), 'title': assignment.title, 'assignment_id': assignment.pk}
                 )
                 
                 messages.success(request, "Assignment submitted successfully!")
@@ -717,16 +901,138 @@ def view_events(request):
 @student_required
 def view_notifications(request):
     from .models import Notification
-    from django.db.models import Q
-    # Fetch all notifications for this user (Global + Targeted + Semester)
+    from .notification_utils import get_inbox, mark_notifications_read
+    # Fetch all notifications for this user (everyone, role, semester, section and targeted)
     profile, _ = StudentProfile.objects.get_or_create(user=request.user)
-    semester_filter = Q(recipient=None, semester=profile.semester) if profile.semester else Q(recipient=None, semester__isnull=True)
-    
-    notifications = Notification.objects.filter(
-        Q(recipient=request.user) | (Q(recipient__isnull=True) & Q(semester__isnull=True)) | semester_filter
-    ).order_by('-created_at')
-    
-    return render(request, 'campus/view_notifications.html', {'notifications': notifications})
+    if request.method == 'POST':
+        # Dismissed notifications get a receipt and drop out of the inbox
+        dismissed = Notification.objects.for_user(request.user, profile).filter(
+            id__in=[pk for pk in request.POST.getlist('dismiss') if pk.isdigit()]
+        ).values_list('id', flat=True)
+        mark_notifications_read(request.user, list(dismissed), dismiss=True)
+        return redirect('view_notifications')
+
+    unread_only = request.GET.get('unread') == '1'
+    notifications, next_cursor = get_inbox(
+        request.user, profile, cursor=request.GET.get('cursor'), unread_only=unread_only
+    )
+    # Receipts are written lazily, only for notifications the student has now seen
+    unread = [note.id for note in notifications if not note.is_read]
+    if unread:
+        mark_notifications_read(request.user, unread)
+
+    return render(request, 'campus/view_notifications.html', {
+        'notifications': notifications,
+        'next_cursor': next_cursor,
+        'unread_only': unread_only,
+        'paged': bool(request.GET.get('cursor')),
+    })
+
+@login_required
+def mark_all_notifications_read(request):
+    from .notification_utils import mark_all_read
+    if request.method == 'POST':
+        mark_all_read(request.user)
+        messages.success(request, "All notifications marked as read.")
+    return redirect({'student': 'view_notifications', 'teacher': 'teacher_dashboard', 'admin': 'admin_dashboard'}.get(request.user.role, 'home'))
+
+async def _stream_subscriber(request):
+    # The user, their profile (students only) and the audience keys they receive
+    from .notification_utils import user_audience_keys
+    user = await request.auser()
+    profile = await StudentProfile.objects.filter(user=user).afirst() if user.role == 'student' else None
+    return user, profile, frozenset(user_audience_keys(user, profile))
+
+@login_required
+async def notification_stream(request):
+    """Server-Sent Events stream of new notifications for the logged-in user (ASGI only)."""
+    import asyncio
+    from asgiref.sync import sync_to_async
+    from django.core.handlers.asgi import ASGIRequest
+    from django.http import HttpResponse, StreamingHttpResponse
+    from .notification_stream import (
+        STREAM_HEARTBEAT_SECONDS, STREAM_MAX_SECONDS, broadcaster, is_addressed_to, notification_data, sse_event,
+    )
+    from .notification_utils import inbox_after
+
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker would buffer the endless stream; 204 tells EventSource to stop and the page to long-poll
+        return HttpResponse(status=204)
+
+    user, profile, audience_keys = await _stream_subscriber(request)
+    # Reconnects send Last-Event-ID; the first connection passes the page's newest id as ?cursor=
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('cursor', '')
+
+    async def events():
+        seq = broadcaster.seq
+        last_id = int(last_event_id) if last_event_id.isdigit() else None
+        yield 'retry: 5000\n\n'
+        if last_id is not None:
+            # Reconnecting: replay what was committed while the browser was away
+            for note in await sync_to_async(inbox_after)(user, profile, last_id):
+                last_id = note.id
+                yield sse_event(notification_data(note))
+        deadline = asyncio.get_running_loop().time() + STREAM_MAX_SECONDS
+        while asyncio.get_running_loop().time() < deadline:
+            if not await broadcaster.wait(seq, STREAM_HEARTBEAT_SECONDS):
+                yield ': ping\n\n'
+                continue
+            items = broadcaster.since(seq)
+            if last_id is not None and (not items or items[0][0] > seq + 1):
+                # Fell behind the broadcast history; fetch from the database instead
+                seq = broadcaster.seq
+                for note in await sync_to_async(inbox_after)(user, profile, last_id):
+                    last_id = note.id
+                    yield sse_event(notification_data(note))
+                continue
+            for item_seq, item in items:
+                seq = item_seq
+                if is_addressed_to(item, user.pk, audience_keys):
+                    last_id = item['data']['id']
+                    yield sse_event(item['data'])
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@login_required
+async def poll_notifications(request):
+    """Long-poll fallback: wait up to POLL_TIMEOUT_SECONDS for notifications newer than ``cursor``."""
+    import asyncio
+    from asgiref.sync import sync_to_async
+    from django.http import JsonResponse
+    from .models import Notification
+    from .notification_stream import POLL_TIMEOUT_SECONDS, broadcaster, is_addressed_to, notification_data
+    from .notification_utils import inbox_after
+
+    user, profile, audience_keys = await _stream_subscriber(request)
+    cursor = request.GET.get('cursor', '')
+    if not cursor.isdigit():
+        # First poll: start from the newest notification
+        latest = await Notification.objects.order_by('-id').values_list('id', flat=True).afirst()
+        return JsonResponse({'notifications': [], 'cursor': latest or 0})
+
+    after = int(cursor)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + POLL_TIMEOUT_SECONDS
+    seq = broadcaster.seq
+    notes = await sync_to_async(inbox_after)(user, profile, after)
+    while not notes and loop.time() < deadline:
+        if not await broadcaster.wait(seq, deadline - loop.time()):
+            break
+        items = broadcaster.since(seq)
+        # Only go back to the database once something addressed to this user (or lost from history) arrived
+        relevant = not items or items[0][0] > seq + 1 or any(
+            is_addressed_to(item, user.pk, audience_keys) for _, item in items
+        )
+        seq = items[-1][0] if items else broadcaster.seq
+        if relevant:
+            notes = await sync_to_async(inbox_after)(user, profile, after)
+    return JsonResponse({
+        'notifications': [notification_data(note) for note in notes],
+        'cursor': notes[-1].id if notes else after,
+    })
 
 @login_required
 @student_required
@@ -744,23 +1050,19 @@ def view_my_attendance(request):
 @admin_required
 def approve_user(request, user_id):
     from django.shortcuts import get_object_or_404
+    from .email_utils import enqueue_email
     user = get_object_or_404(User, id=user_id)
-    user.is_approved = True
-    user.save()
-    
-    # Optional: Send approval email
-    try:
-        from django.core.mail import send_mail
-        from django.conf import settings
-        send_mail(
+    with transaction.atomic():
+        user.is_approved = True
+        user.save()
+
+        # Queue approval email
+        enqueue_email(
+            user.email,
             'Account Approved',
             f'Hello {user.first_name},\n\nYour account has been approved by the admin. You can now login.',
-            settings.EMAIL_HOST_USER,
-            [user.email],
-            fail_silently=True,
+            from_email=settings.EMAIL_HOST_USER or '',
         )
-    except Exception:
-        pass
         
     messages.success(request, f"User {user.email} has been approved.")
     return redirect('admin_dashboard')
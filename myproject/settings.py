@@ -82,6 +82,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'myproject.context_processors.college_context',
+                'campus.context_processors.unread_notifications',
             ],
         },
     },
@@ -146,15 +147,64 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
-EMAIL_HOST = 'smtp.gmail.com'
-EMAIL_PORT = 587
-EMAIL_USE_TLS = True
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')  # 127.0.0.1 with `manage.py smtp_sink` for local testing
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', '587'))
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'True') == 'True'
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')  # Gmail App Password
 DEFAULT_FROM_EMAIL = f"ShankerDev Campus <{os.getenv('EMAIL_HOST_USER')}>"
 EMAIL_USE_SSL = False
 EMAIL_TIMEOUT = 30  
+# Bulk sends (send_queued_emails, send_bulk_email) keep this many SMTP
+# connections open and stay under the per-minute limit, counted in SMTP
+# messages: a BCC batch of EMAIL_BCC_BATCH_SIZE recipients is one, so a
+# 3,000-student announcement (60 batches) goes out in about a minute. Gmail
+# throttles senders well above this pace, and its daily cap counts every
+# recipient (about 2,000 for Workspace, 500 for personal accounts); sends it
+# rejects stay queued for retry. Set it to your provider's quota, or 0 for
+# no limit.
+EMAIL_DISPATCH_CONNECTIONS = 4
+EMAIL_RATE_LIMIT_PER_MINUTE = int(os.getenv('EMAIL_RATE_LIMIT_PER_MINUTE', '60'))
+# Announcements with the same text for everyone are sent as one email per
+# this many BCC recipients
+EMAIL_BCC_BATCH_SIZE = 50
+
+
+
+# Attendance storage: per-course bitset ledgers are always maintained next to
+# one StudentAttendance row per student per day. Must stay True: summaries,
+# rollups, attendance_feed, the exports and the low attendance alerts still
+# read the daily rows, so the system check attendance.E001 refuses False.
+ATTENDANCE_STORE_DAILY_ROWS = True
+
+# True to stop emailing each assignment and fee alert as it happens; the
+# send_notification_digests job then emails every user one summary of the
+# notifications they received in the period instead.
+EMAIL_DIGEST_MODE = False
+
+# Days a notification stays in the live tables before archive_notifications
+# moves it to NotificationArchive, per Notification kind ('direct' covers the
+# notifications app). An audience entry ('user', 'users') overrides the kind of
+# the messages sent to that audience. Kinds without an entry use 'default';
+# None keeps forever.
+NOTIFICATION_RETENTION_DAYS = {
+    'default': 180,
+    'user': 365,
+    'users': 365,
+    'fee_alert': 365,
+    'submission': 365,
+    'seats_updated': 30,
+    'direct': 90,
+}
 
+# Unread notification counters and attendance rosters are cached for an hour
+# when every server process shares the cache (set REDIS_URL, e.g.
+# redis://127.0.0.1:6379/0); with the default per-process memory cache they
+# are kept for under a minute, since other processes' changes are not seen.
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}}
+SHARED_CACHE = bool(REDIS_URL)
 
 
 LOGIN_URL = '/login/'
@@ -1,5 +1,5 @@
 from django.shortcuts import render, redirect
-from django.core.mail import send_mail
+from django.db import transaction
 from django.conf import settings
 from django.contrib.auth.views import LoginView
 from django.urls import reverse_lazy
@@ -130,23 +130,22 @@ def add_user(request):
     if request.method == 'POST':
         form = AddUserForm(request.POST)
         if form.is_valid():
-            user = form.save(commit=False)
-            password = User.objects.make_random_password()
-            user.set_password(password)
-            user.save()
-            
-            # Send Email
-            try:
-                send_mail(
+            from campus.email_utils import enqueue_email
+            with transaction.atomic():
+                user = form.save(commit=False)
+                password = User.objects.make_random_password()
+                user.set_password(password)
+                user.save()
+
+                # Queue credentials email; the body is wiped from the outbox once sent
+                enqueue_email(
+                    user.email,
                     'Your ShankerDev Campus Credentials',
                     f'Hello {user.first_name},\n\nYour account has been created.\n\nRole: {user.role}\nEmail: {user.email}\nPassword: {password}\n\nPlease login and change your password.',
-                    settings.EMAIL_HOST_USER,
-                    [user.email],
-                    fail_silently=False,
+                    from_email=settings.EMAIL_HOST_USER or '',
+                    sensitive=True,
                 )
-                messages.success(request, f"User {user.email} created and credentials emailed.")
-            except Exception as e:
-                messages.warning(request, f"User created but failed to send email: {e}")
+            messages.success(request, f"User {user.email} created and credentials queued for email.")
                 
             return redirect('admin_dashboard')
     else: